@@ -0,0 +1,76 @@
+"""
+Compare two benchmark result files (benchmarks/suite.py --output) and flag
+operations that got slower than the baseline by more than a threshold.
+
+Tiny timings are noise-dominated, so a slowdown must also exceed
+`min_delta` seconds in absolute terms to count as a regression. Only compare
+results from the same machine; on a shared host, back-to-back runs of the
+same commit differ by 10-30%, hence the 25% default.
+
+Usage:
+    python -m benchmarks.compare BASELINE.json CURRENT.json [--threshold 0.25]
+"""
+import argparse
+import json
+import sys
+from typing import Dict, List
+
+
+def compare(baseline: Dict, current: Dict, threshold: float = 0.25, min_delta: float = 0.02) -> List[Dict]:
+    """
+    One row per (scenario, op) present in both results, with the ratio
+    current/baseline and a status of REGRESSION, FASTER or ok.
+    """
+    rows = []
+    for scenario, result in current.get("results", {}).items():
+        base_ops = baseline.get("results", {}).get(scenario, {}).get("ops", {})
+        for op, timing in result.get("ops", {}).items():
+            if op not in base_ops:
+                continue
+            before = base_ops[op]["seconds"]
+            after = timing["seconds"]
+            ratio = after / before if before > 0 else float("inf")
+            if ratio > 1 + threshold and after - before > min_delta:
+                status = "REGRESSION"
+            elif ratio < 1 - threshold and before - after > min_delta:
+                status = "FASTER"
+            else:
+                status = "ok"
+            rows.append({"scenario": scenario, "op": op, "baseline": before, "current": after,
+                         "ratio": ratio, "status": status})
+    return rows
+
+
+def format_comparison(rows: List[Dict]) -> str:
+    if not rows:
+        return "No scenarios in common with the baseline."
+    lines = [f"{'scenario':<14} {'op':<20} {'baseline':>10} {'current':>10} {'ratio':>7}  status"]
+    for r in rows:
+        lines.append(f"{r['scenario']:<14} {r['op']:<20} {r['baseline']:>9.3f}s {r['current']:>9.3f}s "
+                     f"{r['ratio']:>6.2f}x  {r['status']}")
+    regressions = sum(1 for r in rows if r["status"] == "REGRESSION")
+    lines.append("")
+    lines.append(f"{regressions} regression(s) in {len(rows)} comparisons.")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flag benchmark regressions against a baseline.")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown (0.25 = 25%%)")
+    parser.add_argument("--min-delta", type=float, default=0.02, help="Ignore slowdowns below this many seconds")
+    args = parser.parse_args()
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+    rows = compare(baseline, current, threshold=args.threshold, min_delta=args.min_delta)
+    print(format_comparison(rows))
+    if any(r["status"] == "REGRESSION" for r in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
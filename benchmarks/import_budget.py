@@ -0,0 +1,98 @@
+"""
+Import-time budget for the lightweight entry points.
+
+Each target is imported in a fresh interpreter with `-X importtime`; the
+check fails if the import takes longer than its budget (best of --repeat),
+or if it pulls in a module that the target must not load at import time
+(pandas, vnstock, apscheduler, ... belong inside the commands that use them).
+
+Budgets are generous multiples of the reference below, so only a heavy
+import creeping back in trips them, not machine noise.
+
+Reference (Python 3.11, dev host, interpreter startup included): cli ~230 ms,
+test-telegram ~290 ms, init-db ~420 ms, api ~820 ms; before lazy imports the
+CLI alone took ~1.1 s, plus vnstock's own import where it is installed.
+
+Usage:
+    python -m benchmarks.import_budget [--check] [--target cli]
+"""
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY = ("pandas", "numpy", "vnstock", "apscheduler", "jinja2", "pyarrow")
+DB = ("sqlalchemy", "psycopg")
+
+# name: (import statement, budget ms, modules that must not be imported)
+TARGETS = {
+    # `python -m src.app.cli.main --help` and the module-level wrapper
+    "cli": ("import src.app.cli.main, src.app.db.instrumentation", 400, HEAVY + DB + ("fastapi",)),
+    "test-telegram": ("import src.app.cli.main, src.app.notification.telegram", 500, HEAVY + DB + ("fastapi",)),
+    "init-db": ("import src.app.cli.main, src.app.db.init_db", 800, HEAVY + ("sqlalchemy",)),
+    # API workers: the analysis stack is imported by warmup, not at import
+    "api": ("import src.app.main", 2000, HEAVY),
+}
+
+
+def measure(statement: str) -> Tuple[float, Dict[str, float]]:
+    """
+    (total ms, {module: cumulative ms}) of one import in a fresh interpreter.
+    """
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], cwd=ROOT,
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"`{statement}` failed:\n{proc.stderr[-2000:]}")
+    total = 0.0
+    modules: Dict[str, float] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        ms = int(cumulative) / 1000
+        modules[name.strip()] = ms
+        if not name[1:].startswith(" "):
+            # Top-level entry: its cumulative time includes everything below it
+            total += ms
+    return total, modules
+
+
+def check(name: str, repeat: int) -> List[str]:
+    statement, budget_ms, forbidden = TARGETS[name]
+    runs = [measure(statement) for _ in range(repeat)]
+    total, modules = min(runs, key=lambda r: r[0])
+    loaded = [m for m in forbidden if m in modules]
+    heaviest = sorted(((ms, m) for m, ms in modules.items() if "." not in m), reverse=True)[:5]
+
+    status = "ok" if total <= budget_ms and not loaded else "FAIL"
+    print(f"{name:<14} {total:>8.0f} ms  (budget {budget_ms} ms)  {status}")
+    print("               heaviest: " + ", ".join(f"{m} {ms:.0f}" for ms, m in heaviest))
+    problems = []
+    if total > budget_ms:
+        problems.append(f"{name}: {total:.0f} ms exceeds the {budget_ms} ms budget")
+    if loaded:
+        problems.append(f"{name}: imports {', '.join(loaded)} at import time")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check import times of the lightweight entry points.")
+    parser.add_argument("--target", action="append", choices=sorted(TARGETS), help="Repeat for several (default: all)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--check", action="store_true", help="Exit 1 if a budget is exceeded")
+    args = parser.parse_args()
+
+    problems = []
+    for name in args.target or list(TARGETS):
+        problems.extend(check(name, args.repeat))
+    for p in problems:
+        print(f"FAIL: {p}")
+    if args.check and problems:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
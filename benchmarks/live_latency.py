@@ -0,0 +1,191 @@
+"""
+Quote-to-ranking latency of the live mode on seeded synthetic bars.
+
+For each scenario a LiveEngine is seeded with the lookback window of every
+symbol (what LiveEngine.load reads from the DB), then fed --ticks quote
+batches covering the whole universe, of which a --moving share actually
+trades. Latency per tick is LiveEngine.apply plus serializing the ranking
+body, i.e. from the quotes arriving to /live/ranking serving the new order.
+
+The live results are then checked against the batch path: sampled symbols'
+bars, ending in the bar the quotes should have formed (after the ticks, and
+again after a quote that starts the next bar), go through
+calculate_indicators, Scorer.calculate_score and generate_trade_plan; score,
+breakdown and stop loss must be identical.
+
+Reference (dev host), 400 symbols: p50 ~13 ms with every symbol trading
+each tick (p99 < 100 ms), ~7 ms with 10% trading; 30 symbols ~2 ms. The
+target is sub-second.
+
+Usage:
+    python -m benchmarks.live_latency [--check] [--scenario 1D_400]
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import timedelta
+from typing import Dict, List
+from zoneinfo import ZoneInfo
+
+import pandas as pd
+
+from src.app.core.config import settings
+from src.app.core.live import LiveEngine
+from src.app.core.pipeline import compute_batch_features
+from src.app.data_provider.quotes import Quote
+from src.app.logic.indicators import calculate_indicators
+from src.app.logic.scorer import Scorer
+from src.app.logic.signals import generate_trade_plan
+from src.app.logic.streaming import TIMEFRAME_MINUTES, bar_key
+
+from benchmarks.synthetic import DEFAULT_SEED, generate_batches
+
+# Sessions in the default lookback (pipeline.LOOKBACK_DAYS calendar days)
+LOOKBACK_BARS = {"1D": 140, "15m": 140 * 16}
+SCENARIOS = {f"{tf}_{n}": (tf, n) for tf in LOOKBACK_BARS for n in (30, 400)}
+OHLCV = ['open', 'high', 'low', 'close', 'volume']
+START_VOLUME = 1_000_000.0  # cumulative session volume of the first quote
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Oracle:
+    """
+    The bars one symbol should have after the quotes so far, built without
+    FormingBar: a daily bar's volume is the cumulative session volume, an
+    intraday bar's is what traded since it started.
+    """
+    def __init__(self, bars: pd.DataFrame, daily: bool):
+        bars = bars[['ts'] + OHLCV].reset_index(drop=True)
+        self.completed = bars.iloc[:-1]
+        self.current = bars.iloc[-1].to_dict()
+        self.daily = daily
+        self.cumulative = START_VOLUME
+        self.bar_start_volume = START_VOLUME - self.current['volume']
+
+    @property
+    def bars(self) -> pd.DataFrame:
+        return pd.concat([self.completed, pd.DataFrame([self.current])], ignore_index=True)
+
+    def quote(self, price: float, traded: float) -> float:
+        self.cumulative += traded
+        bar = self.current
+        bar['close'] = price
+        bar['high'] = max(bar['high'], price)
+        bar['low'] = min(bar['low'], price)
+        bar['volume'] = self.cumulative if self.daily else self.cumulative - self.bar_start_volume
+        return self.cumulative
+
+    def new_bar(self, step: timedelta, price: float, traded: float) -> float:
+        self.completed = self.bars
+        self.bar_start_volume = self.cumulative
+        self.cumulative += traded
+        self.current = {'ts': self.current['ts'] + step, 'open': price, 'high': price, 'low': price, 'close': price,
+                        'volume': self.cumulative if self.daily else traded}
+        return self.cumulative
+
+
+def run_scenario(timeframe: str, n_symbols: int, ticks: int, moving: float, sample: int, seed: int) -> Dict:
+    rng = random.Random(seed)
+    daily = timeframe == "1D"
+    features, oracles = [], {}
+    for batch, bars in generate_batches(n_symbols, LOOKBACK_BARS[timeframe], settings.PIPELINE_BATCH_SIZE,
+                                        seed=seed, timeframe=timeframe):
+        for sym, (_, df) in zip(batch, bars.groupby('symbol_id', sort=False)):
+            oracles[sym.symbol] = Oracle(df, daily)
+        features.extend(compute_batch_features(batch, bars))
+
+    engine = LiveEngine()
+    started = time.perf_counter()
+    engine.seed(features, "BENCH", timeframe, "bench", Scorer())
+    seed_seconds = time.perf_counter() - started
+
+    # Quotes inside the last (forming) bar of the synthetic data
+    tz = ZoneInfo(settings.APP_TIMEZONE)
+    step = timedelta(days=1) if daily else timedelta(minutes=TIMEFRAME_MINUTES[timeframe])
+    quote_ts = bar_key(features[0]['df']['ts'].iloc[-1], timeframe, tz) + step / 3
+
+    latencies = []
+    for tick in range(ticks):
+        quotes = []
+        for sym, oracle in oracles.items():
+            price = oracle.current['close']
+            traded = 0.0
+            if tick and rng.random() < moving:
+                price = round(price * (1 + rng.gauss(0, 0.003)), 2)
+                traded = float(rng.randint(100, 50_000))
+            quotes.append(Quote(sym, quote_ts, price, oracle.quote(price, traded)))
+        t0 = time.perf_counter()
+        engine.apply(quotes)
+        engine.body("ranking")
+        latencies.append(time.perf_counter() - t0)
+
+    mismatches = _verify(engine, oracles, rng.sample(sorted(oracles), min(sample, len(oracles))))
+
+    # A quote in the next bar commits the forming one and starts a new bar
+    quotes = []
+    for sym, oracle in oracles.items():
+        price = round(oracle.current['close'] * (1 + rng.gauss(0, 0.003)), 2)
+        quotes.append(Quote(sym, quote_ts + step, price, oracle.new_bar(step, price, float(rng.randint(100, 50_000)))))
+    engine.apply(quotes)
+    mismatches += _verify(engine, oracles, rng.sample(sorted(oracles), min(sample, len(oracles))))
+
+    return {
+        "seed_seconds": seed_seconds,
+        "p50_ms": _percentile(latencies, 0.50) * 1000,
+        "p99_ms": _percentile(latencies, 0.99) * 1000,
+        "max_ms": max(latencies) * 1000,
+        "mismatches": mismatches,
+    }
+
+
+def _verify(engine: LiveEngine, oracles: Dict[str, Oracle], sample: List[str]) -> List[str]:
+    """
+    Sampled symbols whose live result differs from the batch path.
+    """
+    items = {x['symbol']: x for x in engine.ranking()}
+    scorer = Scorer()
+    bad = []
+    for sym in sample:
+        df = calculate_indicators(oracles[sym].bars.copy())
+        batch = scorer.calculate_score(df)
+        plan = generate_trade_plan(df, batch)
+        live = items[sym]
+        if (batch['score_total'] != live['score_total'] or batch['breakdown'] != live['breakdown']
+                or plan['stop_loss'] != live['signal']['stop_loss']):
+            bad.append(f"{sym}: batch {batch['score_total']} / live {live['score_total']}")
+    return bad
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure live-mode quote-to-ranking latency on synthetic bars.")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="Repeat for several (default: all)")
+    parser.add_argument("--ticks", type=int, default=100, help="Quote batches per scenario")
+    parser.add_argument("--moving", type=float, default=1.0, help="Share of symbols trading per tick")
+    parser.add_argument("--sample", type=int, default=50, help="Symbols compared with the batch path")
+    parser.add_argument("--budget-ms", type=float, default=1000.0, help="p99 latency allowed with --check")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--check", action="store_true", help="Exit 1 over budget or on any mismatch")
+    args = parser.parse_args()
+
+    problems = []
+    for name in args.scenario or list(SCENARIOS):
+        timeframe, n_symbols = SCENARIOS[name]
+        r = run_scenario(timeframe, n_symbols, args.ticks, args.moving, args.sample, args.seed)
+        print(f"{name:<9} seed {r['seed_seconds']:.2f}s  per tick p50 {r['p50_ms']:.1f} ms  "
+              f"p99 {r['p99_ms']:.1f} ms  max {r['max_ms']:.1f} ms  mismatches {len(r['mismatches'])}", flush=True)
+        if r['p99_ms'] > args.budget_ms:
+            problems.append(f"{name}: p99 {r['p99_ms']:.0f} ms exceeds {args.budget_ms:.0f} ms")
+        problems.extend(f"{name}: {m}" for m in r['mismatches'])
+    for p in problems:
+        print(f"FAIL: {p}")
+    if args.check and problems:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Full-market scale benchmark: a 1,600-symbol daily run.
+
+Budget (checked with --check, exit code 1 when exceeded):
+
+    1,600 symbols x 250 daily bars, batches of PIPELINE_BATCH_SIZE
+    - pipeline stages (DB read in --universe mode, indicators, scoring,
+      trade plans, ranking, row building, Markdown report):   <= 30 s wall
+    - peak RSS of the whole process:                          <= 600 MB
+
+Generating the synthetic bars is not part of the run and is reported apart.
+Reference (one core, pandas 3): ~2 s of stages and ~210 MB RSS; before
+batching (per-symbol reads and indicators) the stages alone took ~19 s.
+
+Synthetic mode (default) needs no database or network and covers the CPU and
+memory side of the pipeline through the same functions the run uses
+(compute_batch_features, score_features, build_score_rows, report_item,
+Reporter). With --universe CODE the bars are read from the configured
+database instead (score_members with fetch disabled), so the DB read path is timed as well; that
+mode runs but does not persist, and is checked against the same budget.
+
+Usage:
+    python -m benchmarks.scale_run [--symbols 1600] [--bars 250] [--check]
+    python -m benchmarks.scale_run --universe HOSE_ALL --check
+"""
+import argparse
+import asyncio
+import json
+import resource
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+from src.app.core import pipeline
+from src.app.core.config import settings
+from src.app.core.profiling import RunProfiler, format_profile_summary
+from src.app.logic.reporting import Reporter
+from src.app.logic.scorer import Scorer
+
+from benchmarks.synthetic import DEFAULT_SEED, generate_batches
+
+BUDGET_SECONDS = 30.0
+BUDGET_RSS_MB = 600.0
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def finish(results, run_id, profiler: RunProfiler) -> None:
+    """
+    Everything after scoring that does not need the DB.
+    """
+    with profiler.stage("rank"):
+        results.sort(key=lambda x: x['score_total'], reverse=True)
+        top3 = results[:3]
+    with profiler.stage("score_rows"):
+        for item in results:
+            if item.get('breakdown'):
+                pipeline.build_score_rows(run_id, item)
+    with profiler.stage("report_db"):
+        ranking = [pipeline.report_item(x) for x in results]
+        json.dumps(ranking, default=str)
+    with profiler.stage("report_files"):
+        with tempfile.TemporaryDirectory() as tmp:
+            Reporter(output_dir=tmp).render("md", str(run_id), top3, results, datetime.now())
+
+
+def run_synthetic(n_symbols: int, n_bars: int, batch_size: int, seed: int, profiler: RunProfiler):
+    scorer = Scorer()
+    run_id = uuid.uuid4()
+    results = []
+    for rows, bars in generate_batches(n_symbols, n_bars, batch_size, seed=seed):
+        features = pipeline.compute_batch_features(rows, bars, profiler)
+        results.extend(pipeline.score_features(features, scorer, run_id, profiler=profiler))
+    finish(results, run_id, profiler)
+    return len(results)
+
+
+async def run_db(universe: str, timeframe: str, profiler: RunProfiler):
+    from src.app.db.session import AsyncSessionLocal, engine
+    try:
+        async with AsyncSessionLocal() as db:
+            univ_obj, _ = await pipeline.resolve_run_dimensions(db, universe, timeframe)
+            members = await pipeline.get_members(db, univ_obj)
+            run_id = uuid.uuid4()
+            results = await pipeline.score_members(db, members, timeframe, Scorer(), run_id,
+                                                   profiler=profiler, fetch=False)
+        finish(results, run_id, profiler)
+        return len(results)
+    finally:
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--symbols", type=int, default=1600)
+    parser.add_argument("--bars", type=int, default=250)
+    parser.add_argument("--batch-size", type=int, default=settings.PIPELINE_BATCH_SIZE)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--universe", help="Read bars of this universe from the database instead")
+    parser.add_argument("--timeframe", default="1D")
+    parser.add_argument("--check", action="store_true", help="Exit 1 if the budget is exceeded")
+    args = parser.parse_args()
+
+    profiler = RunProfiler(enabled=True, trace_memory=False)
+    start = time.perf_counter()
+    if args.universe:
+        scored = asyncio.run(run_db(args.universe, args.timeframe, profiler))
+        label = f"{args.universe}/{args.timeframe} from DB"
+    else:
+        scored = run_synthetic(args.symbols, args.bars, args.batch_size, args.seed, profiler)
+        label = f"{args.symbols} synthetic symbols x {args.bars} bars"
+    elapsed = time.perf_counter() - start
+    stages = profiler.stage_totals()
+    seconds = sum(s['wall_ms'] for s in stages) / 1000
+    rss = peak_rss_mb()
+
+    print(format_profile_summary(stages, profiler.symbol_totals(), top=5))
+    print("")
+    print(f"{label}: {scored} scored, pipeline stages {seconds:.1f}s ({seconds / max(scored, 1) * 1000:.2f} ms/symbol), "
+          f"{elapsed:.1f}s elapsed, peak RSS {rss:.0f} MB")
+    print(f"Budget: {BUDGET_SECONDS:.0f}s, {BUDGET_RSS_MB:.0f} MB")
+
+    if args.check and (seconds > BUDGET_SECONDS or rss > BUDGET_RSS_MB):
+        print("FAIL: scale budget exceeded")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
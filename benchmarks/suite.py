@@ -0,0 +1,213 @@
+"""
+Benchmark suite for the analysis hot paths on seeded synthetic bars.
+
+Scenarios (timeframe, symbols, bars per symbol):
+    1D: 30 / 400 / 1,600 symbols x 1 / 5 / 10 years
+    1H and 15m: 30 / 400 symbols x 1 year
+
+Operations timed per scenario (seconds for all symbols, best of --repeat):
+    indicators          calculate_indicators, one frame per symbol
+    indicators_grouped  calculate_indicators_grouped, PIPELINE_BATCH_SIZE symbols per pass
+    score               Scorer.calculate_score
+    trade_plan          generate_trade_plan
+  with --db (writes throwaway ZZB* symbols to the configured database and
+  deletes them afterwards; use a scratch database):
+    save_ohlcv          DataProvider._save_ohlcv + commit, per symbol
+    read_bars           client.read_bars, per symbol
+    read_bars_batch     pipeline.read_bars_batch, per batch
+
+Results are written as JSON. --baseline compares against a stored result
+(see benchmarks/compare.py) and exits 1 on regressions.
+
+Usage:
+    python -m benchmarks.suite --quick
+    python -m benchmarks.suite --output benchmarks/baselines/local.json
+    python -m benchmarks.suite --scenario 1D_400x5y --baseline benchmarks/baselines/local.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from src.app.core.config import settings
+from src.app.logic.indicators import calculate_indicators, calculate_indicators_grouped
+from src.app.logic.scorer import Scorer
+from src.app.logic.signals import generate_trade_plan
+
+from benchmarks.compare import compare, format_comparison
+from benchmarks.synthetic import BARS_PER_YEAR, DEFAULT_SEED, generate_batches
+
+SCENARIOS = {}
+for _n in (30, 400, 1600):
+    for _years in (1, 5, 10):
+        SCENARIOS[f"1D_{_n}x{_years}y"] = ("1D", _n, BARS_PER_YEAR["1D"] * _years)
+for _tf in ("1H", "15m"):
+    for _n in (30, 400):
+        SCENARIOS[f"{_tf}_{_n}x1y"] = (_tf, _n, BARS_PER_YEAR[_tf])
+QUICK = ["1D_30x1y", "1D_400x1y", "1D_30x10y", "1H_30x1y", "15m_30x1y"]
+
+DB_SYMBOL_PREFIX = "ZZB"
+
+
+def _timed(totals: Dict[str, float], op: str, fn: Callable):
+    start = time.perf_counter()
+    result = fn()
+    totals[op] = totals.get(op, 0.0) + time.perf_counter() - start
+    return result
+
+
+def run_compute(timeframe: str, n_symbols: int, n_bars: int, seed: int) -> Dict[str, float]:
+    totals: Dict[str, float] = {}
+    scorer = Scorer()
+    for _, bars in generate_batches(n_symbols, n_bars, settings.PIPELINE_BATCH_SIZE, seed=seed, timeframe=timeframe):
+        _timed(totals, "indicators_grouped", lambda: calculate_indicators_grouped(bars.copy()))
+
+        frames = [group.reset_index(drop=True) for _, group in bars.groupby("symbol_id", sort=False)]
+        frames = _timed(totals, "indicators", lambda: [calculate_indicators(df) for df in frames])
+        scores = _timed(totals, "score", lambda: [scorer.calculate_score(df) for df in frames])
+        _timed(totals, "trade_plan", lambda: [generate_trade_plan(df, s) for df, s in zip(frames, scores)])
+    return totals
+
+
+async def run_db(timeframe: str, n_symbols: int, n_bars: int, seed: int) -> Dict[str, float]:
+    from sqlalchemy import delete, select
+    from sqlalchemy.dialects.postgresql import insert
+    from src.app.core import pipeline
+    from src.app.data_provider.client import DataProvider, read_bars
+    from src.app.db.lookups import dimensions
+    from src.app.db.models import MarketSymbol, OhlcvBar, OhlcvCoverage
+    from src.app.db.session import AsyncSessionLocal
+
+    totals: Dict[str, float] = {}
+    names = [f"{DB_SYMBOL_PREFIX}{i:04d}" for i in range(1, n_symbols + 1)]
+    async with AsyncSessionLocal() as db:
+        timeframe_id = await dimensions.timeframe_id(db, timeframe)
+        await db.execute(insert(MarketSymbol).values([{"symbol": s, "exchange": "BENCH"} for s in names])
+                         .on_conflict_do_nothing(index_elements=["symbol"]))
+        ids = dict((await db.execute(select(MarketSymbol.symbol, MarketSymbol.symbol_id)
+                                     .where(MarketSymbol.symbol.in_(names)))).all())
+        await db.commit()
+        symbol_ids = [ids[s] for s in names]
+        try:
+            dp = DataProvider(db)
+            start = None
+            for _, bars in generate_batches(n_symbols, n_bars, settings.PIPELINE_BATCH_SIZE, seed=seed, timeframe=timeframe):
+                start = bars["ts"].min() if start is None else start
+                for synthetic_id, group in bars.groupby("symbol_id", sort=False):
+                    frame = group.rename(columns={"ts": "time"})[["time", "open", "high", "low", "close", "volume"]]
+                    t0 = time.perf_counter()
+                    await dp._save_ohlcv(frame, symbol_ids[synthetic_id - 1], timeframe_id)
+                    await db.commit()
+                    totals["save_ohlcv"] = totals.get("save_ohlcv", 0.0) + time.perf_counter() - t0
+
+            # Per-symbol reads, as the pre-batching pipeline and the API do
+            dimensions.symbols.update(ids)
+            for name in names:
+                t0 = time.perf_counter()
+                await read_bars(db, name, timeframe, start=start)
+                totals["read_bars"] = totals.get("read_bars", 0.0) + time.perf_counter() - t0
+            step = settings.PIPELINE_BATCH_SIZE
+            for i in range(0, len(symbol_ids), step):
+                t0 = time.perf_counter()
+                await pipeline.read_bars_batch(db, symbol_ids[i:i + step], timeframe_id, start)
+                totals["read_bars_batch"] = totals.get("read_bars_batch", 0.0) + time.perf_counter() - t0
+        finally:
+            await db.rollback()
+            await db.execute(delete(OhlcvBar).where(OhlcvBar.symbol_id.in_(symbol_ids)))
+            await db.execute(delete(OhlcvCoverage).where(OhlcvCoverage.symbol_id.in_(symbol_ids)))
+            await db.execute(delete(MarketSymbol).where(MarketSymbol.symbol_id.in_(symbol_ids)))
+            await db.commit()
+            for name in names:
+                dimensions.symbols.pop(name, None)
+    return totals
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              timeout=10).stdout.strip()
+    except Exception:
+        return ""
+
+
+def run_suite(names: List[str], repeat: int, seed: int, with_db: bool) -> Dict:
+    results = {}
+    for name in names:
+        timeframe, n_symbols, n_bars = SCENARIOS[name]
+        # Small scenarios are noisy: take the best of several runs
+        runs = repeat if n_symbols * n_bars <= 200_000 else 1
+        best: Dict[str, float] = {}
+        for _ in range(runs):
+            for op, seconds in run_compute(timeframe, n_symbols, n_bars, seed).items():
+                best[op] = min(best.get(op, seconds), seconds)
+        if with_db:
+            best.update(asyncio.run(run_db(timeframe, n_symbols, n_bars, seed)))
+
+        results[name] = {
+            "timeframe": timeframe,
+            "symbols": n_symbols,
+            "bars": n_bars,
+            "ops": {op: {"seconds": round(s, 4), "per_symbol_ms": round(s / n_symbols * 1000, 3)}
+                    for op, s in best.items()},
+        }
+        summary = ", ".join(f"{op} {s:.2f}s" for op, s in best.items())
+        print(f"{name:<14} {summary}", flush=True)
+
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "machine": f"{platform.system()} {platform.machine()}, {os.cpu_count()} CPUs",
+            "seed": seed,
+            "batch_size": settings.PIPELINE_BATCH_SIZE,
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analysis hot paths on synthetic bars.")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="Repeat for several (default: all)")
+    parser.add_argument("--quick", action="store_true", help=f"Only {', '.join(QUICK)}")
+    parser.add_argument("--db", action="store_true", help="Also time _save_ohlcv and the DB read path (scratch DB!)")
+    parser.add_argument("--repeat", type=int, default=3, help="Best-of runs for small scenarios")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--output", help="Write results JSON here")
+    parser.add_argument("--baseline", help="Compare with this results JSON; exit 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    names = args.scenario or (QUICK if args.quick else list(SCENARIOS))
+    report = run_suite(names, args.repeat, args.seed, args.db)
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare(baseline, report, threshold=args.threshold)
+        print("")
+        print(format_comparison(rows))
+        if any(r["status"] == "REGRESSION" for r in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Seeded synthetic OHLCV bars for benchmarks.
+
+Prices follow a geometric random walk with a per-symbol drift and volatility,
+volumes are lognormal with occasional spikes, so indicators, scores and trade
+plans take realistic, varied paths. The same seed always gives the same bars.
+Frames have the columns of ohlcv_bar, like pipeline.read_bars_batch returns.
+"""
+from typing import Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.app.core.pipeline import SymbolRow, BAR_COLUMNS
+
+DEFAULT_SEED = 42
+START = pd.Timestamp("2015-01-02", tz="UTC")
+
+# Bar open times (UTC) within a HOSE trading day: 09:15-11:30 and 13:00-14:45 local (UTC+7)
+SESSION_BARS = {
+    "1D": ["00:00"],
+    "1H": ["02:00", "03:00", "04:00", "06:00", "07:00"],
+    "15m": ["02:15", "02:30", "02:45", "03:00", "03:15", "03:30", "03:45", "04:00", "04:15",
+            "06:00", "06:15", "06:30", "06:45", "07:00", "07:15", "07:30"],
+}
+BARS_PER_YEAR = {tf: 252 * len(times) for tf, times in SESSION_BARS.items()}
+
+
+def symbol_rows(n_symbols: int) -> List[SymbolRow]:
+    return [SymbolRow(f"S{i:04d}", i) for i in range(1, n_symbols + 1)]
+
+
+def timestamps(n_bars: int, timeframe: str = "1D", start: pd.Timestamp = START) -> pd.DatetimeIndex:
+    """
+    `n_bars` bar times on business days, within trading sessions for intraday timeframes.
+    """
+    times = SESSION_BARS[timeframe]
+    days = pd.bdate_range(start, periods=-(-n_bars // len(times)), tz="UTC")
+    offsets = pd.to_timedelta([t + ":00" for t in times])
+    return (days.repeat(len(times)) + np.tile(offsets, len(days)))[:n_bars]
+
+
+def generate_bars(n_bars: int, seed: int, timeframe: str = "1D", symbol_id: int = 1,
+                  timeframe_id: int = 1, start: pd.Timestamp = START) -> pd.DataFrame:
+    """
+    One symbol's bars.
+    """
+    rng = np.random.default_rng(seed)
+    drift = rng.normal(0.0003, 0.0005)
+    vol = rng.uniform(0.01, 0.03)
+    close = rng.uniform(5_000, 150_000) * np.exp(np.cumsum(rng.normal(drift, vol, n_bars)))
+    open_ = np.concatenate(([close[0]], close[:-1])) * (1 + rng.normal(0, vol / 4, n_bars))
+    spread = np.abs(rng.normal(0, vol, n_bars)) * close
+    high = np.maximum(open_, close) + spread / 2
+    low = np.minimum(open_, close) - spread / 2
+    volume = rng.lognormal(13, 0.5, n_bars) * np.where(rng.random(n_bars) < 0.05, 3.0, 1.0)
+
+    ts = timestamps(n_bars, timeframe, start)
+    return pd.DataFrame({
+        "symbol_id": symbol_id,
+        "timeframe_id": timeframe_id,
+        "ts": ts,
+        "open": open_.round(2),
+        "high": high.round(2),
+        "low": low.round(2),
+        "close": close.round(2),
+        "volume": volume.round(0),
+        "source": "synthetic",
+        "ingested_at": ts,
+    }, columns=BAR_COLUMNS)
+
+
+def generate_batches(n_symbols: int, n_bars: int, batch_size: int, seed: int = DEFAULT_SEED,
+                     timeframe: str = "1D") -> Iterator[Tuple[List[SymbolRow], pd.DataFrame]]:
+    """
+    Lazily yield (symbol rows, bars of those symbols) batch by batch, ordered
+    by symbol then time, so the whole market is never held in memory at once.
+    """
+    rows = symbol_rows(n_symbols)
+    for i in range(0, n_symbols, batch_size):
+        batch = rows[i:i + batch_size]
+        frames = [generate_bars(n_bars, seed * 100_003 + sym.symbol_id, timeframe=timeframe, symbol_id=sym.symbol_id)
+                  for sym in batch]
+        yield batch, pd.concat(frames, ignore_index=True)
@@ -8,7 +8,7 @@ from src.app.db.session import AsyncSessionLocal
 from src.app.logic.indicators import calculate_indicators
 from src.app.logic.scorer import Scorer
 from src.app.logic.signals import generate_trade_plan
-from src.app.notification.telegram import TelegramBot
+from src.app.notification.telegram import TelegramBot, shutdown_outbox
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -59,6 +59,7 @@ async def run_analysis_and_report():
     
     print("Sending report to Telegram...")
     await bot.send_report(top3, run_id)
+    await shutdown_outbox()
     print("✅ Done.")
 
 if __name__ == "__main__":
@@ -0,0 +1,78 @@
+import asyncio
+import json
+import time
+import logging
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import select
+
+from src.app.core.config import settings
+from src.app.core.metrics import CACHE_REQUESTS
+from src.app.db.models import AnalysisRun, RunReport
+from src.app.db.session import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class LatestRunCache:
+    """
+    Pre-serialized JSON bodies of the latest successful run's report.
+
+    The latest run_id is re-checked at most every `revalidate_seconds` (one
+    indexed query no matter how many clients poll); bodies are rebuilt only
+    when that run_id changes. Runs finished in this process invalidate the
+    cache immediately.
+    """
+    FIELDS = ("top3", "ranking")
+
+    def __init__(self, revalidate_seconds: float = None):
+        self.revalidate_seconds = revalidate_seconds if revalidate_seconds is not None else settings.API_CACHE_REVALIDATE_SECONDS
+        self.run_id = None
+        self._bodies: Dict[str, Tuple[bytes, str]] = {}
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        self._checked_at = 0.0
+
+    async def get(self, field: str) -> Optional[Tuple[bytes, str]]:
+        """
+        (body, etag) for `field` of the latest report, or None if there is no report.
+        """
+        result = "hit"
+        if time.monotonic() - self._checked_at >= self.revalidate_seconds:
+            async with self._lock:
+                # Another request may have refreshed while we waited
+                if time.monotonic() - self._checked_at >= self.revalidate_seconds:
+                    result = "miss" if await self._refresh() else "revalidated"
+        CACHE_REQUESTS.inc(cache="latest_run", result=result)
+        return self._bodies.get(field)
+
+    async def _refresh(self) -> bool:
+        """
+        Re-check the latest run; True if the bodies were rebuilt.
+        """
+        rebuilt = False
+        async with AsyncSessionLocal() as db:
+            stmt = select(AnalysisRun.run_id).where(AnalysisRun.status == 'success')\
+                .order_by(AnalysisRun.finished_at.desc()).limit(1)
+            latest = (await db.execute(stmt)).scalar_one_or_none()
+            if latest is not None and latest != self.run_id:
+                report = await db.get(RunReport, latest)
+                if report:
+                    self._bodies = {
+                        field: (self._serialize(getattr(report, field)), f'"{latest}-{field}"')
+                        for field in self.FIELDS
+                    }
+                    self.run_id = latest
+                    rebuilt = True
+                    logger.info(f"Response cache now serving run {latest}")
+        self._checked_at = time.monotonic()
+        return rebuilt
+
+    @staticmethod
+    def _serialize(value) -> bytes:
+        return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+
+
+latest_run_cache = LatestRunCache()
@@ -0,0 +1,66 @@
+import json
+import logging
+
+import numpy as np
+import pandas as pd
+from fastapi import Response
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+
+def wants_arrow(fmt: str, accept: str) -> bool:
+    if fmt == "arrow":
+        return True
+    return fmt is None and ARROW_MEDIA_TYPE in (accept or "")
+
+
+def _ts_millis(ts: pd.Series) -> np.ndarray:
+    return (pd.to_datetime(ts, utc=True).astype("int64") // 1_000_000).to_numpy()
+
+
+def to_arrow(df: pd.DataFrame) -> bytes:
+    """
+    Arrow IPC stream (ts as UTC timestamp[ms], everything else float64).
+    """
+    columns = {"ts": pa.array(_ts_millis(df["ts"]), type=pa.timestamp("ms", tz="UTC"))}
+    for col in df.columns:
+        if col != "ts":
+            columns[col] = pa.array(df[col].to_numpy(dtype=float), type=pa.float64())
+    table = pa.table(columns)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def to_columnar_json(df: pd.DataFrame, meta: dict) -> bytes:
+    """
+    {"columns": [...], "data": {"ts": [epoch_ms...], "close": [...]}, ...meta}
+    Column-major keeps field names out of every row; NaN becomes null.
+    """
+    data = {"ts": _ts_millis(df["ts"]).tolist()}
+    for col in df.columns:
+        if col != "ts":
+            values = df[col].to_numpy(dtype=float)
+            data[col] = [None if np.isnan(v) else round(float(v), 6) for v in values]
+    body = {**meta, "columns": list(data.keys()), "rows": len(df), "data": data}
+    return json.dumps(body, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def columnar_response(df: pd.DataFrame, meta: dict, fmt: str = None, accept: str = None) -> Response:
+    if wants_arrow(fmt, accept):
+        if pa is None:
+            if fmt == "arrow":
+                return Response(status_code=406, content=b'{"error":"pyarrow not installed, use format=json"}',
+                                media_type="application/json")
+        else:
+            return Response(content=to_arrow(df), media_type=ARROW_MEDIA_TYPE,
+                            headers={"X-Meta": json.dumps(meta, default=str)})
+    return Response(content=to_columnar_json(df, meta), media_type="application/json")
@@ -1,54 +1,422 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import select, desc
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import select, desc, tuple_
+from sqlalchemy.exc import NoResultFound
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List, Optional
+from typing import List, Optional, Literal
+from datetime import datetime, timezone, timedelta
+import asyncio
+import uuid
+from src.app.core.config import settings
+from src.app.core.metrics import CONTENT_TYPE, REGISTRY
 from src.app.db.session import get_db
-from src.app.db.models import AnalysisRun, RunReport, RunScore
+from src.app.db.lookups import dimensions
+from src.app.db.models import AnalysisRun, RunReport, RunScore, MarketSymbol
+from src.app.core.run_manager import run_manager
+from src.app.api.cache import latest_run_cache
+from src.app.api.events import broadcaster, event_stream
+from src.app.core.live import live_engine
+from fastapi.responses import StreamingResponse, JSONResponse
 from pydantic import BaseModel
 
 router = APIRouter()
 
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+def _on_run_event(event: str, state):
+    # Push lifecycle events to SSE subscribers; a finished run also makes the
+    # cached latest report stale right away
+    if event == 'finished':
+        latest_run_cache.invalidate()
+        broadcaster.publish(f"run.{state.status}", {"run_id": str(state.run_id), "error": state.error})
+        if state.status == 'success':
+            broadcaster.announce_top3(state.run_id, state.top3)
+    elif event == 'progress':
+        broadcaster.publish("run.progress", {
+            "run_id": str(state.run_id), "done": state.done, "total": state.total, "symbol": state.current_symbol
+        })
+    else:
+        broadcaster.publish(f"run.{event}", {
+            "run_id": str(state.run_id), "universe": state.universe,
+            "timeframe": state.timeframe, "strategy": state.strategy
+        })
+
+run_manager.add_listener(_on_run_event)
+
+def _on_live_event(event: str, data: dict):
+    # live.ranking after every tick that moved a score, live.top3 when the top 3 change
+    broadcaster.publish(f"live.{event}", data)
+
+live_engine.add_listener(_on_live_event)
+
+class QuoteIn(BaseModel):
+    symbol: str
+    price: float
+    volume: Optional[float] = None  # cumulative session volume
+    open: Optional[float] = None
+    high: Optional[float] = None
+    low: Optional[float] = None
+    ts: Optional[datetime] = None  # default: now
+
 class RunRequest(BaseModel):
     timeframe: str = "1D"
     universe: str = "VN30"
     strategy: str = "shortterm_v1"
+    notify: bool = False
 
 @router.get("/health")
 def health_check():
     return {"status": "ok"}
 
-@router.post("/run")
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Runtime metrics of this worker process in the Prometheus text format.
+    """
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@router.get("/ready")
+async def ready_check(request: Request, wait: float = Query(0, ge=0, le=60)):
+    """
+    200 once startup warmup has finished, 503 (with the last warmup error) before.
+    `wait` blocks up to that many seconds for warmup to complete.
+    """
+    state = request.app.state
+    done = getattr(state, "warmup_done", None)
+    if wait and done is not None and not done.is_set():
+        try:
+            await asyncio.wait_for(done.wait(), timeout=wait)
+        except asyncio.TimeoutError:
+            pass
+    if getattr(state, "ready", False):
+        return {"status": "ready"}
+    body = {"status": "warming_up"}
+    if getattr(state, "warmup_error", None):
+        body["error"] = state.warmup_error
+    return JSONResponse(status_code=503, content=body)
+
+@router.post("/run", status_code=202)
 async def trigger_run(req: RunRequest):
-    # Trigger run logic (could be async background task or synchronous)
-    # For MVP, we might call the logic directly or subprocess.
-    # Calling subprocess via CLI is safer if logic is heavy, but direct valid too.
-    # To keep this fast, let's just return a message or launch background task?
-    # Requirement: "trả top3 + ranking + breakdown (đồng thời lưu DB)"
-    # So it implies synchronous wait or return result.
-    return {"message": "Run triggered (synchronous implementation pending / use CLI for now)"}
-    # NOTE: Fully integrating the CLI run logic into API requires refactoring run() to be reusable function
-    # taking session. CLI run() currently handles session.
-    # We will implement this if requested, but for now focusing on result serving.
+    """
+    Start an analysis in the background and return its run_id immediately.
+    An identical run already in flight is joined instead of started twice.
+    """
+    try:
+        state, deduplicated = await run_manager.submit(req.universe, req.timeframe, req.strategy, notify=req.notify)
+    except NoResultFound:
+        raise HTTPException(status_code=404, detail=f"Unknown universe {req.universe}, timeframe {req.timeframe} or strategy {req.strategy}")
+    return {"run_id": str(state.run_id), "status": state.status, "deduplicated": deduplicated}
 
-@router.get("/top3")
-async def get_top3(db: AsyncSession = Depends(get_db)):
-    # Get latest successful run with report
-    stmt = select(RunReport).join(AnalysisRun).where(AnalysisRun.status == 'success').order_by(AnalysisRun.finished_at.desc()).limit(1)
-    res = (await db.execute(stmt)).scalar_one_or_none()
-    if not res:
+async def _cached_report_field(field: str, request: Request):
+    cached = await latest_run_cache.get(field)
+    if not cached:
         return {"error": "No reports found"}
-    return res.top3
+    body, etag = cached
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@router.get("/top3")
+async def get_top3(request: Request):
+    # Latest successful run's top3, served from the pre-serialized cache
+    return await _cached_report_field("top3", request)
 
 @router.get("/ranking")
-async def get_ranking(db: AsyncSession = Depends(get_db)):
-    stmt = select(RunReport).join(AnalysisRun).where(AnalysisRun.status == 'success').order_by(AnalysisRun.finished_at.desc()).limit(1)
-    res = (await db.execute(stmt)).scalar_one_or_none()
-    if not res:
-        return {"error": "No reports found"}
-    return res.ranking
+async def get_ranking(request: Request):
+    return await _cached_report_field("ranking", request)
+
+def _live_field(field: str, request: Request):
+    if not live_engine.running:
+        raise HTTPException(status_code=503, detail="Live mode is not running")
+    body, etag = live_engine.body(field)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@router.get("/live/ranking")
+async def get_live_ranking(request: Request):
+    """
+    Live ranking scored on the forming bar, straight from memory.
+    """
+    return _live_field("ranking", request)
+
+@router.get("/live/top3")
+async def get_live_top3(request: Request):
+    return _live_field("top3", request)
+
+@router.post("/live/quotes")
+async def push_live_quotes(quotes: List[QuoteIn]):
+    """
+    Feed quotes from an external source into the live ranking (instead of,
+    or on top of, price board polling). Returns the rescored symbols.
+    """
+    from src.app.data_provider.quotes import Quote
+
+    if not live_engine.running:
+        raise HTTPException(status_code=503, detail="Live mode is not running")
+    changed = live_engine.apply(Quote(q.symbol.upper(), q.ts, q.price, q.volume, q.open, q.high, q.low) for q in quotes)
+    return {"version": live_engine.version, "changed": changed}
+
+@router.get("/events")
+async def stream_events(request: Request):
+    """
+    Server-sent events: run.started, run.progress, run.success / run.failed
+    and top3 whenever a new run finishes (including CLI / scheduler runs);
+    live.ranking and live.top3 while live mode runs.
+    """
+    q = broadcaster.subscribe()
+    return StreamingResponse(
+        event_stream(request, q),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @router.get("/runs")
 async def get_runs(limit: int = 20, db: AsyncSession = Depends(get_db)):
     stmt = select(AnalysisRun).order_by(AnalysisRun.started_at.desc()).limit(limit)
     rows = (await db.execute(stmt)).scalars().all()
     return [{"run_id": r.run_id, "as_of": r.as_of, "status": r.status, "started_at": r.started_at} for r in rows]
+
+
+@router.get("/runs/{run_id}")
+async def get_run(run_id: uuid.UUID, db: AsyncSession = Depends(get_db)):
+    """
+    Status, progress and (once finished) top3/ranking of a run.
+    """
+    state = run_manager.get(run_id)
+    if state:
+        return state.as_dict()
+
+    # Not started by this process (CLI, scheduler, other worker) or evicted
+    run = await db.get(AnalysisRun, run_id)
+    report = await db.get(RunReport, run_id) if run else None
+    stored = None
+    if not run or (report and not report.ranking):
+        # Archived by retention, or its ranking was compacted: use the report store
+        from src.app.logic.reporting import get_report_store
+        stored = await asyncio.to_thread(get_report_store().load, str(run_id))
+    if not run:
+        if not stored:
+            raise HTTPException(status_code=404, detail="Run not found")
+        return {
+            "run_id": str(run_id),
+            "status": "archived",
+            "progress": None,
+            "as_of": stored["as_of"],
+            "top3": stored["top3"],
+            "ranking": stored["ranking"],
+        }
+    return {
+        "run_id": str(run.run_id),
+        "status": run.status,
+        "progress": None,
+        "started_at": run.started_at,
+        "finished_at": run.finished_at,
+        "error": run.error_message,
+        "top3": report.top3 if report else None,
+        "ranking": stored["ranking"] if stored else (report.ranking if report else None),
+    }
+
+
+def _score_row(rs: RunScore, symbol: str) -> dict:
+    return {
+        "run_id": str(rs.run_id),
+        "symbol": symbol,
+        "score_total": float(rs.score_total),
+        "breakdown": {
+            "trend": float(rs.score_trend or 0),
+            "base": float(rs.score_base or 0),
+            "breakout": float(rs.score_breakout or 0),
+            "volume": float(rs.score_volume or 0),
+            "momentum": float(rs.score_momentum or 0),
+            "risk": float(rs.score_risk or 0),
+        },
+        "penalties": rs.penalties,
+        "computed_at": rs.computed_at,
+    }
+
+@router.get("/runs/{run_id}/scores")
+async def get_run_scores(
+    run_id: uuid.UUID,
+    top_k: Optional[int] = Query(None, ge=1, le=500, description="Shortcut for limit with offset 0"),
+    min_score: Optional[float] = None,
+    symbol: Optional[str] = Query(None, description="Comma-separated symbols"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Ranking of one run from run_score (idx_run_score_rank), filtered and paginated.
+    """
+    if top_k:
+        offset, limit = 0, top_k
+    stmt = select(RunScore, MarketSymbol.symbol)\
+        .join(MarketSymbol, MarketSymbol.symbol_id == RunScore.symbol_id)\
+        .where(RunScore.run_id == run_id)
+    if min_score is not None:
+        stmt = stmt.where(RunScore.score_total >= min_score)
+    if symbol:
+        stmt = stmt.where(MarketSymbol.symbol.in_([s.strip().upper() for s in symbol.split(",") if s.strip()]))
+    # One extra row tells us whether there is a next page without a COUNT(*)
+    stmt = stmt.order_by(RunScore.score_total.desc(), RunScore.symbol_id).offset(offset).limit(limit + 1)
+
+    rows = (await db.execute(stmt)).all()
+    items = [_score_row(rs, sym) for rs, sym in rows[:limit]]
+    for rank, item in enumerate(items, offset + 1):
+        item["rank"] = rank
+    return {
+        "run_id": str(run_id),
+        "items": items,
+        "next_offset": offset + limit if len(rows) > limit and not top_k else None,
+    }
+
+@router.get("/symbols/{symbol}/scores")
+async def get_symbol_score_history(
+    symbol: str,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Score history of one symbol across runs, newest first, keyset-paginated
+    on (computed_at, run_id) so deep pages cost the same as the first.
+    """
+    sym_id = await dimensions.symbol_id(db, symbol.upper())
+    if sym_id is None:
+        raise HTTPException(status_code=404, detail="Symbol not found")
+
+    stmt = select(RunScore).where(RunScore.symbol_id == sym_id)
+    if cursor:
+        try:
+            ts_str, run_str = cursor.split("_", 1)
+            key = (EPOCH + timedelta(microseconds=int(ts_str)), uuid.UUID(run_str))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        stmt = stmt.where(tuple_(RunScore.computed_at, RunScore.run_id) < key)
+    stmt = stmt.order_by(RunScore.computed_at.desc(), RunScore.run_id.desc()).limit(limit + 1)
+
+    rows = (await db.execute(stmt)).scalars().all()
+    items = [_score_row(rs, symbol.upper()) for rs in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        # Epoch microseconds keep the cursor URL-safe (no '+' from a UTC offset)
+        next_cursor = f"{(last.computed_at - EPOCH) // timedelta(microseconds=1)}_{last.run_id}"
+    return {"symbol": symbol.upper(), "items": items, "next_cursor": next_cursor}
+
+
+@router.get("/coverage")
+async def get_coverage(
+    timeframe: str = "1D",
+    universe: Optional[str] = Query(None, description="List every member, including ones without bars"),
+    stale_after_hours: Optional[float] = Query(None, gt=0, description="Only symbols whose last bar is older"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Stored bar range per symbol from ohlcv_coverage (no scan of ohlcv_bar).
+    """
+    from src.app.data_provider.coverage import universe_coverage
+
+    timeframe_id = await dimensions.timeframe_id(db, timeframe)
+    if timeframe_id is None:
+        raise HTTPException(status_code=404, detail="Timeframe not found")
+    universe_id = None
+    if universe:
+        universe_id = await dimensions.universe_id(db, universe)
+        if universe_id is None:
+            raise HTTPException(status_code=404, detail="Universe not found")
+
+    rows = await universe_coverage(db, timeframe_id, universe_id)
+    if stale_after_hours is not None:
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=stale_after_hours)
+        rows = [r for r in rows if r.last_ts is None or r.last_ts < cutoff]
+    return {
+        "timeframe": timeframe,
+        "universe": universe,
+        "items": [{
+            "symbol": r.symbol,
+            "first_ts": r.first_ts,
+            "last_ts": r.last_ts,
+            "bar_count": r.bar_count or 0,
+            "last_ingested_at": r.last_ingested_at,
+            "last_changed_at": r.last_changed_at,
+        } for r in rows],
+    }
+
+
+# Extra bars loaded before `start` so indicators are settled at the first returned bar
+FEATURE_WARMUP_BARS = 100
+
+async def _bars_or_404(db: AsyncSession, symbol: str, timeframe: str, start, end, warmup: int = 0):
+    from src.app.data_provider.client import read_bars
+
+    df = await read_bars(db, symbol.upper(), timeframe, start=start, end=end, warmup=warmup)
+    if df is None:
+        raise HTTPException(status_code=404, detail="Unknown symbol or timeframe")
+    return df
+
+@router.get("/ohlcv/{symbol}")
+async def get_ohlcv(
+    symbol: str,
+    request: Request,
+    timeframe: str = "1D",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    max_points: Optional[int] = Query(None, ge=3, description="Downsample to at most this many points"),
+    method: Literal["ohlc", "lttb"] = "ohlc",
+    format: Optional[Literal["json", "arrow"]] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Bars of one symbol in columnar form (Arrow IPC stream or columnar JSON).
+    Long ranges can be reduced server-side by OHLC bucketing or LTTB on close.
+    """
+    from src.app.logic.downsample import ohlc_buckets, lttb
+    from src.app.api.columnar import columnar_response
+
+    df = await _bars_or_404(db, symbol, timeframe, start, end)
+    total = len(df)
+    if max_points:
+        df = ohlc_buckets(df, max_points) if method == "ohlc" else lttb(df, max_points)
+    meta = {"symbol": symbol.upper(), "timeframe": timeframe, "source_rows": total}
+    return columnar_response(df, meta, fmt=format, accept=request.headers.get("accept"))
+
+@router.get("/features/{symbol}")
+async def get_features(
+    symbol: str,
+    request: Request,
+    timeframe: str = "1D",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    columns: Optional[str] = Query(None, description="Comma-separated indicator columns (default: all)"),
+    max_points: Optional[int] = Query(None, ge=3, description="Downsample (LTTB on close) to at most this many points"),
+    format: Optional[Literal["json", "arrow"]] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Indicator series (calculate_indicators) of one symbol in columnar form.
+    """
+    import pandas as pd
+    from src.app.logic.indicators import calculate_indicators
+    from src.app.logic.downsample import lttb
+    from src.app.api.columnar import columnar_response
+
+    df = await _bars_or_404(db, symbol, timeframe, start, end, warmup=FEATURE_WARMUP_BARS)
+    df = calculate_indicators(df)
+    if start is not None and not df.empty:
+        # Drop the warmup bars (align a naive `start` with the tz-aware column)
+        cutoff = pd.Timestamp(start)
+        if cutoff.tzinfo is None and df['ts'].dt.tz is not None:
+            cutoff = cutoff.tz_localize(df['ts'].dt.tz)
+        df = df[df['ts'] >= cutoff].reset_index(drop=True)
+    if columns:
+        wanted = [c.strip() for c in columns.split(",") if c.strip() in df.columns and c.strip() != 'ts']
+        df = df[['ts', 'close'] + [c for c in wanted if c != 'close']]
+    total = len(df)
+    if max_points:
+        df = lttb(df, max_points)
+    meta = {"symbol": symbol.upper(), "timeframe": timeframe, "source_rows": total}
+    return columnar_response(df, meta, fmt=format, accept=request.headers.get("accept"))
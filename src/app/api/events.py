@@ -0,0 +1,103 @@
+import asyncio
+import json
+import logging
+from typing import Any, Dict, Optional, Set
+
+from src.app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Per-subscriber backlog; a slow client loses its oldest events, never blocks others
+SUBSCRIBER_QUEUE_SIZE = 100
+KEEPALIVE_SECONDS = 15
+
+
+def format_sse(event: str, data: Any) -> bytes:
+    payload = json.dumps(data, separators=(",", ":"), ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {payload}\n\n".encode("utf-8")
+
+
+class EventBroadcaster:
+    """
+    In-process fan-out of server-sent events. Each event is serialized once
+    and the same bytes are handed to every subscriber queue.
+    """
+    def __init__(self):
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._last_top3_run: Optional[str] = None
+        self._watcher: Optional[asyncio.Task] = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> asyncio.Queue:
+        q = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.add(q)
+        self._ensure_watcher()
+        return q
+
+    def unsubscribe(self, q: asyncio.Queue):
+        self._subscribers.discard(q)
+
+    def publish(self, event: str, data: Dict[str, Any]):
+        if not self._subscribers:
+            return
+        frame = format_sse(event, data)
+        for q in self._subscribers:
+            if q.full():
+                q.get_nowait()
+            q.put_nowait(frame)
+
+    def announce_top3(self, run_id, top3):
+        """
+        Publish the top3 of a newly finished run, once per run_id whichever
+        path (in-process run or DB watcher) noticed it first.
+        """
+        run_id = str(run_id)
+        if run_id == self._last_top3_run:
+            return
+        self._last_top3_run = run_id
+        self.publish("top3", {"run_id": run_id, "top3": top3})
+
+    def _ensure_watcher(self):
+        # Only poll for runs finished by other processes while someone is listening
+        if self._watcher is None or self._watcher.done():
+            self._watcher = asyncio.create_task(self._watch_latest_run())
+
+    async def _watch_latest_run(self):
+        from src.app.api.cache import latest_run_cache
+
+        while self._subscribers:
+            try:
+                cached = await latest_run_cache.get("top3")
+                if cached and latest_run_cache.run_id is not None:
+                    if self._last_top3_run is None:
+                        # Baseline on first check; only announce runs that finish later
+                        self._last_top3_run = str(latest_run_cache.run_id)
+                    else:
+                        self.announce_top3(latest_run_cache.run_id, json.loads(cached[0]))
+            except Exception as e:
+                logger.warning(f"Latest-run watcher error: {e}")
+            await asyncio.sleep(settings.API_CACHE_REVALIDATE_SECONDS)
+
+
+broadcaster = EventBroadcaster()
+
+
+async def event_stream(request, q: asyncio.Queue):
+    """
+    Yield SSE frames for one subscriber until the client disconnects.
+    """
+    try:
+        yield b"retry: 5000\n\n"
+        while True:
+            if await request.is_disconnected():
+                break
+            try:
+                frame = await asyncio.wait_for(q.get(), timeout=KEEPALIVE_SECONDS)
+                yield frame
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+    finally:
+        broadcaster.unsubscribe(q)
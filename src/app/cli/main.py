@@ -2,15 +2,12 @@ import typer
 import asyncio
 import sys
 import logging
-import pandas as pd
 from datetime import datetime
+from typing import List
 
-from src.app.db.init_db import init_db as init_db_func
-from src.app.db.session import AsyncSessionLocal
-from src.app.data_provider.universe_manager import UniverseManager
-from src.app.data_provider.client import DataProvider
-from src.app.db.models import Universe, UniverseMember, MarketSymbol, Timeframe
-from sqlalchemy import select
+# Keep this module light: pandas, SQLAlchemy, vnstock and apscheduler are
+# imported inside the commands that use them, so --help, init-db or
+# test-telegram start in a fraction of a second (see benchmarks/import_budget.py)
 
 # Fix for Windows asyncio loop
 if sys.platform == 'win32':
@@ -24,36 +21,54 @@ logger = logging.getLogger(__name__)
 
 app = typer.Typer()
 
-async def get_db_session():
-    async with AsyncSessionLocal() as session:
-        yield session
-
 @app.command()
 def init_db():
     """
     Initialize the database using trading_app_init.sql
     """
+    from src.app.db.init_db import init_db as init_db_func
+
     asyncio.run(init_db_func())
 
 @app.command()
-def update_universe(source: str = "vnstock"):
+def update_universe(
+    source: str = "vnstock",
+    code: str = typer.Option("VN30", help="Index group (VN30, VN100, ...) or whole exchanges: HOSE_ALL, HNX_ALL, UPCOM_ALL, ALL"),
+    file: str = typer.Option(None, help="Fallback file, one ticker per line (default <code>.txt)")
+):
     """
-    Fetch VN30 constituents and update DB.
+    Fetch index constituents and sync the universe (history kept via effective_from/to).
     """
+    from src.app.core.config import settings
+    from src.app.db.session import AsyncSessionLocal
+    from src.app.data_provider.universe_manager import UniverseManager
+
     async def _do():
-        from src.app.core.config import settings
         async with AsyncSessionLocal() as db:
             api_key = getattr(settings, 'VNSTOCK_API_KEY', None)
             um = UniverseManager(db, api_key=api_key)
-            await um.update_vn30(source=source)
+            stats = await um.update_universe(code, source=source, file_path=file)
+            if stats:
+                typer.echo(f"{code}: +{stats['added']} added, -{stats['removed']} removed, {stats['kept']} unchanged")
     
     asyncio.run(_do())
 
 @app.command()
-def backfill_ohlcv(days: int = 365, universe: str = "VN30"):
+def backfill_ohlcv(
+    days: int = 365,
+    universe: str = "VN30",
+    distributed: bool = typer.Option(False, help="Shard symbols into queue jobs for `worker` processes"),
+    chunk_size: int = typer.Option(None, help="Symbols per queue job (default QUEUE_CHUNK_SIZE)")
+):
     """
     Backfill OHLCV data for universe members.
     """
+    from sqlalchemy import select
+    from src.app.db.session import AsyncSessionLocal
+    from src.app.db.models import Universe, UniverseMember, MarketSymbol
+    from src.app.data_provider.client import DataProvider
+    from src.app.db.instrumentation import QueryBudgetExceeded
+
     async def _do():
         async with AsyncSessionLocal() as db:
             # Get Universe Members
@@ -66,6 +81,19 @@ def backfill_ohlcv(days: int = 365, universe: str = "VN30"):
             symbols = result.scalars().all()
             
             logger.info(f"Backfilling {len(symbols)} symbols from {universe}...")
+
+            if distributed:
+                import uuid
+                from src.app.core import jobqueue
+                from src.app.core.config import settings
+
+                batch_id = uuid.uuid4()
+                payloads = [{"symbols": chunk, "timeframe": "1D", "days": days}
+                            for chunk in jobqueue.chunked(list(symbols), chunk_size or settings.QUEUE_CHUNK_SIZE)]
+                await jobqueue.enqueue(db, batch_id, jobqueue.KIND_INGEST, payloads)
+                status = await jobqueue.wait_for_batch(db, batch_id)
+                logger.info(f"Distributed backfill {batch_id} finished: {status}")
+                return
             
             dp = DataProvider(db)
             for sym in symbols:
@@ -73,206 +101,136 @@ def backfill_ohlcv(days: int = 365, universe: str = "VN30"):
                 try:
                     await dp.get_ohlcv(sym, days=days)
                     await db.commit()
+                except QueryBudgetExceeded:
+                    await db.rollback()
+                    raise
                 except Exception as e:
                     logger.error(f"Error backfilling {sym}: {e}")
                     await db.rollback()
-    
+
     asyncio.run(_do())
 
+@app.command()
+def import_ohlcv(
+    paths: List[str] = typer.Argument(..., help="CSV / CSV.gz / Parquet files or directories"),
+    timeframe: str = "1D",
+    chunk_rows: int = typer.Option(50_000, help="Rows per COPY + merge transaction"),
+    source: str = typer.Option("import", help="Value stored in ohlcv_bar.source")
+):
+    """
+    Bulk-load bar dumps (one file per symbol, or a combined file with a symbol column).
+    """
+    from src.app.data_provider.bulk import import_files
+
+    def progress(stats):
+        typer.echo(f"\r{stats['rows']:>12,} rows  {stats['rows_per_sec']:>10,.0f} rows/s  {stats['file']}", nl=False)
+
+    stats = asyncio.run(import_files(paths, timeframe, chunk_rows=chunk_rows, source=source, progress=progress))
+    typer.echo("")
+    typer.echo(f"Imported {stats['rows']:,} rows from {stats['files']} files in {stats['seconds']:.1f}s "
+               f"({stats['rows_per_sec']:,.0f} rows/s): {stats['inserted']:,} new, "
+               f"{stats['changed'] - stats['inserted']:,} updated, {stats['skipped']:,} skipped (no symbol or time)")
+
+@app.command()
+def export_ohlcv(
+    output: str = typer.Argument(..., help="Target file: .csv, .csv.gz or .parquet"),
+    timeframe: str = "1D",
+    symbols: str = typer.Option(None, help="Comma-separated symbols (default: all)"),
+    start: datetime = typer.Option(None, help="First bar time (inclusive)"),
+    end: datetime = typer.Option(None, help="Last bar time (inclusive)")
+):
+    """
+    Dump stored bars to one file that import-ohlcv can load elsewhere.
+    """
+    from src.app.data_provider.bulk import export_bars
+
+    def progress(stats):
+        typer.echo(f"\r{stats['rows']:>12,} rows  {stats['rows_per_sec']:>10,.0f} rows/s", nl=False)
+
+    symbol_list = [s.strip() for s in symbols.split(",") if s.strip()] if symbols else None
+    stats = asyncio.run(export_bars(output, timeframe, symbol_list, start, end, progress=progress))
+    typer.echo("")
+    typer.echo(f"Exported {stats['rows']:,} rows to {output} in {stats['seconds']:.1f}s ({stats['rows_per_sec']:,.0f} rows/s)")
+
 @app.command()
 def run(
     timeframe: str = "1D", 
     universe: str = "VN30",
-    strategy: str = "shortterm_v1"
+    strategy: str = "shortterm_v1",
+    profile: bool = typer.Option(False, help="Record per-stage timings into trading.run_metrics"),
+    profile_memory: bool = typer.Option(False, help="Also trace peak memory per stage (tracemalloc) when profiling; slows the run down"),
+    distributed: bool = typer.Option(False, help="Shard symbols into queue jobs for `worker` processes"),
+    chunk_size: int = typer.Option(None, help="Symbols per queue job (default QUEUE_CHUNK_SIZE)"),
+    force_notify: bool = typer.Option(False, help="Notify subscribers even if the report did not change")
 ):
     """
     Run analysis and generate report.
     """
-    from src.app.logic.indicators import calculate_indicators
+    from src.app.core import pipeline
     from src.app.logic.scorer import Scorer
-    from src.app.logic.signals import generate_trade_plan
     from src.app.logic.reporting import Reporter
-    from src.app.db.models import AnalysisRun, RunScore, RunSignal, RunReport, Strategy, Universe, Timeframe
-    from sqlalchemy import select
-    from sqlalchemy.dialects.postgresql import insert
-    from src.app.notification.telegram import TelegramBot
-    import uuid
-    from datetime import datetime
+    from src.app.notification.router import get_router, run_topic, shutdown_notifications
+    from src.app.core.profiling import RunProfiler, format_profile_summary
+    from src.app.db.instrumentation import current_query_stats, format_query_summary
+    from src.app.db.session import AsyncSessionLocal
 
+    profiler = RunProfiler(enabled=profile, trace_memory=profile_memory)
     
     async def _do():
         async with AsyncSessionLocal() as db:
             # 1. Setup Run
-            # Get IDs
-            univ_obj = (await db.execute(select(Universe).where(Universe.code == universe))).scalar_one()
-            tf_obj = (await db.execute(select(Timeframe).where(Timeframe.code == timeframe))).scalar_one()
-            
-            # Ensure strategy exists (mock/default)
-            strat_obj = (await db.execute(select(Strategy).where(Strategy.code == strategy))).scalar_one_or_none()
-            if not strat_obj:
-                strat_obj = Strategy(
-                    code=strategy, 
-                    name="Default Short-term", 
-                    weights={"trend":0.22, "base":0.20, "breakout":0.22, "volume":0.18, "momentum":0.10, "risk":0.08},
-                    parameters={}
-                )
-                db.add(strat_obj)
-                await db.flush()
-                
-            run_id = uuid.uuid4()
-            run_rec = AnalysisRun(
-                run_id=run_id,
-                universe_id=univ_obj.universe_id,
-                timeframe_id=tf_obj.timeframe_id,
-                strategy_id=strat_obj.strategy_id,
-
-                as_of=datetime.now(),
-                started_at=datetime.now(),
-                status='running'
-
-            )
-            db.add(run_rec)
-            await db.commit()
+            univ_obj, tf_obj = await pipeline.resolve_run_dimensions(db, universe, timeframe)
+            strat_obj = await pipeline.get_or_create_strategy(db, strategy)
+            run_rec = await pipeline.start_run(db, univ_obj, tf_obj, strat_obj)
+            run_id = run_rec.run_id
+            queries = current_query_stats()
+            if queries is not None:
+                queries.run_id = run_id
+            profiler.start()
             
             try:
-                # 2. Fetch Data
-                # Get members
-                # ... reused logic from backfill or just query members ...
-                stmt = select(MarketSymbol.symbol, MarketSymbol.symbol_id).join(UniverseMember, MarketSymbol.symbol_id == UniverseMember.symbol_id).where(UniverseMember.universe_id == univ_obj.universe_id)
-                symbols = (await db.execute(stmt)).all()
-
-
-                
-                logger.info(f"Analyzing {len(symbols)} symbols for run {run_id}...")
-                
-                dp = DataProvider(db)
-                scorer = Scorer(strat_obj.weights)
-                
-                results = []
-                
-                for sym in symbols:
-                    try:
-                        # Fetch
-                        df = await dp.get_ohlcv(sym.symbol, timeframe=timeframe, days=200) # need enough for indicators
-                        if df.empty or len(df) < 50:
-                            continue
-                        
-                        # Convert to float (fix for Decimal type from DB)
-                        cols = ['open', 'high', 'low', 'close', 'volume']
-                        df[cols] = df[cols].apply(pd.to_numeric, errors='coerce')
-                            
-                        # Calc Indicators
-                        df = calculate_indicators(df)
-
-                        
-                        # Score
-                        score_res = scorer.calculate_score(df)
-                        
-                        # Signal
-                        signal_res = generate_trade_plan(df, score_res)
-                        
-                        # Store in memory
-                        item = {
-                            "symbol_id": sym.symbol_id,
-                            "symbol": sym.symbol,
-                            "run_id": run_id,
-                            **score_res, # score_total, breakdown, penalties
-                            "signal": signal_res
-                        }
-                        results.append(item)
-                        
-                        # Save detailed score/signal to DB
-                        # RunScore
-                        rs = RunScore(
-                            run_id=run_id,
-                            symbol_id=sym.symbol_id,
-                            score_total=score_res['score_total'],
-                            score_trend=score_res['breakdown']['trend'],
-                            score_base=score_res['breakdown']['base'],
-                            score_breakout=score_res['breakdown']['breakout'],
-                            score_volume=score_res['breakdown']['volume'],
-                            score_momentum=score_res['breakdown']['momentum'],
-                            score_risk=score_res['breakdown']['risk'],
-                            penalties=score_res.get('penalties', []),
-                            features={k: (v.isoformat() if isinstance(v, pd.Timestamp) else float(v) if isinstance(v, (int, float)) else str(v)) 
-                                     for k, v in df.iloc[-1].to_dict().items() if not pd.isna(v)} if not df.empty else {},
-                            computed_at=datetime.now()
-                        )
-
-
-                        db.add(rs)
-                        
-                        # RunSignal
-                        sig = RunSignal(
-                            run_id=run_id,
-                            symbol_id=sym.symbol_id,
-                            entry_zone=signal_res.get('entry_zone', {}),
-                            stop_loss=signal_res.get('stop_loss'),
-                            take_profit_1=signal_res.get('take_profit_1'),
-                            take_profit_2=signal_res.get('take_profit_2'),
-                            invalidation=signal_res.get('invalidation'),
-                            key_reasons=signal_res.get('key_reasons', []),
-                            risk_notes=signal_res.get('risk_notes', []),
-                            created_at=datetime.now()
+                if distributed:
+                    # 2-3. Workers fetch, score and persist shards; we only assemble the report
+                    from src.app.core import jobqueue
+                    members = await pipeline.get_members(db, univ_obj)
+                    with profiler.stage("shards"):
+                        results = await jobqueue.coordinate_analysis(
+                            db, run_id, members, timeframe, strat_obj.weights, chunk_size=chunk_size
                         )
+                    top3 = await pipeline.finalize_run(db, run_rec, results, profiler=profiler)
+                else:
+                    # 2. Fetch Data, Indicators & Score, batch by batch (bars are dropped per batch)
+                    members = await pipeline.get_members(db, univ_obj)
+                    logger.info(f"Analyzing {len(members)} symbols for run {run_id}...")
+                    results = await pipeline.score_members(
+                        db, members, timeframe, Scorer(strat_obj.weights), run_id, profiler=profiler
+                    )
 
-                        db.add(sig)
-                        await db.commit() # Commit per symbol
-                        
-                    except Exception as e:
-                        logger.error(f"Error processing {sym.symbol}: {e}")
-                        await db.rollback() # Reset session on error
-                
-                # Final commit not needed if we commit per symbol, but harmless
-                # await db.commit() 
-
-                
-                # 3. Rank & Report
-                results.sort(key=lambda x: x['score_total'], reverse=True)
-                top3 = results[:3]
-                
-                # Save RunReport
-                # Serialize for DB (convert UUIDs to strings)
-                def serialize_for_json(obj):
-                    if isinstance(obj, dict):
-                        return {k: serialize_for_json(v) for k, v in obj.items()}
-                    elif isinstance(obj, list):
-                        return [serialize_for_json(item) for item in obj]
-                    elif isinstance(obj, uuid.UUID):
-                        return str(obj)
-                    else:
-                        return obj
-                
-                rr = RunReport(
-                    run_id=run_id,
-                    top3=[serialize_for_json({k:v for k,v in x.items() if k!='row'}) for x in top3],
-                    ranking=[serialize_for_json({k:v for k,v in x.items() if k!='row'}) for x in results],
-                    summary={"count": len(results)},
-                    created_at=datetime.now()
-                )
-
-
-                db.add(rr)
-                
-                # Update status
-                run_rec.status = 'success'
-                run_rec.finished_at = datetime.now()
-                await db.commit()
+                    # 3. Rank & Persist
+                    top3 = await pipeline.persist_results(db, run_rec, results, profiler=profiler)
                 
                 # Generate File Report
-                rep = Reporter()
-                md_path = rep.save_run_results(str(run_id), top3, results, run_rec.as_of)
-                
-                
+                with profiler.stage("report_files"):
+                    rep = Reporter()
+                    md_path = rep.save_run_results(str(run_id), top3, results, run_rec.as_of)
                 
                 typer.echo(f"Report generated: {md_path}")
                 for i, item in enumerate(top3):
                     typer.echo(f"{i+1}. {item['symbol']}: {item['score_total']}")
                     
-                # Send Telegram
-                bot = TelegramBot()
-                await bot.send_report(top3, str(run_id))
+                # Notify (only subscribers whose last report differs; drained at exit)
+                with profiler.stage("notify"):
+                    await get_router().publish_report(
+                        run_topic(universe, timeframe, strategy), top3, run_id, force=force_notify, db=db
+                    )
 
+                await profiler.save(db, run_id)
+                if profile:
+                    typer.echo("")
+                    typer.echo(format_profile_summary(profiler.stage_totals(), profiler.symbol_totals()))
+                    if queries is not None:
+                        typer.echo("")
+                        typer.echo(format_query_summary(queries))
                     
             except Exception as e:
                 import traceback
@@ -280,36 +238,228 @@ def run(
                 print(f"CRITICAL ERROR: {e}")
                 logger.error(f"Run failed: {e}")
                 
-                # Rollback session to recovery from error state
-                await db.rollback()
-                
-                # Reload run_rec since it's detached
-                run_rec = await db.get(AnalysisRun, run_id)
-                if run_rec:
-                    run_rec.status = 'failed'
-                    run_rec.error_message = str(e)[:255] # truncation
-                    await db.commit()
-                # raise e # Optionally re-raise if we want crash, but better to exit cleanly?
-                # Actually re-raising helps seeing it in CLI output if logger is redirected.
-                # But we printed already.
-
+                await pipeline.fail_run(db, run_id, e)
+                # Keep timings of failed runs too, they are the interesting ones
+                await profiler.save(db, run_id)
                 raise e
+            finally:
+                profiler.stop()
+
+    async def _main():
+        try:
+            await _do()
+        finally:
+            await shutdown_notifications()
     
+    asyncio.run(_main())
+
+@app.command()
+def run_matrix(
+    strategy: List[str] = typer.Option(..., help="Strategy code (repeat for several)"),
+    timeframe: List[str] = typer.Option(["1D"], help="Timeframe code (repeat for several)"),
+    universe: List[str] = typer.Option(["VN30"], help="Universe code (repeat for several)"),
+    notify: bool = typer.Option(False, help="Notify subscribers of every run whose report changed"),
+):
+    """
+    Score several strategies against bars and indicators loaded once.
+    Writes one analysis_run per (universe, timeframe, strategy).
+    """
+    from src.app.core import pipeline
+    from src.app.logic.scorer import Scorer
+    from src.app.logic.reporting import Reporter
+    from src.app.notification.router import get_router, run_topic, shutdown_notifications
+    from src.app.db.session import AsyncSessionLocal
+
+    async def _do():
+        summary = []
+        async with AsyncSessionLocal() as db:
+            known = await pipeline.get_strategies(db, strategy)
+            unknown = [code for code in strategy if code not in known]
+            if unknown:
+                typer.echo(f"Unknown strategy: {', '.join(unknown)}")
+                raise typer.Exit(code=1)
+            strategies = [known[code] for code in strategy]
+            await db.commit()
+            rep = Reporter()
+            router = get_router() if notify else None
+
+            for univ_code in universe:
+                for tf_code in timeframe:
+                    univ_obj, tf_obj = await pipeline.resolve_run_dimensions(db, univ_code, tf_code)
+                    # Shared work: bars + indicators, once per (universe, timeframe)
+                    features = await pipeline.load_features(db, univ_obj, tf_code)
+                    logger.info(f"{univ_code}/{tf_code}: {len(features)} symbols loaded, scoring {len(strategies)} strategies")
+
+                    for strat_obj in strategies:
+                        run_rec = await pipeline.start_run(db, univ_obj, tf_obj, strat_obj)
+                        try:
+                            results = pipeline.score_features(features, Scorer(strat_obj.weights), run_rec.run_id)
+                            top3 = await pipeline.persist_results(db, run_rec, results)
+                            rep.save_run_results(str(run_rec.run_id), top3, results, run_rec.as_of)
+                            if router:
+                                topic = run_topic(univ_code, tf_code, strat_obj.code)
+                                await router.publish_report(topic, top3, run_rec.run_id, db=db)
+                            summary.append((univ_code, tf_code, strat_obj.code, run_rec.run_id, [x['symbol'] for x in top3]))
+                        except Exception as e:
+                            logger.error(f"Run {strat_obj.code} on {univ_code}/{tf_code} failed: {e}")
+                            await pipeline.fail_run(db, run_rec.run_id, e)
+                            summary.append((univ_code, tf_code, strat_obj.code, run_rec.run_id, None))
+
+        for univ_code, tf_code, strat_code, run_id, top in summary:
+            status = ", ".join(top) if top is not None else "FAILED"
+            typer.echo(f"{univ_code:<8}{tf_code:<5}{strat_code:<20}{run_id}  {status}")
+
+    async def _main():
+        try:
+            await _do()
+        finally:
+            # Reports were only queued; deliver them before the loop goes away
+            await shutdown_notifications()
+
+    asyncio.run(_main())
+
+@app.command()
+def run_metrics(run_id: str = typer.Argument(None, help="Run ID (defaults to the latest profiled run)"), top: int = 10):
+    """
+    Show the slowest stages and symbols of a profiled run.
+    """
+    from sqlalchemy import func, select
+    from src.app.db.models import RunMetric, AnalysisRun, MarketSymbol
+    from src.app.db.session import AsyncSessionLocal
+    from src.app.core.profiling import format_profile_summary
+
+    async def _do():
+        async with AsyncSessionLocal() as db:
+            target = run_id
+            if not target:
+                stmt = select(RunMetric.run_id).join(AnalysisRun, AnalysisRun.run_id == RunMetric.run_id)\
+                    .order_by(AnalysisRun.started_at.desc()).limit(1)
+                target = (await db.execute(stmt)).scalar_one_or_none()
+                if not target:
+                    typer.echo("No profiled runs found. Use `run --profile`.")
+                    return
+
+            stage_stmt = select(
+                RunMetric.stage,
+                func.count().label("calls"),
+                func.sum(RunMetric.wall_ms).label("wall_ms"),
+                func.sum(RunMetric.cpu_ms).label("cpu_ms"),
+                func.max(RunMetric.peak_mem_kb).label("peak_mem_kb"),
+            ).where(RunMetric.run_id == target).group_by(RunMetric.stage).order_by(func.sum(RunMetric.wall_ms).desc())
+
+            sym_stmt = select(
+                MarketSymbol.symbol,
+                func.sum(RunMetric.wall_ms).label("wall_ms"),
+                func.sum(RunMetric.cpu_ms).label("cpu_ms"),
+            ).join(MarketSymbol, MarketSymbol.symbol_id == RunMetric.symbol_id)\
+                .where(RunMetric.run_id == target)\
+                .group_by(MarketSymbol.symbol).order_by(func.sum(RunMetric.wall_ms).desc()).limit(top)
+
+            stages = [dict(r._mapping) for r in (await db.execute(stage_stmt)).all()]
+            symbols = [dict(r._mapping) for r in (await db.execute(sym_stmt)).all()]
+            for row in stages + symbols:
+                row['wall_ms'] = float(row['wall_ms'] or 0)
+                row['cpu_ms'] = float(row['cpu_ms'] or 0)
+
+            typer.echo(f"Run {target}")
+            typer.echo(format_profile_summary(stages, symbols, top=top))
+
     asyncio.run(_do())
 
 @app.command()
-def serve(host: str = "127.0.0.1", port: int = 8000):
+def retention(
+    dry_run: bool = typer.Option(False, "--dry-run", help="Only count what would be archived/compacted/deleted"),
+    archive_dir: str = typer.Option(None, help="Override RETENTION_ARCHIVE_DIR"),
+    detail_days: int = typer.Option(None, help="Override RETENTION_DETAIL_DAYS"),
+    run_days: int = typer.Option(None, help="Override RETENTION_RUN_DAYS")
+):
+    """
+    Apply the retention policy: archive old runs, compact kept ones, purge logs.
+    """
+    from src.app.core.retention import apply_retention, RetentionPolicy, RunArchive
+    from src.app.db.session import AsyncSessionLocal
+
+    async def _do():
+        policy = RetentionPolicy(detail_days=detail_days, run_days=run_days)
+        async with AsyncSessionLocal() as db:
+            stats = await apply_retention(db, policy, RunArchive(archive_dir), dry_run=dry_run)
+        verb = "would affect" if dry_run else "affected"
+        for name, count in stats.items():
+            typer.echo(f"{name:<24} {verb} {count} rows")
+
+    asyncio.run(_do())
+
+@app.command()
+def reports_migrate(keep_legacy: bool = typer.Option(False, help="Keep the old indented JSON files")):
+    """
+    Convert old per-run top3/ranking JSON files into the compressed report store.
+    """
+    from src.app.logic.reporting import Reporter
+
+    converted = Reporter().migrate_legacy(delete=not keep_legacy)
+    typer.echo(f"Migrated {converted} runs into the report store.")
+
+@app.command()
+def archived_run(run_id: str, archive_dir: str = typer.Option(None, help="Override RETENTION_ARCHIVE_DIR")):
+    """
+    Print an archived run (run, scores, signals, report) as JSON.
+    """
+    import json
+    from src.app.core.retention import RunArchive
+
+    run = RunArchive(archive_dir).find(run_id)
+    if run is None:
+        typer.echo(f"Run {run_id} not found in archive.")
+        raise typer.Exit(code=1)
+    typer.echo(json.dumps(run, indent=2, ensure_ascii=False))
+
+@app.command()
+def worker(
+    kind: List[str] = typer.Option(None, help="Job kinds to process: ingest, analyze (default: both)"),
+    exit_when_idle: bool = typer.Option(False, help="Stop once the queue is empty")
+):
     """
-    Start the FastAPI server.
+    Process queued ingest/analyze jobs. Start several for parallelism.
+    """
+    from src.app.core.jobqueue import Worker
+
+    w = Worker(kinds=kind or None)
+    try:
+        asyncio.run(w.run_forever(exit_when_idle=exit_when_idle))
+    except KeyboardInterrupt:
+        logger.info("Worker stopped.")
+
+@app.command()
+def serve(
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    prod: bool = typer.Option(False, "--prod", help="Production mode: no reload, multiple workers"),
+    workers: int = typer.Option(1, "--workers", "-w", help="Worker processes (--prod only)")
+):
+    """
+    Start the FastAPI server (auto-reload for development, or --prod --workers N).
     """
     import uvicorn
-    uvicorn.run("src.app.main:app", host=host, port=port, reload=True)
+    if not prod:
+        uvicorn.run("src.app.main:app", host=host, port=port, reload=True)
+        return
+    # Each worker imports the factory and warms up its own pool and caches
+    uvicorn.run(
+        "src.app.main:create_app",
+        factory=True,
+        host=host,
+        port=port,
+        workers=max(1, workers),
+        reload=False,
+        access_log=False,
+        timeout_graceful_shutdown=30,
+    )
 
 
 @app.command()
 def schedule():
     """
-    Start the hourly scheduler.
+    Start the scheduler (HOSE sessions, post-close and end-of-day runs).
     """
     from src.app.core.scheduler import start_scheduler
     import asyncio
@@ -327,20 +477,63 @@ def schedule():
     except KeyboardInterrupt:
         logger.info("Scheduler stopped.")
 
+@app.command()
+def live(
+    universe: str = typer.Option(None, help="Default: LIVE_UNIVERSE or DEFAULT_UNIVERSE"),
+    timeframe: str = typer.Option(None, help="Default: LIVE_TIMEFRAME"),
+    strategy: str = typer.Option(None, help="Default: LIVE_STRATEGY or DEFAULT_STRATEGY"),
+    interval: float = typer.Option(None, help="Price board polling interval in seconds (default: LIVE_POLL_SECONDS)"),
+    top: int = typer.Option(10, help="Rows printed when the top 3 change")
+):
+    """
+    Live ranking from price board quotes; prints it whenever the top 3 change.
+    """
+    from src.app.core.config import settings
+    from src.app.core.live import live_engine, EVENT_TOP3
+
+    def show(event, data):
+        if event != EVENT_TOP3:
+            return
+        typer.echo(f"\n{data['as_of'][11:19]}  {live_engine.universe} {live_engine.timeframe} (v{data['version']})")
+        for rank, item in enumerate(live_engine.ranking()[:top], 1):
+            typer.echo(f"{rank:>3}. {item['symbol']:<6} {item['score_total']:>6.2f}  close {item['close']:.2f}")
+
+    async def _do():
+        live_engine.add_listener(show)
+        await live_engine.start(universe, timeframe, strategy, poll_seconds=interval or settings.LIVE_POLL_SECONDS or 5.0)
+        await live_engine.wait()
+
+    try:
+        if sys.platform == 'win32':
+            asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+        asyncio.run(_do())
+    except KeyboardInterrupt:
+        logger.info("Live mode stopped.")
+
 @app.command()
 def test_telegram(msg: str = "Test message from VN30 Bot"):
     """
     Send a test message to Telegram.
     """
-    from src.app.notification.telegram import TelegramBot
+    from src.app.notification.telegram import TelegramBot, shutdown_outbox
     
     async def send_test():
         bot = TelegramBot()
         await bot.send_message(msg)
+        await shutdown_outbox()
         
     if sys.platform == 'win32':
          asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
     asyncio.run(send_test())
 
 if __name__ == "__main__":
-    app()
+    from src.app.db.instrumentation import track_queries
+    command = next((a for a in sys.argv[1:] if not a.startswith("-")), "")
+    try:
+        # Statements of the whole command, attributed to it (asyncio.run copies the context)
+        with track_queries(f"cli {command}".strip()):
+            app()
+    finally:
+        # Textfile / Pushgateway export of this command's metrics (no-op unless configured)
+        from src.app.core.metrics import export_metrics
+        export_metrics(f"cli_{command.replace('-', '_')}" if command else "cli")
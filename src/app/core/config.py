@@ -3,6 +3,12 @@ from functools import lru_cache
 
 class Settings(BaseSettings):
     DATABASE_URL: str
+    DB_POOL_SIZE: int = 5  # per process; each API worker holds its own pool
+    DB_MAX_OVERFLOW: int = 10
+    DB_QUERY_BUDGET: int = 0  # max statements per tracked operation (CLI command, job, run), 0 = no limit
+    DB_QUERY_BUDGET_STRICT: bool = False  # test mode: exceeding the budget raises and fails the run
+    DB_N_PLUS_ONE_THRESHOLD: int = 25  # same statement shape this often in one operation is reported as N+1
+    DB_SLOW_QUERY_TOP: int = 5  # slowest statements kept per operation
     APP_TIMEZONE: str = "Asia/Bangkok"
     DEFAULT_UNIVERSE: str = "VN30"
     DEFAULT_TIMEFRAME: str = "1D"
@@ -11,10 +17,73 @@ class Settings(BaseSettings):
     # Telegram
     TELEGRAM_BOT_TOKEN: str = ""
     TELEGRAM_CHAT_ID: str = ""
+    TELEGRAM_CHAT_INTERVAL_SECONDS: float = 1.0  # min spacing per chat (Telegram allows ~1 msg/s)
+    TELEGRAM_GLOBAL_RATE: float = 25.0  # messages/s across all chats (Telegram limit ~30)
+    TELEGRAM_MAX_RETRIES: int = 5
+    TELEGRAM_TIMEOUT_SECONDS: float = 10.0
+    TELEGRAM_QUEUE_SIZE: int = 1000  # per chat; further messages are dropped
+    TELEGRAM_DRAIN_TIMEOUT_SECONDS: float = 30.0  # how long exit waits for queued messages
+
+    # Notifications
+    NOTIFY_SUBSCRIBERS: str = ""  # comma-separated telegram:<chat_id>, webhook:<url>, file:<path>; "" = TELEGRAM_CHAT_ID
+    NOTIFY_PRICE_DIGITS: int = 3  # significant digits of plan prices compared to detect a changed report
+    NOTIFY_WEBHOOK_TIMEOUT_SECONDS: float = 10.0
+    NOTIFY_WEBHOOK_RETRIES: int = 3
     
     # Scheduler
     SCHEDULE_INTERVAL_MINUTES: int = 60
+    SCHEDULE_MODE: str = "session"  # "session" (HOSE hours only) | "interval" (around the clock)
+    SCHEDULE_POST_CLOSE_TIME: str = "14:50"  # after ATC
+    SCHEDULE_EOD_TIME: str = "15:30"  # end-of-day data settled
+    SCHEDULE_JITTER_SECONDS: int = 0
+    SCHEDULE_MISFIRE_GRACE_SECONDS: int = 300
     
+    # Job queue (multi-worker sharding)
+    QUEUE_CHUNK_SIZE: int = 5  # symbols per job
+    QUEUE_POLL_SECONDS: float = 1.0
+    QUEUE_HEARTBEAT_SECONDS: int = 10
+    QUEUE_STALE_SECONDS: int = 60  # no heartbeat for this long -> job is requeued
+    QUEUE_MAX_ATTEMPTS: int = 3
+
+    # Pipeline
+    PIPELINE_BATCH_SIZE: int = 200  # symbols per bar read / score insert batch
+
+    # Metrics
+    METRICS_ENABLED: bool = True  # /metrics endpoint, DB statement timing and exports
+    METRICS_TEXTFILE_DIR: str = ""  # CLI / scheduler write <dir>/<job>.prom for node_exporter's textfile collector
+    METRICS_PUSHGATEWAY_URL: str = ""  # ...and/or push to a Prometheus Pushgateway, e.g. http://localhost:9091
+    METRICS_PUSH_TIMEOUT_SECONDS: float = 5.0
+
+    # Live mode (in-memory ranking from quotes during the session)
+    LIVE_ENABLED: bool = False  # API runs the live engine; each worker polls on its own, so serve it from one worker
+    LIVE_UNIVERSE: str = ""  # "" = DEFAULT_UNIVERSE
+    LIVE_TIMEFRAME: str = "1D"  # bar formed from quotes: 1D, 1H, 15m, ...
+    LIVE_STRATEGY: str = ""  # "" = DEFAULT_STRATEGY
+    LIVE_POLL_SECONDS: float = 3.0  # price board polling interval, 0 = pushed quotes only (POST /live/quotes)
+    LIVE_SESSION_ONLY: bool = True  # poll only inside HOSE sessions
+    LIVE_PRICE_SCALE: float = 0.001  # price board quotes are in VND, stored bars in thousand VND
+
+    # API
+    API_CACHE_REVALIDATE_SECONDS: float = 15.0  # how often /top3 and /ranking re-check for a newer run
+    API_WARMUP_CONNECTIONS: int = 2  # pool connections opened at startup
+
+    # Reports
+    REPORT_DIR: str = "reports"
+    REPORT_FORMATS: str = "md"  # comma-separated: md, html
+
+    # Retention (days, 0 = keep forever)
+    RETENTION_DETAIL_DAYS: int = 14  # all runs in full; older runs compacted to one per day
+    RETENTION_RUN_DAYS: int = 365  # daily representatives; older runs are archived and deleted
+    RETENTION_FEATURES_DAYS: int = 30  # run_score.features JSON
+    RETENTION_SIGNAL_DAYS: int = 90  # run_signal rows
+    RETENTION_RANKING_DAYS: int = 30  # run_report.ranking (duplicates run_score)
+    RETENTION_METRICS_DAYS: int = 30  # run_metrics
+    RETENTION_JOB_QUEUE_DAYS: int = 7  # finished job_queue rows
+    RETENTION_FETCH_LOG_DAYS: int = 30  # data_fetch_log
+    RETENTION_ARCHIVE_DIR: str = "archive"
+    RETENTION_BATCH_SIZE: int = 500
+    SCHEDULE_RETENTION_TIME: str = ""  # e.g. "02:00" for a nightly retention pass in the scheduler; opt-in, try `retention --dry-run` first
+
     # VNStock API
     VNSTOCK_API_KEY: str = ""
 
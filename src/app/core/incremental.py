@@ -0,0 +1,53 @@
+from typing import Dict, Any, List, Set, Tuple, Iterable
+
+
+class DirtySet:
+    """
+    (symbol, timeframe) pairs whose bars changed since the last analysis.
+    Only touched from the event loop, so no locking is needed.
+    """
+    def __init__(self):
+        self._items: Set[Tuple[str, str]] = set()
+
+    def mark(self, symbol: str, timeframe: str):
+        self._items.add((symbol, timeframe))
+
+    def drain(self, timeframe: str) -> Set[str]:
+        """
+        Remove and return the dirty symbols of a timeframe.
+        """
+        taken = {sym for sym, tf in self._items if tf == timeframe}
+        self._items -= {(sym, timeframe) for sym in taken}
+        return taken
+
+    def __len__(self):
+        return len(self._items)
+
+
+class ScoreCache:
+    """
+    Latest scored result per symbol and timeframe, used to rebuild the
+    ranking when only a few symbols were recomputed.
+    """
+    def __init__(self):
+        self._scores: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+    def known(self, timeframe: str) -> Set[str]:
+        return set(self._scores.get(timeframe, {}))
+
+    def update(self, timeframe: str, items: Iterable[Dict[str, Any]]):
+        bucket = self._scores.setdefault(timeframe, {})
+        for item in items:
+            bucket[item['symbol']] = item
+
+    def discard(self, timeframe: str, symbols: Iterable[str]):
+        bucket = self._scores.get(timeframe, {})
+        for sym in symbols:
+            bucket.pop(sym, None)
+
+    def ranking(self, timeframe: str, members: Set[str] = None) -> List[Dict[str, Any]]:
+        """
+        Cached results sorted by score, optionally restricted to current members.
+        """
+        items = [v for k, v in self._scores.get(timeframe, {}).items() if members is None or k in members]
+        return sorted(items, key=lambda x: x['score_total'], reverse=True)
@@ -0,0 +1,286 @@
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, Iterable
+
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.app.core.config import settings
+from src.app.db.instrumentation import QueryBudgetExceeded, track_queries
+from src.app.db.models import QueueJob, RunScore, RunSignal
+from src.app.db.session import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+KIND_INGEST = 'ingest'
+KIND_ANALYZE = 'analyze'
+
+
+def chunked(items: List[Any], size: int) -> Iterable[List[Any]]:
+    for i in range(0, len(items), max(1, size)):
+        yield items[i:i + size]
+
+
+async def enqueue(db: AsyncSession, batch_id: uuid.UUID, kind: str, payloads: List[Dict[str, Any]]) -> int:
+    """
+    Add one job per payload to the queue and commit.
+    """
+    now = datetime.now()
+    db.add_all([
+        QueueJob(batch_id=batch_id, kind=kind, payload=p, status='queued', attempts=0,
+                 max_attempts=settings.QUEUE_MAX_ATTEMPTS, created_at=now)
+        for p in payloads
+    ])
+    await db.commit()
+    return len(payloads)
+
+
+async def claim(db: AsyncSession, worker_id: str, kinds: List[str]) -> Optional[QueueJob]:
+    """
+    Atomically claim the oldest queued job. Concurrent workers skip rows
+    locked by each other instead of blocking on them.
+    """
+    stmt = select(QueueJob).where(
+        QueueJob.status == 'queued',
+        QueueJob.kind.in_(kinds)
+    ).order_by(QueueJob.job_id).limit(1).with_for_update(skip_locked=True)
+    job = (await db.execute(stmt)).scalar_one_or_none()
+    if not job:
+        await db.rollback()
+        return None
+
+    now = datetime.now()
+    job.status = 'running'
+    job.attempts = (job.attempts or 0) + 1
+    job.worker_id = worker_id
+    job.claimed_at = now
+    job.heartbeat_at = now
+    await db.commit()
+    return job
+
+
+async def heartbeat(job_id: int, worker_id: str):
+    """
+    Refresh heartbeat_at while a job runs (own session, independent of the job's work).
+    """
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(QueueJob)
+            .where(QueueJob.job_id == job_id, QueueJob.worker_id == worker_id, QueueJob.status == 'running')
+            .values(heartbeat_at=datetime.now())
+        )
+        await db.commit()
+
+
+def _owned(job_id: int, worker_id: str):
+    # A job requeued by requeue_stale (and maybe claimed again) is no longer ours
+    return (QueueJob.job_id == job_id) & (QueueJob.worker_id == worker_id) & (QueueJob.status == 'running')
+
+
+async def complete(db: AsyncSession, job_id: int, worker_id: str, result: Any) -> bool:
+    """
+    Mark the job done with its result. Returns False (and changes nothing)
+    if the worker no longer owns it.
+    """
+    done = await db.execute(
+        update(QueueJob).where(_owned(job_id, worker_id))
+        .values(status='done', result=result, finished_at=datetime.now())
+    )
+    await db.commit()
+    if not done.rowcount:
+        logger.warning(f"Job {job_id} is no longer owned by {worker_id}; result discarded")
+    return bool(done.rowcount)
+
+
+async def fail(db: AsyncSession, job_id: int, worker_id: str, error: Exception):
+    """
+    Requeue the job unless it already used all attempts. Only ids are used:
+    after the rollback the job's ORM instance is expired and must not be
+    touched (a lazy refresh cannot run inside AsyncSession).
+    """
+    await db.rollback()
+    message = str(error)[:255]
+    await db.execute(
+        update(QueueJob).where(_owned(job_id, worker_id), QueueJob.attempts < QueueJob.max_attempts)
+        .values(status='queued', worker_id=None, error_message=message)
+    )
+    await db.execute(
+        update(QueueJob).where(_owned(job_id, worker_id), QueueJob.attempts >= QueueJob.max_attempts)
+        .values(status='failed', error_message=message, finished_at=datetime.now())
+    )
+    await db.commit()
+
+
+async def requeue_stale(db: AsyncSession, stale_seconds: int = None) -> int:
+    """
+    Return jobs whose worker stopped heartbeating to the queue (or fail them
+    when out of attempts). Safe to call from any process.
+    """
+    cutoff = datetime.now() - timedelta(seconds=stale_seconds or settings.QUEUE_STALE_SECONDS)
+    stale = (QueueJob.status == 'running') & (QueueJob.heartbeat_at < cutoff)
+    requeued = await db.execute(
+        update(QueueJob).where(stale, QueueJob.attempts < QueueJob.max_attempts)
+        .values(status='queued', worker_id=None, error_message='heartbeat lost')
+    )
+    await db.execute(
+        update(QueueJob).where(stale, QueueJob.attempts >= QueueJob.max_attempts)
+        .values(status='failed', error_message='heartbeat lost', finished_at=datetime.now())
+    )
+    await db.commit()
+    if requeued.rowcount:
+        logger.warning(f"Requeued {requeued.rowcount} stale jobs")
+    return requeued.rowcount
+
+
+async def batch_status(db: AsyncSession, batch_id: uuid.UUID) -> Dict[str, int]:
+    stmt = select(QueueJob.status, func.count()).where(QueueJob.batch_id == batch_id).group_by(QueueJob.status)
+    return {status: count for status, count in (await db.execute(stmt)).all()}
+
+
+async def batch_results(db: AsyncSession, batch_id: uuid.UUID) -> List[Any]:
+    stmt = select(QueueJob.result).where(QueueJob.batch_id == batch_id, QueueJob.status == 'done').order_by(QueueJob.job_id)
+    return (await db.execute(stmt)).scalars().all()
+
+
+async def wait_for_batch(db: AsyncSession, batch_id: uuid.UUID, timeout: Optional[float] = None) -> Dict[str, int]:
+    """
+    Poll until no job of the batch is queued or running. The coordinator also
+    sweeps stale jobs so a crashed worker cannot stall the batch.
+    """
+    started = datetime.now()
+    while True:
+        await requeue_stale(db)
+        status = await batch_status(db, batch_id)
+        pending = status.get('queued', 0) + status.get('running', 0)
+        if not pending:
+            return status
+        if timeout and (datetime.now() - started).total_seconds() > timeout:
+            raise TimeoutError(f"Batch {batch_id} still has {pending} pending jobs")
+        logger.info(f"Batch {batch_id}: {status}")
+        await asyncio.sleep(settings.QUEUE_POLL_SECONDS)
+
+
+async def coordinate_analysis(
+    db: AsyncSession,
+    run_id: uuid.UUID,
+    members,
+    timeframe: str,
+    weights: Dict[str, float],
+    chunk_size: int = None,
+    timeout: Optional[float] = None
+) -> List[Dict[str, Any]]:
+    """
+    Shard a run's symbols into analyze jobs, wait for the workers and
+    return the merged (unsorted) results.
+    """
+    payloads = [{
+        "run_id": str(run_id),
+        "timeframe": timeframe,
+        "weights": weights,
+        "symbols": [[m.symbol, m.symbol_id] for m in chunk],
+    } for chunk in chunked(list(members), chunk_size or settings.QUEUE_CHUNK_SIZE)]
+    await enqueue(db, run_id, KIND_ANALYZE, payloads)
+    logger.info(f"Run {run_id}: enqueued {len(payloads)} analyze jobs for {len(members)} symbols")
+
+    status = await wait_for_batch(db, run_id, timeout=timeout)
+    if status.get('failed'):
+        logger.error(f"Run {run_id}: {status['failed']} analyze jobs failed, ranking is partial")
+    return [item for chunk in await batch_results(db, run_id) for item in (chunk or [])]
+
+
+class Worker:
+    """
+    Claims and executes queued jobs until stopped. Run one per process (or
+    per machine); throughput scales with the number of workers because each
+    claim skips rows already locked by others.
+    """
+    def __init__(self, kinds: List[str] = None, worker_id: str = None):
+        self.kinds = kinds or [KIND_INGEST, KIND_ANALYZE]
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.handlers = {
+            KIND_INGEST: self._handle_ingest,
+            KIND_ANALYZE: self._handle_analyze,
+        }
+        self._stopping = False
+
+    def stop(self):
+        self._stopping = True
+
+    async def run_forever(self, exit_when_idle: bool = False):
+        logger.info(f"Worker {self.worker_id} started for {self.kinds}")
+        while not self._stopping:
+            processed = await self.run_once()
+            if not processed:
+                if exit_when_idle:
+                    break
+                await asyncio.sleep(settings.QUEUE_POLL_SECONDS)
+        logger.info(f"Worker {self.worker_id} stopped")
+
+    async def run_once(self) -> bool:
+        async with AsyncSessionLocal() as db:
+            job = await claim(db, self.worker_id, self.kinds)
+            if not job:
+                return False
+            # Plain values only from here: a rollback expires `job`
+            job_id, kind, payload = job.job_id, job.kind, job.payload
+
+            logger.info(f"Worker {self.worker_id} running job {job_id} ({kind})")
+            beat = asyncio.create_task(self._heartbeat_loop(job_id))
+            try:
+                with track_queries(f"worker {kind}"):
+                    result = await self.handlers[kind](payload)
+                await complete(db, job_id, self.worker_id, result)
+            except Exception as e:
+                logger.error(f"Job {job_id} failed: {e}")
+                await fail(db, job_id, self.worker_id, e)
+            finally:
+                beat.cancel()
+            return True
+
+    async def _heartbeat_loop(self, job_id: int):
+        while True:
+            await asyncio.sleep(settings.QUEUE_HEARTBEAT_SECONDS)
+            try:
+                await heartbeat(job_id, self.worker_id)
+            except Exception as e:
+                logger.warning(f"Heartbeat for job {job_id} failed: {e}")
+
+    async def _handle_ingest(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        from src.app.data_provider.client import DataProvider
+
+        changed = {}
+        async with AsyncSessionLocal() as db:
+            dp = DataProvider(db)
+            for symbol in payload['symbols']:
+                try:
+                    changed[symbol] = await dp.ingest(symbol, timeframe=payload['timeframe'], days=payload.get('days', 365))
+                    await db.commit()
+                except QueryBudgetExceeded:
+                    await db.rollback()
+                    raise
+                except Exception as e:
+                    logger.error(f"Error ingesting {symbol}: {e}")
+                    await db.rollback()
+        return {"changed": changed}
+
+    async def _handle_analyze(self, payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+        from src.app.core import pipeline
+        from src.app.logic.scorer import Scorer
+
+        run_id = uuid.UUID(payload['run_id'])
+        async with AsyncSessionLocal() as db:
+            rows = [pipeline.SymbolRow(symbol, symbol_id) for symbol, symbol_id in payload['symbols']]
+            features = await pipeline.load_symbol_features(db, rows, payload['timeframe'], fetch=payload.get('fetch', True))
+            results = pipeline.score_features(features, Scorer(payload.get('weights')), run_id)
+            # A retried job may find rows from an attempt that died after committing
+            symbol_ids = [r.symbol_id for r in rows]
+            await db.execute(delete(RunScore).where(RunScore.run_id == run_id, RunScore.symbol_id.in_(symbol_ids)))
+            await db.execute(delete(RunSignal).where(RunSignal.run_id == run_id, RunSignal.symbol_id.in_(symbol_ids)))
+            await pipeline.save_scores(db, run_id, results)
+            await db.commit()
+        # The coordinator assembles the ranking from these, without re-reading run_score
+        return [pipeline.report_item(x) for x in results]
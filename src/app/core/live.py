@@ -0,0 +1,298 @@
+"""
+Live mode: the ranking of one universe kept current from quotes during the
+session, entirely in memory.
+
+Bars and indicators are loaded from Postgres once. After that every quote is
+folded into its symbol's forming bar; only symbols whose bar actually moved
+get their indicators updated incrementally (logic.streaming) and are
+rescored, then the ranking is re-sorted and published to listeners (SSE) and
+to /live/ranking. Nothing is written per tick: the scheduled ingest and
+analysis jobs keep persisting bars and runs as before.
+
+Quotes come from polling the vnstock price board (one request per 100
+symbols) and/or are pushed through POST /live/quotes.
+"""
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from src.app.core.config import settings
+from src.app.core.metrics import LIVE_POLL_ERRORS, LIVE_RESCORED, LIVE_UPDATE_SECONDS
+from src.app.logic.streaming import NEW_BAR, UNCHANGED, FormingBar, IndicatorState, bar_key
+
+logger = logging.getLogger(__name__)
+
+# Events passed to listeners
+EVENT_RANKING = 'ranking'
+EVENT_TOP3 = 'top3'
+
+
+def _float(value) -> Optional[float]:
+    return None if value is None else float(value)
+
+
+class LiveSymbol:
+    __slots__ = ("symbol", "symbol_id", "bar", "state")
+
+    def __init__(self, symbol: str, symbol_id: int, bar: FormingBar, state: IndicatorState):
+        self.symbol = symbol
+        self.symbol_id = symbol_id
+        self.bar = bar
+        self.state = state
+
+
+class LiveEngine:
+    """
+    In-memory live ranking. apply() is synchronous and CPU-only, so it runs
+    on the event loop between polls / requests without any locking.
+    """
+    def __init__(self):
+        self.universe: Optional[str] = None
+        self.timeframe: Optional[str] = None
+        self.strategy: Optional[str] = None
+        self.version = 0
+        self.as_of: Optional[datetime] = None
+        self._tz = ZoneInfo(settings.APP_TIMEZONE)
+        self._symbols: Dict[str, LiveSymbol] = {}
+        self._items: Dict[str, Dict[str, Any]] = {}
+        self._ranking: List[Dict[str, Any]] = []
+        self._bodies: Dict[str, Tuple[bytes, str]] = {}
+        self._loaded_at = 0
+        self._scorer = None
+        self._plan = None
+        self._listeners: List[Callable[[str, Dict[str, Any]], None]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self._symbols)
+
+    def add_listener(self, callback: Callable[[str, Dict[str, Any]], None]):
+        """
+        Register a callback invoked (synchronously) as callback(event, data)
+        after each ranking update (EVENT_RANKING) and when the top 3 change
+        (EVENT_TOP3).
+        """
+        self._listeners.append(callback)
+
+    def _notify(self, event: str, data: Dict[str, Any]):
+        for callback in self._listeners:
+            try:
+                callback(event, data)
+            except Exception as e:
+                logger.error(f"Live listener failed: {e}")
+
+    async def start(self, universe: str = None, timeframe: str = None, strategy: str = None,
+                    poll_seconds: float = None):
+        """
+        Load the universe and, unless poll_seconds (default LIVE_POLL_SECONDS)
+        is 0, poll the price board in the background.
+        """
+        await self.load(
+            universe or settings.LIVE_UNIVERSE or settings.DEFAULT_UNIVERSE,
+            timeframe or settings.LIVE_TIMEFRAME,
+            strategy or settings.LIVE_STRATEGY or settings.DEFAULT_STRATEGY,
+        )
+        poll_seconds = settings.LIVE_POLL_SECONDS if poll_seconds is None else poll_seconds
+        if poll_seconds > 0:
+            self._task = asyncio.create_task(self._poll_loop(poll_seconds))
+
+    async def wait(self):
+        """
+        Block while the poller runs (CLI).
+        """
+        if self._task is not None:
+            await self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def load(self, universe: str, timeframe: str, strategy: str):
+        """
+        Read the lookback window of every member from the DB (no vnstock
+        fetch) and score the latest bars: the starting ranking equals a batch
+        run over the same bars.
+        """
+        from src.app.core import pipeline
+        from src.app.db.instrumentation import track_queries
+        from src.app.db.session import AsyncSessionLocal
+        from src.app.logic.scorer import Scorer
+
+        bar_key(datetime.now(self._tz), timeframe, self._tz)  # unsupported timeframe fails here
+        started = time.perf_counter()
+        features = []
+        with track_queries("live load"):
+            async with AsyncSessionLocal() as db:
+                univ_obj, tf_obj = await pipeline.resolve_run_dimensions(db, universe, timeframe)
+                strat_obj = await pipeline.get_or_create_strategy(db, strategy)
+                await db.commit()
+                members = await pipeline.get_members(db, univ_obj)
+                start_dt = datetime.now() - timedelta(days=pipeline.LOOKBACK_DAYS)
+                step = settings.PIPELINE_BATCH_SIZE
+                for i in range(0, len(members), step):
+                    batch = members[i:i + step]
+                    bars = await pipeline.read_bars_batch(db, [sym.symbol_id for sym in batch], tf_obj.timeframe_id, start_dt)
+                    features.extend(pipeline.compute_batch_features(batch, bars))
+
+        self.seed(features, universe, timeframe, strategy, Scorer(strat_obj.weights))
+        logger.info(f"📡 Live {universe} {timeframe} ({strategy}): {len(self._symbols)} of {len(members)} members "
+                    f"loaded in {time.perf_counter() - started:.1f}s")
+
+    def seed(self, features: List[Dict[str, Any]], universe: str, timeframe: str, strategy: str, scorer):
+        """
+        Replace the engine's symbols with compute_batch_features output; each
+        symbol's last bar becomes its forming bar. No I/O (benchmarks call it
+        with synthetic bars).
+        """
+        from src.app.logic.signals import plan_from_row
+
+        self.universe, self.timeframe, self.strategy = universe, timeframe, strategy
+        self._scorer, self._plan = scorer, plan_from_row
+        daily = timeframe == "1D"
+        symbols = {}
+        for feat in features:
+            df = feat['df']
+            state = IndicatorState.from_bars(df)
+            key = bar_key(df['ts'].iloc[-1], timeframe, self._tz)
+            bar = FormingBar(key, *(state.row[c] for c in ('open', 'high', 'low', 'close', 'volume')), daily=daily)
+            symbols[feat['symbol']] = LiveSymbol(feat['symbol'], feat['symbol_id'], bar, state)
+
+        self._symbols = symbols
+        self._ranking = []
+        self._loaded_at = int(time.time())
+        self.version = 0
+        now = datetime.now(self._tz)
+        self._items = {}
+        for sym in symbols.values():
+            item = self._score(sym, now)
+            if item is not None:
+                self._items[sym.symbol] = item
+        self._publish(list(self._items), now)
+
+    def apply(self, quotes: Iterable) -> List[str]:
+        """
+        Fold quotes (data_provider.quotes.Quote) into the forming bars, rescore
+        the symbols whose bar changed and publish the new ranking.
+        Returns the rescored symbols.
+        """
+        started = time.perf_counter()
+        now = datetime.now(self._tz)
+        changed: Dict[str, None] = {}
+        last_ts, key = None, None
+        for q in quotes:
+            sym = self._symbols.get(q.symbol)
+            if sym is None or not q.price:
+                continue
+            ts = q.ts or now
+            if ts != last_ts:
+                # A polled batch shares one timestamp: bucket it once
+                last_ts, key = ts, bar_key(ts, self.timeframe, self._tz)
+            # Plain floats: numpy scalars from a feed make the scalar math several times slower
+            result = sym.bar.apply(key, float(q.price), _float(q.volume), _float(q.open), _float(q.high), _float(q.low))
+            if result == UNCHANGED:
+                continue
+            if result == NEW_BAR:
+                sym.state.roll()
+            sym.state.update(*sym.bar.values())
+            item = self._score(sym, now)
+            if item is not None:
+                self._items[sym.symbol] = item
+                changed[sym.symbol] = None
+
+        if changed:
+            self._publish(list(changed), now)
+            LIVE_RESCORED.inc(len(changed))
+            LIVE_UPDATE_SECONDS.observe(time.perf_counter() - started)
+        return list(changed)
+
+    def _score(self, sym: LiveSymbol, now: datetime) -> Optional[Dict[str, Any]]:
+        row, prev_ema20, avg_width = sym.state.score_inputs()
+        try:
+            score_res = self._scorer.score_row(row, prev_ema20, avg_width)
+            signal_res = self._plan(row)
+        except Exception as e:
+            logger.error(f"Error live-scoring {sym.symbol}: {e}")
+            return None
+        return {
+            "symbol": sym.symbol,
+            "symbol_id": sym.symbol_id,
+            **score_res,  # score_total, breakdown, penalties
+            "signal": signal_res,
+            "close": row['close'],
+            "volume": row['volume'],
+            "bar_ts": sym.bar.key.isoformat(),
+            "updated_at": now.isoformat(),
+        }
+
+    def _publish(self, changed: List[str], now: datetime):
+        previous_top3 = [x['symbol'] for x in self._ranking[:3]]
+        self._ranking = sorted(self._items.values(), key=lambda x: x['score_total'], reverse=True)
+        self.version += 1
+        self.as_of = now
+        self._bodies = {}
+
+        if not self._listeners:
+            return
+        ranks = {x['symbol']: rank for rank, x in enumerate(self._ranking, 1)}
+        self._notify(EVENT_RANKING, {
+            "version": self.version,
+            "as_of": now.isoformat(),
+            "changed": [{"symbol": s, "rank": ranks[s], "score_total": self._items[s]['score_total'],
+                         "close": self._items[s]['close']} for s in changed],
+        })
+        if [x['symbol'] for x in self._ranking[:3]] != previous_top3:
+            self._notify(EVENT_TOP3, {"version": self.version, "as_of": now.isoformat(), "top3": self._ranking[:3]})
+
+    def ranking(self) -> List[Dict[str, Any]]:
+        return self._ranking
+
+    def body(self, field: str) -> Tuple[bytes, str]:
+        """
+        (JSON body, etag) of the current "ranking" or "top3", serialized once
+        per version however many clients poll.
+        """
+        cached = self._bodies.get(field)
+        if cached is None:
+            payload = {
+                "universe": self.universe,
+                "timeframe": self.timeframe,
+                "strategy": self.strategy,
+                "version": self.version,
+                "as_of": self.as_of,
+                field: self._ranking[:3] if field == "top3" else self._ranking,
+            }
+            body = json.dumps(payload, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+            cached = self._bodies[field] = (body, f'"live-{self._loaded_at}-{self.version}-{field}"')
+        return cached
+
+    async def _poll_loop(self, interval: float):
+        from src.app.core.sessions import in_session
+        from src.app.data_provider.quotes import fetch_price_board
+
+        symbols = sorted(self._symbols)
+        logger.info(f"📡 Polling the price board for {len(symbols)} symbols every {interval:.1f}s")
+        while True:
+            started = time.monotonic()
+            now = datetime.now(self._tz)
+            if not settings.LIVE_SESSION_ONLY or in_session(now):
+                try:
+                    quotes = await asyncio.to_thread(fetch_price_board, symbols, now)
+                except Exception as e:
+                    LIVE_POLL_ERRORS.inc()
+                    logger.warning(f"Live price board poll failed: {e}")
+                else:
+                    self.apply(quotes)
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+live_engine = LiveEngine()
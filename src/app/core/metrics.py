@@ -0,0 +1,233 @@
+"""
+Process-local runtime metrics in the Prometheus text format.
+
+A deliberately small registry (counters and histograms with labels) instead of
+a client library: recording is a dict lookup and a few additions under a lock,
+cheap enough for per-query and per-symbol call sites, and it needs no extra
+dependency. The API serves the registry on /metrics; short-lived processes
+(CLI commands, the scheduler after each job) hand it to a node_exporter
+textfile directory or a Pushgateway with export_metrics().
+
+Each process (and each uvicorn worker) has its own registry.
+"""
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Sequence, Tuple
+
+from src.app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds, from a fast indexed query to a slow full-universe stage
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry: "Registry" = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {_escape(self.documentation)}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """
+    Monotonic total, e.g. requests served or retries made.
+    """
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_label_text(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values over fixed buckets (upper bounds).
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS, registry: "Registry" = None):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (+Inf last)], sum, count
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return series[2] if series else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, ([*v[0]], v[1], v[2])) for k, v in self._series.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_label_text(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_label_text(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        lines = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Data provider
+FETCH_SECONDS = Histogram("vnstock_fetch_seconds", "vnstock history request latency", ["timeframe", "outcome"])
+FETCH_ROWS = Histogram("vnstock_fetch_rows", "Bars returned per vnstock history request", ["timeframe"],
+                       buckets=(0, 1, 5, 20, 100, 250, 1000, 2500, 10000))
+RATE_LIMIT_WAITS = Counter("rate_limit_waits_total", "Times a caller was held back by a rate limiter", ["limiter"])
+RATE_LIMIT_WAIT_SECONDS = Counter("rate_limit_wait_seconds_total", "Time spent waiting on rate limiters", ["limiter"])
+
+# Database
+DB_QUERY_SECONDS = Histogram("db_query_seconds", "Database statement latency", ["operation"])
+DB_OPERATION_STATEMENTS = Histogram("db_operation_statements", "Statements issued per tracked operation", ["operation"],
+                                    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000))
+DB_SUSPECTED_N_PLUS_ONE = Counter("db_suspected_n_plus_one_total", "Statement shapes repeated past DB_N_PLUS_ONE_THRESHOLD",
+                                  ["operation"])
+DB_QUERY_BUDGET_EXCEEDED = Counter("db_query_budget_exceeded_total", "Operations that went over their statement budget",
+                                   ["operation"])
+
+# Pipeline and scheduler
+STAGE_SECONDS = Histogram("pipeline_stage_seconds", "Duration of pipeline stages (per call)", ["stage"])
+SCHEDULER_LAG_SECONDS = Histogram("scheduler_lag_seconds", "Delay between a job's scheduled and actual start", ["job"],
+                                  buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0))
+SKIPPED_RUNS = Counter("skipped_runs_total", "Scheduled or requested runs that did not (re)compute", ["reason"])
+
+# Live mode
+LIVE_UPDATE_SECONDS = Histogram("live_update_seconds", "Quote batch applied to published live ranking")
+LIVE_RESCORED = Counter("live_rescored_total", "Symbols rescored because their forming bar changed")
+LIVE_POLL_ERRORS = Counter("live_poll_errors_total", "Failed price board polls")
+
+# Caches and notifications
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups by result (hit, miss, revalidated)", ["cache", "result"])
+TELEGRAM_RETRIES = Counter("telegram_retries_total", "Telegram sendMessage retries", ["reason"])
+
+
+def record_wait(limiter: str, seconds: float):
+    RATE_LIMIT_WAITS.inc(limiter=limiter)
+    RATE_LIMIT_WAIT_SECONDS.inc(seconds, limiter=limiter)
+
+
+def export_metrics(job: str) -> None:
+    """
+    Hand the registry to whatever collector is configured: a node_exporter
+    textfile (METRICS_TEXTFILE_DIR/<job>.prom, replaced atomically) and/or a
+    Pushgateway (METRICS_PUSHGATEWAY_URL, grouped by job). Blocking; failures
+    are logged, never raised.
+    """
+    if not settings.METRICS_ENABLED or not (settings.METRICS_TEXTFILE_DIR or settings.METRICS_PUSHGATEWAY_URL):
+        return
+    body = REGISTRY.render()
+
+    if settings.METRICS_TEXTFILE_DIR:
+        path = os.path.join(settings.METRICS_TEXTFILE_DIR, f"{job}.prom")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(settings.METRICS_TEXTFILE_DIR, exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(body)
+            # The collector must never read a half-written file
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Could not write metrics textfile {path}: {e}")
+
+    if settings.METRICS_PUSHGATEWAY_URL:
+        import httpx
+        url = f"{settings.METRICS_PUSHGATEWAY_URL.rstrip('/')}/metrics/job/{job}"
+        try:
+            resp = httpx.put(url, content=body.encode("utf-8"), headers={"Content-Type": CONTENT_TYPE},
+                             timeout=settings.METRICS_PUSH_TIMEOUT_SECONDS)
+            resp.raise_for_status()
+        except httpx.HTTPError as e:
+            logger.warning(f"Could not push metrics to the Pushgateway: {e}")
@@ -0,0 +1,476 @@
+import logging
+import uuid
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from typing import List, Dict, Any, Optional, Callable
+
+import pandas as pd
+from sqlalchemy import select, insert
+from sqlalchemy.exc import NoResultFound
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.app.core.config import settings
+from src.app.core.profiling import RunProfiler
+from src.app.data_provider.client import DataProvider
+from src.app.db.models import (
+    AnalysisRun, RunScore, RunSignal, RunReport, Strategy, Universe, Timeframe,
+    MarketSymbol, UniverseMember, OhlcvBar, OhlcvCoverage
+)
+from src.app.db.instrumentation import QueryBudgetExceeded
+from src.app.db.lookups import dimensions
+from src.app.logic.indicators import calculate_indicators_grouped
+from src.app.logic.scorer import Scorer
+from src.app.logic.signals import generate_trade_plan
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WEIGHTS = {"trend": 0.22, "base": 0.20, "breakout": 0.22, "volume": 0.18, "momentum": 0.10, "risk": 0.08}
+
+# Same shape as the (symbol, symbol_id) rows returned by get_members
+SymbolRow = namedtuple('SymbolRow', ['symbol', 'symbol_id'])
+
+BAR_COLUMNS = [c.name for c in OhlcvBar.__table__.columns]
+PRICE_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+# Bars needed for indicators (EMA50 + rolling windows)
+LOOKBACK_DAYS = 200
+MIN_BARS = 50
+
+
+def serialize_for_json(obj):
+    """
+    Convert UUIDs (recursively) to strings so results fit in JSON columns.
+    """
+    if isinstance(obj, dict):
+        return {k: serialize_for_json(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [serialize_for_json(item) for item in obj]
+    elif isinstance(obj, uuid.UUID):
+        return str(obj)
+    else:
+        return obj
+
+
+def last_row_features(df: pd.DataFrame) -> Dict[str, Any]:
+    """
+    JSON-friendly snapshot of the latest bar and its indicators.
+    """
+    if df.empty:
+        return {}
+    return {k: (v.isoformat() if isinstance(v, pd.Timestamp) else float(v) if isinstance(v, (int, float)) else str(v))
+            for k, v in df.iloc[-1].to_dict().items() if not pd.isna(v)}
+
+
+async def get_or_create_strategy(db: AsyncSession, code: str) -> Strategy:
+    strat_obj = (await db.execute(select(Strategy).where(Strategy.code == code))).scalar_one_or_none()
+    if not strat_obj:
+        logger.warning(f"Strategy {code} not found, creating it with default weights")
+        strat_obj = Strategy(
+            code=code,
+            name="Default Short-term",
+            weights=dict(DEFAULT_WEIGHTS),
+            parameters={}
+        )
+        db.add(strat_obj)
+        await db.flush()
+    return strat_obj
+
+
+async def get_strategies(db: AsyncSession, codes: List[str]) -> Dict[str, Strategy]:
+    """
+    Strategies among `codes`, by code. Unknown codes are left out, except
+    DEFAULT_STRATEGY which is created on first use; a typo must not create
+    a strategy with default weights.
+    """
+    rows = await db.execute(select(Strategy).where(Strategy.code.in_(codes)))
+    found = {s.code: s for s in rows.scalars()}
+    if settings.DEFAULT_STRATEGY in codes and settings.DEFAULT_STRATEGY not in found:
+        found[settings.DEFAULT_STRATEGY] = await get_or_create_strategy(db, settings.DEFAULT_STRATEGY)
+    return found
+
+
+async def get_strategy(db: AsyncSession, code: str) -> Strategy:
+    """
+    Like get_strategies for one code; raises NoResultFound for an unknown one.
+    """
+    strat_obj = (await get_strategies(db, [code])).get(code)
+    if strat_obj is None:
+        raise NoResultFound(f"Unknown strategy {code}")
+    return strat_obj
+
+
+async def resolve_run_dimensions(db: AsyncSession, universe: str, timeframe: str):
+    univ_obj = (await db.execute(select(Universe).where(Universe.code == universe))).scalar_one()
+    tf_obj = (await db.execute(select(Timeframe).where(Timeframe.code == timeframe))).scalar_one()
+    return univ_obj, tf_obj
+
+
+async def start_run(db: AsyncSession, univ_obj: Universe, tf_obj: Timeframe, strat_obj: Strategy) -> AnalysisRun:
+    """
+    Insert an analysis_run row in 'running' state and commit it.
+    """
+    run_rec = AnalysisRun(
+        run_id=uuid.uuid4(),
+        universe_id=univ_obj.universe_id,
+        timeframe_id=tf_obj.timeframe_id,
+        strategy_id=strat_obj.strategy_id,
+        as_of=datetime.now(),
+        started_at=datetime.now(),
+        status='running'
+    )
+    db.add(run_rec)
+    await db.commit()
+    return run_rec
+
+
+async def get_members(db: AsyncSession, univ_obj: Universe, as_of: Optional[date] = None):
+    """
+    (symbol, symbol_id) rows of the current universe members, or of the
+    members on `as_of` (survivorship-free, for backtests and historical runs).
+    """
+    stmt = select(MarketSymbol.symbol, MarketSymbol.symbol_id)\
+        .join(UniverseMember, MarketSymbol.symbol_id == UniverseMember.symbol_id)\
+        .where(UniverseMember.universe_id == univ_obj.universe_id, UniverseMember.active_on(as_of))\
+        .distinct()\
+        .order_by(MarketSymbol.symbol)
+    return (await db.execute(stmt)).all()
+
+
+async def load_features(
+    db: AsyncSession,
+    univ_obj: Universe,
+    timeframe: str,
+    profiler: Optional[RunProfiler] = None,
+    days: int = LOOKBACK_DAYS,
+    progress: Optional[Callable[[int, int, str], None]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Load bars for every universe member and compute the shared indicators.
+
+    The result is independent of the strategy, so it can be scored by any
+    number of strategies without touching the DB or vnstock again.
+    """
+    symbols = await get_members(db, univ_obj)
+    logger.info(f"Loading {len(symbols)} symbols from {univ_obj.code} ({timeframe})...")
+    return await load_symbol_features(db, symbols, timeframe, profiler=profiler, days=days, progress=progress)
+
+
+async def load_symbol_features(
+    db: AsyncSession,
+    symbols,
+    timeframe: str,
+    profiler: Optional[RunProfiler] = None,
+    days: int = LOOKBACK_DAYS,
+    fetch: bool = True,
+    progress: Optional[Callable[[int, int, str], None]] = None,
+    batch_size: int = None
+) -> List[Dict[str, Any]]:
+    """
+    Load bars and indicators for the given (symbol, symbol_id) rows.
+    With fetch=False bars are read from the DB only.
+    progress(done, total, symbol) is called before each symbol is computed.
+    """
+    features = []
+    async for batch in iter_symbol_features(db, symbols, timeframe, profiler=profiler, days=days, fetch=fetch,
+                                            progress=progress, batch_size=batch_size):
+        features.extend(batch)
+    return features
+
+
+async def iter_symbol_features(
+    db: AsyncSession,
+    symbols,
+    timeframe: str,
+    profiler: Optional[RunProfiler] = None,
+    days: int = LOOKBACK_DAYS,
+    fetch: bool = True,
+    progress: Optional[Callable[[int, int, str], None]] = None,
+    batch_size: int = None
+):
+    """
+    Yield features batch by batch (PIPELINE_BATCH_SIZE symbols): stale symbols
+    are ingested, the batch's bars are read in one query and its indicators
+    computed in one grouped pass. Consumers that score and drop each batch
+    keep memory flat regardless of universe size.
+    """
+    profiler = profiler or RunProfiler()
+    dp = DataProvider(db, profiler=profiler)
+    timeframe_id = await dimensions.timeframe_id(db, timeframe)
+    if timeframe_id is None:
+        raise ValueError(f"Timeframe {timeframe} not found")
+    start_dt = datetime.now() - timedelta(days=days)
+    batch_size = batch_size or settings.PIPELINE_BATCH_SIZE
+    total = len(symbols)
+    done = 0
+
+    for i in range(0, total, batch_size):
+        batch = symbols[i:i + batch_size]
+        if fetch:
+            await refresh_stale(dp, db, batch, timeframe, timeframe_id, days)
+        with profiler.stage("db_read"):
+            bars = await read_bars_batch(db, [sym.symbol_id for sym in batch], timeframe_id, start_dt)
+        features = compute_batch_features(batch, bars, profiler, progress=progress, done=done, total=total)
+        done += len(batch)
+        yield features
+
+
+def compute_batch_features(
+    symbols,
+    bars: pd.DataFrame,
+    profiler: Optional[RunProfiler] = None,
+    progress: Optional[Callable[[int, int, str], None]] = None,
+    done: int = 0,
+    total: int = None
+) -> List[Dict[str, Any]]:
+    """
+    Indicators for a whole batch in one grouped pass, then one feature dict
+    (bar frame + latest-bar snapshot) per symbol with at least MIN_BARS bars.
+    `bars` is the read_bars_batch frame of these symbols.
+    """
+    profiler = profiler or RunProfiler()
+    total = total or len(symbols)
+    if not bars.empty:
+        with profiler.stage("indicators"):
+            bars = calculate_indicators_grouped(bars, by='symbol_id')
+            bars.index = pd.DatetimeIndex(bars['ts'], name='time')
+        frames = {symbol_id: df for symbol_id, df in bars.groupby('symbol_id', sort=False)}
+    else:
+        frames = {}
+
+    features = []
+    for sym in symbols:
+        done += 1
+        if progress:
+            progress(done, total, sym.symbol)
+        df = frames.pop(sym.symbol_id, None)
+        if df is None or len(df) < MIN_BARS:
+            continue
+        try:
+            features.append({
+                "symbol": sym.symbol,
+                "symbol_id": sym.symbol_id,
+                "df": df,
+                "features": last_row_features(df),
+            })
+        except Exception as e:
+            logger.error(f"Error loading {sym.symbol}: {e}")
+    return features
+
+
+async def refresh_stale(dp: DataProvider, db: AsyncSession, symbols, timeframe: str, timeframe_id: int, days: int):
+    """
+    Ingest the symbols whose coverage stops before today (one coverage query
+    for the batch; fresh symbols cost nothing).
+    """
+    rows = await db.execute(
+        select(OhlcvCoverage.symbol_id, OhlcvCoverage.last_ts)
+        .where(OhlcvCoverage.timeframe_id == timeframe_id,
+               OhlcvCoverage.symbol_id.in_([sym.symbol_id for sym in symbols]))
+    )
+    last_ts = dict(rows.all())
+    today = datetime.now().date()
+    for sym in symbols:
+        ts = last_ts.get(sym.symbol_id)
+        if ts is not None and ts.date() >= today:
+            continue
+        try:
+            await dp.ingest(sym.symbol, timeframe=timeframe, days=days)
+        except QueryBudgetExceeded:
+            # Strict budget: fail the run instead of skipping the symbol
+            raise
+        except Exception as e:
+            logger.error(f"Failed to fetch/save {sym.symbol}: {e}")
+
+
+async def read_bars_batch(db: AsyncSession, symbol_ids: List[int], timeframe_id: int, start: datetime) -> pd.DataFrame:
+    """
+    Bars since `start` of many symbols in one query, ordered by symbol then
+    time, with float prices (the columns of DataProvider.get_ohlcv frames).
+    """
+    if not symbol_ids:
+        return pd.DataFrame(columns=BAR_COLUMNS)
+    stmt = select(*OhlcvBar.__table__.columns).where(
+        OhlcvBar.symbol_id.in_(symbol_ids),
+        OhlcvBar.timeframe_id == timeframe_id,
+        OhlcvBar.ts >= start
+    ).order_by(OhlcvBar.symbol_id, OhlcvBar.ts)
+    rows = (await db.execute(stmt)).all()
+    df = pd.DataFrame(rows, columns=BAR_COLUMNS)
+    # Decimal -> float once for the batch
+    df[PRICE_COLUMNS] = df[PRICE_COLUMNS].astype(float)
+    return df
+
+
+async def score_members(
+    db: AsyncSession,
+    symbols,
+    timeframe: str,
+    scorer: Scorer,
+    run_id: uuid.UUID,
+    profiler: Optional[RunProfiler] = None,
+    fetch: bool = True,
+    progress: Optional[Callable[[int, int, str], None]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Load and score the symbols batch by batch, keeping only the (small) results;
+    bar frames are released after each batch.
+    """
+    results = []
+    async for batch in iter_symbol_features(db, symbols, timeframe, profiler=profiler, fetch=fetch, progress=progress):
+        results.extend(score_features(batch, scorer, run_id, profiler=profiler))
+    return results
+
+
+def score_features(
+    features: List[Dict[str, Any]],
+    scorer: Scorer,
+    run_id: uuid.UUID,
+    profiler: Optional[RunProfiler] = None
+) -> List[Dict[str, Any]]:
+    """
+    Score and build trade plans for preloaded features (pure CPU, no I/O).
+    """
+    profiler = profiler or RunProfiler()
+    results = []
+    for feat in features:
+        try:
+            with profiler.stage("score", feat['symbol'], feat['symbol_id']):
+                score_res = scorer.calculate_score(feat['df'])
+            with profiler.stage("signal", feat['symbol'], feat['symbol_id']):
+                signal_res = generate_trade_plan(feat['df'], score_res)
+            results.append({
+                "symbol_id": feat['symbol_id'],
+                "symbol": feat['symbol'],
+                "run_id": run_id,
+                **score_res, # score_total, breakdown, penalties
+                "signal": signal_res,
+                "features": feat['features'],
+            })
+        except Exception as e:
+            logger.error(f"Error scoring {feat['symbol']}: {e}")
+    return results
+
+
+def build_score_rows(run_id: uuid.UUID, item: Dict[str, Any]):
+    """
+    Build the RunScore / RunSignal row values for one scored symbol.
+    """
+    bd = item['breakdown']
+    signal_res = item['signal']
+    now = datetime.now()
+    rs = dict(
+        run_id=run_id,
+        symbol_id=item['symbol_id'],
+        score_total=item['score_total'],
+        score_trend=bd['trend'],
+        score_base=bd['base'],
+        score_breakout=bd['breakout'],
+        score_volume=bd['volume'],
+        score_momentum=bd['momentum'],
+        score_risk=bd['risk'],
+        penalties=item.get('penalties', []),
+        features=item.pop('features', {}),
+        computed_at=now
+    )
+    sig = dict(
+        run_id=run_id,
+        symbol_id=item['symbol_id'],
+        entry_zone=signal_res.get('entry_zone', {}),
+        stop_loss=signal_res.get('stop_loss'),
+        take_profit_1=signal_res.get('take_profit_1'),
+        take_profit_2=signal_res.get('take_profit_2'),
+        invalidation=signal_res.get('invalidation'),
+        key_reasons=signal_res.get('key_reasons', []),
+        risk_notes=signal_res.get('risk_notes', []),
+        created_at=now
+    )
+    return rs, sig
+
+
+def report_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Ranking entry as stored in run_report (debug row dropped).
+    """
+    return serialize_for_json({k: v for k, v in item.items() if k != 'row'})
+
+
+async def save_scores(db: AsyncSession, run_id: uuid.UUID, results: List[Dict[str, Any]]):
+    """
+    Insert RunScore / RunSignal rows for scored results (not committed).
+    Multi-row INSERTs in PIPELINE_BATCH_SIZE chunks instead of one ORM object
+    per row, so a full-market run persists in a few round trips.
+    """
+    scores, signals = [], []
+    for item in results:
+        if not item.get('breakdown'):
+            item.pop('features', None)
+            continue
+        # build_score_rows moves the features snapshot out of the item
+        rs, sig = build_score_rows(run_id, item)
+        scores.append(rs)
+        signals.append(sig)
+    step = settings.PIPELINE_BATCH_SIZE
+    for i in range(0, len(scores), step):
+        await db.execute(insert(RunScore), scores[i:i + step])
+        await db.execute(insert(RunSignal), signals[i:i + step])
+
+
+async def finalize_run(
+    db: AsyncSession,
+    run_rec: AnalysisRun,
+    results: List[Dict[str, Any]],
+    profiler: Optional[RunProfiler] = None
+) -> List[Dict[str, Any]]:
+    """
+    Rank results, save the run_report snapshot and mark the run successful.
+    Sorts results in place and returns the top 3.
+    """
+    profiler = profiler or RunProfiler()
+    with profiler.stage("rank"):
+        results.sort(key=lambda x: x['score_total'], reverse=True)
+        top3 = results[:3]
+
+    with profiler.stage("report_db"):
+        rr = RunReport(
+            run_id=run_rec.run_id,
+            top3=[report_item(x) for x in top3],
+            ranking=[report_item(x) for x in results],
+            summary={"count": len(results)},
+            created_at=datetime.now()
+        )
+        db.add(rr)
+
+        # Update status
+        run_rec.status = 'success'
+        run_rec.finished_at = datetime.now()
+        await db.commit()
+    return top3
+
+
+async def persist_results(
+    db: AsyncSession,
+    run_rec: AnalysisRun,
+    results: List[Dict[str, Any]],
+    profiler: Optional[RunProfiler] = None
+) -> List[Dict[str, Any]]:
+    """
+    Save scores, signals and the ranking snapshot, then mark the run successful.
+    Sorts results in place and returns the top 3.
+    """
+    profiler = profiler or RunProfiler()
+    with profiler.stage("persist"):
+        await save_scores(db, run_rec.run_id, results)
+    return await finalize_run(db, run_rec, results, profiler=profiler)
+
+
+async def fail_run(db: AsyncSession, run_id: uuid.UUID, error: Exception):
+    """
+    Mark a run as failed after rolling back whatever was pending.
+    """
+    # Rollback session to recovery from error state
+    await db.rollback()
+    run_rec = await db.get(AnalysisRun, run_id)
+    if run_rec:
+        run_rec.status = 'failed'
+        run_rec.error_message = str(error)[:255] # truncation
+        await db.commit()
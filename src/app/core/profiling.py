@@ -0,0 +1,136 @@
+import time
+import tracemalloc
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+from src.app.core.metrics import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class RunProfiler:
+    """
+    Per-stage profiler for analysis runs.
+
+    Records wall time, CPU time and (optionally) peak traced memory for each
+    stage, optionally tagged with a symbol. A disabled profiler is a no-op,
+    so call sites can always wrap their stages without checking a flag.
+    Stages are expected to be sequential (not nested) so peak memory is
+    attributed to exactly one stage.
+    """
+    def __init__(self, enabled: bool = False, trace_memory: bool = False):
+        self.enabled = enabled
+        self.trace_memory = enabled and trace_memory
+        self.records: List[Dict[str, Any]] = []
+        self._owns_tracing = False
+
+    def start(self):
+        if self.trace_memory and not tracemalloc.is_tracing():
+            # 1 frame keeps the tracemalloc overhead as low as possible
+            tracemalloc.start(1)
+            self._owns_tracing = True
+
+    def stop(self):
+        if self._owns_tracing:
+            tracemalloc.stop()
+            self._owns_tracing = False
+
+    @contextmanager
+    def stage(self, name: str, symbol: Optional[str] = None, symbol_id: Optional[int] = None):
+        if not self.enabled:
+            # Stage durations still go to the runtime metrics (two clock reads)
+            with STAGE_SECONDS.time(stage=name):
+                yield
+            return
+
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            mem_start = tracemalloc.get_traced_memory()[0]
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            wall_ms = (time.perf_counter() - wall_start) * 1000
+            STAGE_SECONDS.observe(wall_ms / 1000, stage=name)
+            cpu_ms = (time.process_time() - cpu_start) * 1000
+            peak_kb = None
+            if tracing:
+                peak_kb = max(0, tracemalloc.get_traced_memory()[1] - mem_start) // 1024
+            self.records.append({
+                "stage": name,
+                "symbol": symbol,
+                "symbol_id": symbol_id,
+                "wall_ms": round(wall_ms, 3),
+                "cpu_ms": round(cpu_ms, 3),
+                "peak_mem_kb": peak_kb,
+            })
+
+    def stage_totals(self) -> List[Dict[str, Any]]:
+        """
+        Aggregate records by stage, slowest first.
+        """
+        totals: Dict[str, Dict[str, Any]] = {}
+        for r in self.records:
+            t = totals.setdefault(r['stage'], {"stage": r['stage'], "calls": 0, "wall_ms": 0.0, "cpu_ms": 0.0, "peak_mem_kb": 0})
+            t['calls'] += 1
+            t['wall_ms'] += r['wall_ms']
+            t['cpu_ms'] += r['cpu_ms']
+            t['peak_mem_kb'] = max(t['peak_mem_kb'], r['peak_mem_kb'] or 0)
+        return sorted(totals.values(), key=lambda x: x['wall_ms'], reverse=True)
+
+    def symbol_totals(self) -> List[Dict[str, Any]]:
+        """
+        Aggregate records by symbol (all stages summed), slowest first.
+        """
+        totals: Dict[str, Dict[str, Any]] = {}
+        for r in self.records:
+            if not r['symbol']:
+                continue
+            t = totals.setdefault(r['symbol'], {"symbol": r['symbol'], "wall_ms": 0.0, "cpu_ms": 0.0})
+            t['wall_ms'] += r['wall_ms']
+            t['cpu_ms'] += r['cpu_ms']
+        return sorted(totals.values(), key=lambda x: x['wall_ms'], reverse=True)
+
+    async def save(self, db, run_id):
+        """
+        Persist collected records into trading.run_metrics.
+        """
+        if not self.enabled or not self.records:
+            return
+        from sqlalchemy.dialects.postgresql import insert
+        from src.app.db.models import RunMetric
+
+        now = datetime.now()
+        rows = [{
+            "run_id": run_id,
+            "stage": r['stage'],
+            "symbol_id": r['symbol_id'],
+            "wall_ms": r['wall_ms'],
+            "cpu_ms": r['cpu_ms'],
+            "peak_mem_kb": r['peak_mem_kb'],
+            "created_at": now,
+        } for r in self.records]
+        # Chunked: a full-market run has tens of thousands of records (bind parameter limit)
+        for i in range(0, len(rows), 2000):
+            await db.execute(insert(RunMetric).values(rows[i:i + 2000]))
+        await db.commit()
+        logger.info(f"Saved {len(rows)} profiling records for run {run_id}")
+
+
+def format_profile_summary(stages: List[Dict[str, Any]], symbols: List[Dict[str, Any]], top: int = 10) -> str:
+    """
+    Render stage/symbol totals as a plain-text table for the CLI.
+    """
+    lines = ["Slowest stages:", f"{'stage':<14}{'calls':>7}{'wall_ms':>12}{'cpu_ms':>12}{'peak_kb':>10}"]
+    for s in stages[:top]:
+        lines.append(f"{s['stage']:<14}{s['calls']:>7}{s['wall_ms']:>12.1f}{s['cpu_ms']:>12.1f}{(s['peak_mem_kb'] or 0):>10}")
+    lines.append("")
+    lines.append("Slowest symbols:")
+    lines.append(f"{'symbol':<14}{'wall_ms':>12}{'cpu_ms':>12}")
+    for s in symbols[:top]:
+        lines.append(f"{s['symbol']:<14}{s['wall_ms']:>12.1f}{s['cpu_ms']:>12.1f}")
+    return "\n".join(lines)
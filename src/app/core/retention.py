@@ -0,0 +1,292 @@
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import select, update, delete, func, literal_column, tuple_, cast, or_, null
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.app.core.config import settings
+from src.app.db.models import (
+    AnalysisRun, RunScore, RunSignal, RunReport, RunMetric, QueueJob, DataFetchLog
+)
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "index.jsonl"
+
+
+def _cutoff(days: int) -> Optional[datetime]:
+    # 0 (or negative) disables a policy
+    if not days or days <= 0:
+        return None
+    return datetime.now(timezone.utc) - timedelta(days=days)
+
+
+class RetentionPolicy:
+    """
+    Age limits in days per table (0 = keep forever). Defaults come from the
+    RETENTION_* settings.
+
+    - detail_days: every run keeps full detail; older runs are compacted to one
+      representative per day (last successful run per universe/timeframe/strategy)
+    - run_days: representatives older than this are archived and deleted
+    - features_days: run_score.features JSON is dropped
+    - signal_days: run_signal rows are deleted
+    - ranking_days: run_report.ranking is emptied (run_score still holds it)
+    - metrics_days, job_days, fetch_log_days: operational tables
+    """
+    def __init__(self, **overrides):
+        self.detail_days = settings.RETENTION_DETAIL_DAYS
+        self.run_days = settings.RETENTION_RUN_DAYS
+        self.features_days = settings.RETENTION_FEATURES_DAYS
+        self.signal_days = settings.RETENTION_SIGNAL_DAYS
+        self.ranking_days = settings.RETENTION_RANKING_DAYS
+        self.metrics_days = settings.RETENTION_METRICS_DAYS
+        self.job_days = settings.RETENTION_JOB_QUEUE_DAYS
+        self.fetch_log_days = settings.RETENTION_FETCH_LOG_DAYS
+        for key, value in overrides.items():
+            if value is not None:
+                setattr(self, key, value)
+
+
+class RunArchive:
+    """
+    Gzipped JSON-lines files of deleted runs (one run per line with its
+    scores, signals and report) plus an append-only index.jsonl mapping
+    run_id -> file.
+    """
+    def __init__(self, directory: str = None):
+        self.directory = directory or settings.RETENTION_ARCHIVE_DIR
+
+    def write(self, runs: List[Dict[str, Any]]) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"runs_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.jsonl.gz"
+        path = os.path.join(self.directory, name)
+        tmp = path + ".tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            for run in runs:
+                f.write(json.dumps(run, default=str, ensure_ascii=False, separators=(",", ":")) + "\n")
+        os.replace(tmp, path)
+
+        archived_at = datetime.now(timezone.utc).isoformat()
+        with open(os.path.join(self.directory, INDEX_FILE), "a", encoding="utf-8") as idx:
+            for run in runs:
+                r = run["run"]
+                idx.write(json.dumps({
+                    "run_id": str(r["run_id"]), "as_of": str(r["as_of"]), "status": r["status"],
+                    "universe_id": r["universe_id"], "timeframe_id": r["timeframe_id"],
+                    "strategy_id": r["strategy_id"], "file": name, "archived_at": archived_at,
+                }) + "\n")
+        return path
+
+    def find(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Load one archived run (latest archive wins if it was archived twice).
+        """
+        index_path = os.path.join(self.directory, INDEX_FILE)
+        if not os.path.exists(index_path):
+            return None
+        file_name = None
+        with open(index_path, encoding="utf-8") as idx:
+            for line in idx:
+                entry = json.loads(line)
+                if entry["run_id"] == run_id:
+                    file_name = entry["file"]
+        if not file_name:
+            return None
+        with gzip.open(os.path.join(self.directory, file_name), "rt", encoding="utf-8") as f:
+            for line in f:
+                run = json.loads(line)
+                if str(run["run"]["run_id"]) == run_id:
+                    return run
+        return None
+
+
+def _day_key():
+    return func.date(func.timezone(settings.APP_TIMEZONE, AnalysisRun.as_of))
+
+
+def expired_runs_query(policy: RetentionPolicy, limit: int):
+    """
+    run_ids to archive: runs past run_days, plus (past detail_days) failed runs
+    and successful runs that are not their day's representative.
+    """
+    detail_cut = _cutoff(policy.detail_days)
+    run_cut = _cutoff(policy.run_days)
+    if detail_cut is None and run_cut is None:
+        return None
+
+    ranked = select(
+        AnalysisRun.run_id,
+        AnalysisRun.as_of,
+        AnalysisRun.status,
+        func.row_number().over(
+            partition_by=(AnalysisRun.universe_id, AnalysisRun.timeframe_id, AnalysisRun.strategy_id, _day_key()),
+            order_by=((AnalysisRun.status == 'success').desc(), AnalysisRun.finished_at.desc().nulls_last())
+        ).label("rn")
+    ).where(AnalysisRun.status != 'running')
+    oldest = detail_cut if detail_cut is not None else run_cut
+    ranked = ranked.where(AnalysisRun.as_of < oldest).subquery()
+
+    conds = []
+    if run_cut is not None:
+        conds.append(ranked.c.as_of < run_cut)
+    if detail_cut is not None:
+        conds.append((ranked.c.rn > 1) | (ranked.c.status != 'success'))
+    return select(ranked.c.run_id).where(or_(*conds)).order_by(ranked.c.as_of).limit(limit)
+
+
+async def _load_runs(db: AsyncSession, run_ids: List) -> List[Dict[str, Any]]:
+    runs = {r.run_id: {"run": r.as_dict(), "scores": [], "signals": [], "report": None}
+            for r in (await db.execute(select(AnalysisRun).where(AnalysisRun.run_id.in_(run_ids)))).scalars()}
+    for s in (await db.execute(select(RunScore).where(RunScore.run_id.in_(run_ids)))).scalars():
+        runs[s.run_id]["scores"].append(s.as_dict())
+    for s in (await db.execute(select(RunSignal).where(RunSignal.run_id.in_(run_ids)))).scalars():
+        runs[s.run_id]["signals"].append(s.as_dict())
+    for r in (await db.execute(select(RunReport).where(RunReport.run_id.in_(run_ids)))).scalars():
+        runs[r.run_id]["report"] = r.as_dict()
+    return list(runs.values())
+
+
+async def archive_runs(db: AsyncSession, policy: RetentionPolicy, archive: RunArchive,
+                       batch_size: int, dry_run: bool = False) -> int:
+    """
+    Export expired runs to the archive and delete them (children cascade).
+    Each batch is written to disk before its delete is committed.
+    """
+    stmt = expired_runs_query(policy, batch_size)
+    if stmt is None:
+        return 0
+    if dry_run:
+        return (await db.execute(select(func.count()).select_from(stmt.limit(None).subquery()))).scalar_one()
+
+    total = 0
+    while True:
+        run_ids = list((await db.execute(stmt)).scalars())
+        if not run_ids:
+            break
+        path = archive.write(await _load_runs(db, run_ids))
+        await db.execute(delete(AnalysisRun).where(AnalysisRun.run_id.in_(run_ids))
+                         .execution_options(synchronize_session=False))
+        await db.commit()
+        total += len(run_ids)
+        logger.info(f"🗄️ Archived {len(run_ids)} runs to {path}")
+    return total
+
+
+async def _batched(db: AsyncSession, key_query, apply, dry_run: bool) -> int:
+    """
+    Run `apply(keys_subquery)` in committed batches until no rows match `key_query`.
+    """
+    if dry_run:
+        return (await db.execute(select(func.count()).select_from(key_query.limit(None).subquery()))).scalar_one()
+    total = 0
+    while True:
+        result = await db.execute(apply(key_query).execution_options(synchronize_session=False))
+        await db.commit()
+        if not result.rowcount:
+            break
+        total += result.rowcount
+    return total
+
+
+async def compact_details(db: AsyncSession, policy: RetentionPolicy, batch_size: int,
+                          dry_run: bool = False) -> Dict[str, int]:
+    """
+    Slim down the runs that are kept: drop features, signals and the report ranking
+    past their own age limits.
+    """
+    stats = {}
+
+    cut = _cutoff(policy.features_days)
+    if cut is not None:
+        # features is a plain JSON column: values(features=None) would store the
+        # JSON value 'null', which still matches IS NOT NULL. Write SQL NULL and
+        # skip JSON null, so every batch shrinks the match set.
+        json_null = cast(RunScore.features, JSONB) == literal_column("'null'::jsonb")
+        def clear(q):
+            return update(RunScore).where(tuple_(RunScore.run_id, RunScore.symbol_id).in_(q)).values(features=null())
+
+        keys = select(RunScore.run_id, RunScore.symbol_id)\
+            .join(AnalysisRun, AnalysisRun.run_id == RunScore.run_id)\
+            .where(AnalysisRun.as_of < cut, RunScore.features.isnot(None), ~json_null).limit(batch_size)
+        stats["run_score.features"] = await _batched(db, keys, clear, dry_run)
+        # Rows an earlier version left as JSON null become SQL NULL
+        keys = select(RunScore.run_id, RunScore.symbol_id)\
+            .join(AnalysisRun, AnalysisRun.run_id == RunScore.run_id)\
+            .where(AnalysisRun.as_of < cut, json_null).limit(batch_size)
+        stats["run_score.features_json_null"] = await _batched(db, keys, clear, dry_run)
+
+    cut = _cutoff(policy.signal_days)
+    if cut is not None:
+        keys = select(RunSignal.run_id, RunSignal.symbol_id)\
+            .join(AnalysisRun, AnalysisRun.run_id == RunSignal.run_id)\
+            .where(AnalysisRun.as_of < cut).limit(batch_size)
+        stats["run_signal"] = await _batched(
+            db, keys,
+            lambda q: delete(RunSignal).where(tuple_(RunSignal.run_id, RunSignal.symbol_id).in_(q)),
+            dry_run)
+
+    cut = _cutoff(policy.ranking_days)
+    if cut is not None:
+        keys = select(RunReport.run_id)\
+            .join(AnalysisRun, AnalysisRun.run_id == RunReport.run_id)\
+            .where(AnalysisRun.as_of < cut, func.jsonb_array_length(cast(RunReport.ranking, JSONB)) > 0)\
+            .limit(batch_size)
+        stats["run_report.ranking"] = await _batched(
+            db, keys,
+            lambda q: update(RunReport).where(RunReport.run_id.in_(q)).values(
+                ranking=literal_column("'[]'::jsonb"),
+                summary=func.coalesce(cast(RunReport.summary, JSONB), literal_column("'{}'::jsonb")).op("||")(
+                    literal_column("'{\"ranking_compacted\": true}'::jsonb"))
+            ),
+            dry_run)
+    return stats
+
+
+async def purge_operational(db: AsyncSession, policy: RetentionPolicy, batch_size: int,
+                            dry_run: bool = False) -> Dict[str, int]:
+    stats = {}
+
+    cut = _cutoff(policy.metrics_days)
+    if cut is not None:
+        # Via analysis_run.as_of (indexed) rather than an unindexed created_at scan
+        keys = select(RunMetric.metric_id)\
+            .join(AnalysisRun, AnalysisRun.run_id == RunMetric.run_id)\
+            .where(AnalysisRun.as_of < cut).limit(batch_size)
+        stats["run_metrics"] = await _batched(
+            db, keys, lambda q: delete(RunMetric).where(RunMetric.metric_id.in_(q)), dry_run)
+
+    cut = _cutoff(policy.job_days)
+    if cut is not None:
+        keys = select(QueueJob.job_id)\
+            .where(QueueJob.status.in_(('done', 'failed')), QueueJob.finished_at < cut).limit(batch_size)
+        stats["job_queue"] = await _batched(
+            db, keys, lambda q: delete(QueueJob).where(QueueJob.job_id.in_(q)), dry_run)
+
+    cut = _cutoff(policy.fetch_log_days)
+    if cut is not None:
+        keys = select(DataFetchLog.fetch_id).where(DataFetchLog.created_at < cut).limit(batch_size)
+        stats["data_fetch_log"] = await _batched(
+            db, keys, lambda q: delete(DataFetchLog).where(DataFetchLog.fetch_id.in_(q)), dry_run)
+    return stats
+
+
+async def apply_retention(db: AsyncSession, policy: RetentionPolicy = None, archive: RunArchive = None,
+                          dry_run: bool = False) -> Dict[str, int]:
+    """
+    Archive + delete expired runs, compact the kept ones, purge operational
+    tables. Returns affected row counts per step (would-be counts with dry_run).
+    """
+    policy = policy or RetentionPolicy()
+    archive = archive or RunArchive()
+    batch_size = settings.RETENTION_BATCH_SIZE
+
+    stats = {"analysis_run.archived": await archive_runs(db, policy, archive, batch_size, dry_run)}
+    stats.update(await compact_details(db, policy, batch_size, dry_run))
+    stats.update(await purge_operational(db, policy, batch_size, dry_run))
+    return stats
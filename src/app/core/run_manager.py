@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple, List, Callable
+
+from src.app.core.metrics import SKIPPED_RUNS
+from src.app.db.instrumentation import track_queries
+from src.app.db.session import AsyncSessionLocal
+from src.app.db.models import AnalysisRun
+
+logger = logging.getLogger(__name__)
+
+# Finished runs kept in memory for GET /runs/{id}; older ones are served from the DB
+MAX_FINISHED_RUNS = 100
+# Minimum spacing of 'progress' notifications per run
+PROGRESS_INTERVAL_SECONDS = 0.25
+
+# Lifecycle events passed to listeners
+EVENT_STARTED = 'started'
+EVENT_PROGRESS = 'progress'
+EVENT_FINISHED = 'finished'
+
+
+class RunState:
+    def __init__(self, run_id: uuid.UUID, key: Tuple[str, str, str], as_of: Optional[datetime] = None):
+        self.run_id = run_id
+        self.as_of = as_of  # analysis_run.as_of: the date reports are filed under
+        self.universe, self.timeframe, self.strategy = key
+        self.status = 'running'
+        self.done = 0
+        self.total = 0
+        self.current_symbol: Optional[str] = None
+        self.started_at = datetime.now()
+        self.finished_at: Optional[datetime] = None
+        self.error: Optional[str] = None
+        self.top3: Optional[List[Dict[str, Any]]] = None
+        self.ranking: Optional[List[Dict[str, Any]]] = None
+
+    @property
+    def key(self) -> Tuple[str, str, str]:
+        return (self.universe, self.timeframe, self.strategy)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "run_id": str(self.run_id),
+            "universe": self.universe,
+            "timeframe": self.timeframe,
+            "strategy": self.strategy,
+            "status": self.status,
+            "progress": {"done": self.done, "total": self.total, "symbol": self.current_symbol},
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+            "top3": self.top3,
+            "ranking": self.ranking,
+        }
+
+
+class RunManager:
+    """
+    Runs analyses as background tasks inside the API process.
+    Identical requests (same universe/timeframe/strategy) share one in-flight run.
+    """
+    def __init__(self):
+        self._runs: "OrderedDict[uuid.UUID, RunState]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str, str], uuid.UUID] = {}
+        self._tasks = set()
+        self._lock = asyncio.Lock()
+        self._listeners: List[Callable[[str, RunState], None]] = []
+
+    def add_listener(self, callback: Callable[[str, RunState], None]):
+        """
+        Register a callback invoked (synchronously) as callback(event, state)
+        when a run starts, makes progress or finishes.
+        """
+        self._listeners.append(callback)
+
+    def _notify(self, event: str, state: RunState):
+        for callback in self._listeners:
+            try:
+                callback(event, state)
+            except Exception as e:
+                logger.error(f"Run listener failed: {e}")
+
+    def get(self, run_id: uuid.UUID) -> Optional[RunState]:
+        return self._runs.get(run_id)
+
+    async def submit(self, universe: str, timeframe: str, strategy: str, notify: bool = False) -> Tuple[RunState, bool]:
+        """
+        Start a run (or join the identical one in flight).
+        Returns (state, deduplicated). The analysis_run row exists before this returns.
+        """
+        # pandas & co. load with the first run, not with the API (warmup pre-imports them)
+        from src.app.core import pipeline
+
+        key = (universe, timeframe, strategy)
+        async with self._lock:
+            inflight = self._inflight.get(key)
+            if inflight:
+                SKIPPED_RUNS.inc(reason="deduplicated")
+                return self._runs[inflight], True
+
+            async with AsyncSessionLocal() as db:
+                univ_obj, tf_obj = await pipeline.resolve_run_dimensions(db, universe, timeframe)
+                strat_obj = await pipeline.get_strategy(db, strategy)
+                run_rec = await pipeline.start_run(db, univ_obj, tf_obj, strat_obj)
+
+            state = RunState(run_id=run_rec.run_id, key=key, as_of=run_rec.as_of)
+            self._runs[state.run_id] = state
+            self._inflight[key] = state.run_id
+            self._trim()
+
+        self._notify(EVENT_STARTED, state)
+        task = asyncio.create_task(self._execute(state, notify))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return state, False
+
+    async def _execute(self, state: RunState, notify: bool):
+        with track_queries("api run", run_id=state.run_id):
+            await self._run(state, notify)
+
+    async def _run(self, state: RunState, notify: bool):
+        from src.app.core import pipeline
+        from src.app.logic.scorer import Scorer
+
+        last_progress = 0.0
+
+        def progress(done: int, total: int, symbol: str):
+            nonlocal last_progress
+            state.done, state.total, state.current_symbol = done, total, symbol
+            now = time.monotonic()
+            if now - last_progress >= PROGRESS_INTERVAL_SECONDS or done == total:
+                last_progress = now
+                self._notify(EVENT_PROGRESS, state)
+
+        try:
+            async with AsyncSessionLocal() as db:
+                try:
+                    univ_obj, _ = await pipeline.resolve_run_dimensions(db, state.universe, state.timeframe)
+                    strat_obj = await pipeline.get_strategy(db, state.strategy)
+                    run_rec = await db.get(AnalysisRun, state.run_id)
+
+                    members = await pipeline.get_members(db, univ_obj)
+                    results = await pipeline.score_members(
+                        db, members, state.timeframe, Scorer(strat_obj.weights), state.run_id, progress=progress
+                    )
+                    top3 = await pipeline.persist_results(db, run_rec, results)
+
+                    state.top3 = [pipeline.report_item(x) for x in top3]
+                    state.ranking = [pipeline.report_item(x) for x in results]
+                    state.status = 'success'
+                except Exception as e:
+                    logger.error(f"Background run {state.run_id} failed: {e}")
+                    await pipeline.fail_run(db, state.run_id, e)
+                    state.status = 'failed'
+                    state.error = str(e)
+                    return
+        except Exception as e:
+            # Session itself failed (e.g. DB unreachable); the DB row may stay 'running'
+            logger.error(f"Background run {state.run_id} aborted: {e}")
+            state.status = 'failed'
+            state.error = str(e)
+            return
+        finally:
+            state.finished_at = datetime.now()
+            state.current_symbol = None
+            self._inflight.pop(state.key, None)
+            self._notify(EVENT_FINISHED, state)
+
+        # Side effects after the run is visible as finished
+        try:
+            from src.app.logic.reporting import Reporter
+            Reporter().save_run_results(str(state.run_id), state.top3, state.ranking, state.as_of)
+            if notify:
+                from src.app.notification.router import get_router, run_topic
+                await get_router().publish_report(run_topic(*state.key), state.top3, state.run_id)
+        except Exception as e:
+            logger.error(f"Post-run reporting for {state.run_id} failed: {e}")
+
+    def _trim(self):
+        finished = [rid for rid, st in self._runs.items() if st.status != 'running']
+        for rid in finished[:max(0, len(self._runs) - MAX_FINISHED_RUNS)]:
+            del self._runs[rid]
+
+
+run_manager = RunManager()
@@ -1,100 +1,251 @@
 import asyncio
 import logging
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED, EVENT_JOB_MISSED, EVENT_JOB_SUBMITTED
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
+from zoneinfo import ZoneInfo
 from src.app.core.config import settings
-from src.app.notification.telegram import TelegramBot
-# Reuse CLI logic or import components?
-# CLI logic for 'run' is complex (init db, backfill, run).
-# Let's import the components directly for better control.
-from src.app.data_provider.universe_manager import UniverseManager
-from src.app.data_provider.client import VnStockClient
+from src.app.core.sessions import in_session, session_trigger, daily_trigger, parse_hhmm
+from src.app.core.incremental import DirtySet, ScoreCache
+from src.app.core import pipeline
+from src.app.core.metrics import CACHE_REQUESTS, SCHEDULER_LAG_SECONDS, SKIPPED_RUNS, export_metrics
+from src.app.notification.router import get_router, run_topic
+from src.app.data_provider.client import DataProvider
 from src.app.db.session import AsyncSessionLocal
-from src.app.logic.reporting import Reporter
-from src.app.logic.indicators import calculate_indicators
+from src.app.db.lookups import dimensions
+from src.app.db.instrumentation import QueryBudgetExceeded, track_queries
+from src.app.data_provider.coverage import universe_coverage
+from src.app.db.models import Strategy, Universe
 from src.app.logic.scorer import Scorer
-from src.app.logic.signals import generate_trade_plan
-import pandas as pd
-from sqlalchemy import text
-from datetime import datetime, timedelta
+from sqlalchemy import select
+from datetime import datetime
+from typing import Dict
 import uuid
 
 logger = logging.getLogger(__name__)
 
-from src.app.db.init_db import init_db as init_db_func
+tz = ZoneInfo(settings.APP_TIMEZONE)
+scheduler = AsyncIOScheduler(
+    timezone=tz,
+    job_defaults={
+        # Never run the same job twice at once; collapse a backlog of missed ticks into one run
+        "max_instances": 1,
+        "coalesce": True,
+        "misfire_grace_time": settings.SCHEDULE_MISFIRE_GRACE_SECONDS,
+    }
+)
+# Ingest marks (symbol, timeframe) pairs whose bars changed; analysis drains them
+dirty = DirtySet()
+score_cache = ScoreCache()
 
-scheduler = AsyncIOScheduler()
-bot = TelegramBot()
+# Last seen ohlcv_coverage.last_changed_at per timeframe and symbol
+_seen_changes: Dict[str, Dict[str, datetime]] = {}
+
+# Guard against overlap between *different* jobs (intraday / post-close / EOD)
+_ingest_lock = asyncio.Lock()
+_analysis_lock = asyncio.Lock()
+
+
+async def mark_dirty_from_coverage(db, univ_obj: Universe, timeframe: str) -> int:
+    """
+    Mark members whose coverage row changed since we last looked. One query for
+    the whole universe, and it also sees bars written by other processes
+    (queue workers, backfills, imports).
+    """
+    timeframe_id = await dimensions.timeframe_id(db, timeframe)
+    seen = _seen_changes.setdefault(timeframe, {})
+    marked = 0
+    for row in await universe_coverage(db, timeframe_id, univ_obj.universe_id):
+        if row.last_changed_at is not None and seen.get(row.symbol) != row.last_changed_at:
+            seen[row.symbol] = row.last_changed_at
+            dirty.mark(row.symbol, timeframe)
+            marked += 1
+    return marked
+
+
+async def ingest_job(label: str = "scheduled", schedule_analysis: bool = True):
+    """
+    Fetch the latest bars for the default universe and mark changed symbols dirty.
+    """
+    if _ingest_lock.locked():
+        logger.warning(f"Skipping {label} ingest: previous ingest still in progress.")
+        SKIPPED_RUNS.inc(reason="ingest_running")
+        return
+
+    universe, timeframe = settings.DEFAULT_UNIVERSE, settings.DEFAULT_TIMEFRAME
+    async with _ingest_lock:
+        with track_queries("scheduler ingest"):
+            logger.info(f"⏰ Starting {label} ingest for {universe} ({timeframe})...")
+            changed_symbols = 0
+            async with AsyncSessionLocal() as db:
+                univ_obj = (await db.execute(select(Universe).where(Universe.code == universe))).scalar_one()
+                members = await pipeline.get_members(db, univ_obj)
+                dp = DataProvider(db)
+                for sym in members:
+                    try:
+                        changed = await dp.ingest(sym.symbol, timeframe=timeframe, days=pipeline.LOOKBACK_DAYS)
+                        await db.commit()
+                        if changed:
+                            changed_symbols += 1
+                    except QueryBudgetExceeded:
+                        await db.rollback()
+                        raise
+                    except Exception as e:
+                        logger.error(f"Error ingesting {sym.symbol}: {e}")
+                        await db.rollback()
+                await mark_dirty_from_coverage(db, univ_obj, timeframe)
+            logger.info(f"Ingest done: {changed_symbols}/{len(members)} symbols changed, {len(dirty)} dirty.")
+
+    if schedule_analysis and len(dirty):
+        # Separate job so a slow analysis never delays the next ingest tick
+        scheduler.add_job(analysis_job, id="analysis", kwargs={"label": label},
+                          next_run_time=datetime.now(tz), replace_existing=True)
+
+
+async def analysis_job(label: str = "scheduled"):
+    """
+    Re-score dirty symbols (and symbols never scored yet), merge with cached
+    scores for the rest and report the rebuilt ranking.
+    """
+    if _analysis_lock.locked():
+        # The running analysis drains the dirty set again before it exits
+        logger.info(f"Analysis already running; {label} changes will be picked up by it.")
+        SKIPPED_RUNS.inc(reason="analysis_running")
+        return
+
+    universe, timeframe = settings.DEFAULT_UNIVERSE, settings.DEFAULT_TIMEFRAME
+    async with _analysis_lock:
+        with track_queries("scheduler analysis") as queries:
+            try:
+                async with AsyncSessionLocal() as db:
+                    univ_obj = (await db.execute(select(Universe).where(Universe.code == universe))).scalar_one()
+                    weights = (await db.execute(
+                        select(Strategy.weights).where(Strategy.code == settings.DEFAULT_STRATEGY)
+                    )).scalar_one_or_none()
+                    scorer = Scorer(weights)
+
+                    members = await pipeline.get_members(db, univ_obj)
+                    member_names = {m.symbol for m in members}
+                    score_cache.discard(timeframe, score_cache.known(timeframe) - member_names)
+
+                    run_id = uuid.uuid4()
+                    queries.run_id = run_id
+                    recomputed = 0
+                    attempted = set()
+                    # Loop so changes ingested while we were scoring are not left behind
+                    while True:
+                        await mark_dirty_from_coverage(db, univ_obj, timeframe)
+                        # Never-scored symbols (cold start, new members) are tried once per job
+                        todo = (dirty.drain(timeframe) & member_names) | (member_names - score_cache.known(timeframe) - attempted)
+                        if not todo:
+                            break
+                        attempted |= todo
+                        logger.info(f"Step 2: Running Analysis for {len(todo)}/{len(member_names)} symbols...")
+                        rows = [m for m in members if m.symbol in todo]
+                        features = await pipeline.load_symbol_features(db, rows, timeframe, fetch=False)
+                        results = pipeline.score_features(features, scorer, run_id)
+                        for item in results:
+                            item.pop('features', None)
+                            item.pop('row', None)
+                        score_cache.update(timeframe, results)
+                        recomputed += len(results)
+
+                CACHE_REQUESTS.inc(recomputed, cache="score", result="miss")
+                CACHE_REQUESTS.inc(len(member_names) - recomputed, cache="score", result="hit")
+                if not recomputed:
+                    logger.info("No symbol changed; ranking unchanged.")
+                    SKIPPED_RUNS.inc(reason="unchanged")
+                    return
+
+                # Sort and Report
+                ranking = score_cache.ranking(timeframe, member_names)
+                top3 = ranking[:3]
+
+                # Notify subscribers whose last report differs from this one
+                await get_router().publish_report(run_topic(universe, timeframe, settings.DEFAULT_STRATEGY), top3, run_id)
+                logger.info(f"Pipeline completed successfully ({recomputed} symbols recomputed).")
+
+            except Exception as e:
+                logger.error(f"Pipeline failed: {e}")
+                import traceback
+                traceback.print_exc()
+                await get_router().publish_message(f"❌ Analysis failed: {e}")
+
+
+async def pipeline_job(label: str = "manual"):
+    """
+    Ingest then analyze inline (used by trigger_run.py / test_scheduler.py).
+    The report is only queued; callers that end their event loop right after
+    should await router.shutdown_notifications().
+    """
+    await ingest_job(label, schedule_analysis=False)
+    await analysis_job(label)
+
+
+async def retention_job():
+    """
+    Nightly retention pass (archive old runs, compact details, purge logs), scheduled
+    only when SCHEDULE_RETENTION_TIME is set.
+    """
+    from src.app.core.retention import apply_retention
 
-async def pipeline_job():
-    logger.info("⏰ Starting scheduled analysis pipeline...")
-    await bot.send_message("⏰ Scheduled Analysis Run Started.")
-    
     try:
-        # Note: Backfill step removed due to Windows subprocess limitation
-        # Data should be manually updated or scheduled separately
-        # Scheduler focuses on analyzing existing data
-        
-        # Analysis
-        logger.info("Step 2: Running Analysis...")
-        # Since we have ORM issues, let's look at how we want to run analysis.
-        # debug_report.py worked well. Let's adapt it here.
-        # Or better: call a new CLI command `run-analysis` (which is what `run` was supposed to be)
-        # But `run` failed with ORM error. `debug_report.py` worked.
-        # Let's use `debug_report.py` logic here directly.
-        
-        results = []
         async with AsyncSessionLocal() as db:
-             res = await db.execute(text("SELECT symbol, symbol_id FROM trading.market_symbol"))
-             symbols_map = {r[0]: r[1] for r in res.fetchall()}
-             
-             run_id = uuid.uuid4()
-             
-             for sym, sym_id in symbols_map.items():
-                 try:
-                     query = text(f"SELECT ts, open, high, low, close, volume FROM trading.ohlcv_bar WHERE symbol_id = {sym_id} ORDER BY ts ASC")
-                     rows = (await db.execute(query)).fetchall()
-                     if not rows or len(rows) < 30:
-                         logger.debug(f"Skipping {sym}: insufficient data")
-                         continue
-                     
-                     df = pd.DataFrame(rows, columns=['ts', 'open', 'high', 'low', 'close', 'volume'])
-                     df[['open', 'high', 'low', 'close', 'volume']] = df[['open', 'high', 'low', 'close', 'volume']].apply(pd.to_numeric)
-                     
-                     df = calculate_indicators(df)
-                     score_res = Scorer().calculate_score(df)
-                     signal_res = generate_trade_plan(df, score_res)
-                     
-                     results.append({
-                         "symbol": sym,
-                         "score_total": score_res['score_total'],
-                         "breakdown": score_res['breakdown'],
-                         "signal": signal_res
-                     })
-                     logger.debug(f"✅ {sym}: Score = {score_res['score_total']}")
-                     
-                 except Exception as e:
-                     logger.error(f"Error processing {sym}: {e}")
-                     # Continue with next symbol instead of failing entire pipeline
-                     continue
-                 
-             # Sort and Report
-             results.sort(key=lambda x: x['score_total'], reverse=True)
-             top3 = results[:3]
-             
-             # Send Telegram
-             await bot.send_report(top3, str(run_id))
-             logger.info("Pipeline completed successfully.")
-
+            stats = await apply_retention(db)
+        logger.info(f"🧹 Retention done: {stats}")
     except Exception as e:
-        logger.error(f"Pipeline failed: {e}")
-        import traceback
-        traceback.print_exc()
-        await bot.send_message(f"❌ Analysis failed: {e}")
+        logger.error(f"Retention failed: {e}")
+
+
+def _on_job_event(event):
+    if event.code == EVENT_JOB_SUBMITTED:
+        if event.scheduled_run_times:
+            lag = (datetime.now(tz) - max(event.scheduled_run_times)).total_seconds()
+            SCHEDULER_LAG_SECONDS.observe(max(lag, 0.0), job=event.job_id)
+    elif event.code == EVENT_JOB_MISSED:
+        SKIPPED_RUNS.inc(reason="misfire")
+    else:
+        # Job finished: hand the metrics to the textfile / Pushgateway exporter off the loop
+        asyncio.get_running_loop().run_in_executor(None, export_metrics, "scheduler")
+
+
+def _add_retention_job():
+    if settings.SCHEDULE_RETENTION_TIME:
+        scheduler.add_job(retention_job, daily_trigger(parse_hhmm(settings.SCHEDULE_RETENTION_TIME), tz),
+                          id="retention", replace_existing=True)
+
 
 def start_scheduler():
     interval = settings.SCHEDULE_INTERVAL_MINUTES
-    # Run immediately AND every interval
-    scheduler.add_job(pipeline_job, IntervalTrigger(minutes=interval), next_run_time=datetime.now())
+    jitter = settings.SCHEDULE_JITTER_SECONDS or None
+    now = datetime.now(tz)
+    scheduler.add_listener(_on_job_event, EVENT_JOB_SUBMITTED | EVENT_JOB_MISSED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR)
+
+    if settings.SCHEDULE_MODE == "interval":
+        # Legacy mode: run immediately AND every interval, around the clock
+        scheduler.add_job(ingest_job, IntervalTrigger(minutes=interval, jitter=jitter, timezone=tz),
+                          id="interval", kwargs={"label": "interval"}, next_run_time=now, replace_existing=True)
+        _add_retention_job()
+        scheduler.start()
+        logger.info(f"Scheduler started. Job interval: {interval} minutes. First run triggered immediately.")
+        return
+
+    # Session mode: only during HOSE sessions, after the close and once EOD data has settled
+    post_close = parse_hhmm(settings.SCHEDULE_POST_CLOSE_TIME)
+    eod = parse_hhmm(settings.SCHEDULE_EOD_TIME)
+    scheduler.add_job(ingest_job, session_trigger(interval, tz, jitter=jitter),
+                      id="intraday", kwargs={"label": "intraday"}, replace_existing=True)
+    scheduler.add_job(ingest_job, daily_trigger(post_close, tz, jitter=jitter),
+                      id="post_close", kwargs={"label": "post-close"}, replace_existing=True)
+    scheduler.add_job(ingest_job, daily_trigger(eod, tz, jitter=jitter),
+                      id="eod", kwargs={"label": "end-of-day"}, replace_existing=True)
+
+    # Catch up immediately only if we start in the middle of a session
+    if in_session(now):
+        scheduler.add_job(ingest_job, id="startup", kwargs={"label": "startup"}, next_run_time=now)
+
+    _add_retention_job()
     scheduler.start()
-    logger.info(f"Scheduler started. Job interval: {interval} minutes. First run triggered immediately.")
+    for job in scheduler.get_jobs():
+        logger.info(f"Scheduled job '{job.id}': next run at {job.next_run_time}")
+    logger.info(f"Scheduler started in session mode ({settings.APP_TIMEZONE}). Intraday interval: {interval} minutes.")
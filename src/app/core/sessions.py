@@ -0,0 +1,63 @@
+from datetime import datetime, time
+from typing import List, Tuple, Optional
+from zoneinfo import ZoneInfo
+
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.combining import OrTrigger
+
+# HOSE trading sessions (local exchange time, Mon-Fri)
+# Morning: ATO 9:00-9:15 + continuous until 11:30
+# Afternoon: continuous 13:00-14:30 + ATC until 14:45
+HOSE_SESSIONS: List[Tuple[time, time]] = [
+    (time(9, 0), time(11, 30)),
+    (time(13, 0), time(14, 45)),
+]
+TRADING_DAYS = "mon-fri"
+
+
+def parse_hhmm(value: str) -> time:
+    hour, minute = value.strip().split(":")
+    return time(int(hour), int(minute))
+
+
+def in_session(now: datetime, sessions: List[Tuple[time, time]] = HOSE_SESSIONS) -> bool:
+    """
+    True if `now` (timezone-aware, exchange local time) falls in a trading session.
+    """
+    if now.weekday() >= 5:
+        return False
+    t = now.time()
+    return any(start <= t <= end for start, end in sessions)
+
+
+def session_trigger(interval_minutes: int, tz: ZoneInfo, jitter: Optional[int] = None,
+                    sessions: List[Tuple[time, time]] = HOSE_SESSIONS) -> OrTrigger:
+    """
+    Fire every `interval_minutes` inside each session, aligned to the session start.
+    Nothing fires outside sessions or on weekends.
+    """
+    interval_minutes = max(1, interval_minutes)
+    triggers = []
+    for start, end in sessions:
+        # Group the grid points by hour so each hour is a single cron expression
+        by_hour = {}
+        t = start.hour * 60 + start.minute
+        end_m = end.hour * 60 + end.minute
+        while t <= end_m:
+            by_hour.setdefault(t // 60, []).append(t % 60)
+            t += interval_minutes
+        for hour, minutes in by_hour.items():
+            triggers.append(CronTrigger(
+                day_of_week=TRADING_DAYS,
+                hour=hour,
+                minute=",".join(str(m) for m in minutes),
+                timezone=tz
+            ))
+    return OrTrigger(triggers, jitter=jitter)
+
+
+def daily_trigger(at: time, tz: ZoneInfo, jitter: Optional[int] = None) -> CronTrigger:
+    """
+    Fire once per trading day at the given local time.
+    """
+    return CronTrigger(day_of_week=TRADING_DAYS, hour=at.hour, minute=at.minute, timezone=tz, jitter=jitter)
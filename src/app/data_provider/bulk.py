@@ -0,0 +1,313 @@
+import gzip
+import io
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional
+
+import pandas as pd
+from psycopg import sql
+from sqlalchemy import text
+
+from src.app.db.session import engine
+from src.app.db.lookups import dimensions
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ['symbol', 'ts', 'open', 'high', 'low', 'close', 'volume']
+# Accepted spellings in input files (vnstock dumps use 'time' / 'ticker')
+ALIASES = {'time': 'ts', 'date': 'ts', 'datetime': 'ts', 'ticker': 'symbol'}
+FILE_SUFFIXES = ('.csv', '.csv.gz', '.parquet')
+DEFAULT_CHUNK_ROWS = 50_000
+
+STAGE_DDL = """
+CREATE TEMP TABLE IF NOT EXISTS ohlcv_stage (
+  symbol text, ts timestamptz, open numeric, high numeric, low numeric, close numeric, volume numeric
+)
+"""
+
+# Separate statement: CTEs share one snapshot, so symbols inserted in the
+# merge itself would not be visible to its join
+NEW_SYMBOLS_SQL = """
+INSERT INTO trading.market_symbol (symbol)
+SELECT DISTINCT symbol FROM ohlcv_stage WHERE symbol <> ''
+ON CONFLICT (symbol) DO NOTHING
+"""
+
+PARTITIONS_SQL = """
+SELECT trading.ensure_ohlcv_partitions(CAST(:tf AS smallint), min(ts), max(ts)) FROM ohlcv_stage
+"""
+
+# Bar upsert and coverage in one statement. DISTINCT ON drops duplicates of a
+# (symbol, ts) within the chunk, which ON CONFLICT would reject.
+MERGE_SQL = """
+WITH src AS (
+  SELECT DISTINCT ON (ms.symbol_id, s.ts)
+    ms.symbol_id, s.ts, s.open, s.high, s.low, s.close, s.volume
+  FROM ohlcv_stage s
+  JOIN trading.market_symbol ms ON ms.symbol = s.symbol
+  WHERE s.ts IS NOT NULL
+  ORDER BY ms.symbol_id, s.ts
+),
+merged AS (
+  INSERT INTO trading.ohlcv_bar AS b
+    (symbol_id, timeframe_id, ts, open, high, low, close, volume, source, ingested_at)
+  SELECT symbol_id, :tf, ts, open, high, low, close, volume, :source, now() FROM src
+  ON CONFLICT (symbol_id, timeframe_id, ts) DO UPDATE SET
+    open = excluded.open, high = excluded.high, low = excluded.low,
+    close = excluded.close, volume = excluded.volume, ingested_at = excluded.ingested_at
+  WHERE (b.open, b.high, b.low, b.close, b.volume)
+        IS DISTINCT FROM (excluded.open, excluded.high, excluded.low, excluded.close, excluded.volume)
+  RETURNING b.symbol_id, (xmax = 0) AS inserted
+),
+per_symbol AS (
+  SELECT symbol_id, count(*) FILTER (WHERE inserted) AS inserted, count(*) AS changed
+  FROM merged GROUP BY symbol_id
+),
+cov AS (
+  INSERT INTO trading.ohlcv_coverage AS c
+    (timeframe_id, symbol_id, first_ts, last_ts, bar_count, last_ingested_at, last_changed_at)
+  SELECT :tf, r.symbol_id, r.first_ts, r.last_ts, coalesce(p.inserted, 0), now(),
+         CASE WHEN p.changed > 0 THEN now() END
+  FROM (SELECT symbol_id, min(ts) AS first_ts, max(ts) AS last_ts FROM src GROUP BY symbol_id) r
+  LEFT JOIN per_symbol p USING (symbol_id)
+  ON CONFLICT (timeframe_id, symbol_id) DO UPDATE SET
+    first_ts = least(c.first_ts, excluded.first_ts),
+    last_ts = greatest(c.last_ts, excluded.last_ts),
+    bar_count = c.bar_count + excluded.bar_count,
+    last_ingested_at = excluded.last_ingested_at,
+    last_changed_at = coalesce(excluded.last_changed_at, c.last_changed_at)
+)
+SELECT coalesce(sum(inserted), 0), coalesce(sum(changed), 0),
+       (SELECT count(*) FROM ohlcv_stage s JOIN trading.market_symbol ms ON ms.symbol = s.symbol
+        WHERE s.ts IS NOT NULL) AS merged_rows
+FROM per_symbol
+"""
+
+
+def list_input_files(paths: List[str]) -> List[str]:
+    """
+    Expand directories to the CSV / Parquet files they contain.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(
+                os.path.join(path, name) for name in os.listdir(path) if name.lower().endswith(FILE_SUFFIXES)
+            ))
+        else:
+            files.append(path)
+    return files
+
+
+def _symbol_from_filename(path: str) -> str:
+    name = os.path.basename(path)
+    for suffix in FILE_SUFFIXES:
+        if name.lower().endswith(suffix):
+            name = name[:-len(suffix)]
+    return name.split("_")[0].upper()
+
+
+def _normalize(chunk: pd.DataFrame, path: str) -> pd.DataFrame:
+    chunk = chunk.rename(columns=lambda c: ALIASES.get(str(c).strip().lower(), str(c).strip().lower()))
+    if 'symbol' not in chunk.columns:
+        # One file per symbol: FPT.csv, FPT_1D.parquet, ...
+        chunk['symbol'] = _symbol_from_filename(path)
+    missing = [c for c in COLUMNS if c not in chunk.columns and c != 'volume']
+    if missing:
+        raise ValueError(f"{path}: missing columns {missing}")
+    if 'volume' not in chunk.columns:
+        chunk['volume'] = None
+    chunk['symbol'] = chunk['symbol'].astype(str).str.strip().str.upper()
+    return chunk[COLUMNS]
+
+
+def iter_chunks(path: str, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    Yield normalized (symbol, ts, open, high, low, close, volume) frames of at
+    most `chunk_rows` rows. CSV values are kept as text and parsed by Postgres.
+    """
+    if path.lower().endswith('.parquet'):
+        if pq is None:
+            raise RuntimeError("pyarrow is required for Parquet files (pip install pyarrow)")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+            yield _normalize(batch.to_pandas(), path)
+    else:
+        for chunk in pd.read_csv(path, chunksize=chunk_rows, dtype=str, keep_default_na=False):
+            yield _normalize(chunk, path)
+
+
+async def _copy_frame(cursor, frame: pd.DataFrame):
+    buf = io.StringIO()
+    frame.to_csv(buf, index=False, header=False, na_rep='')
+    async with cursor.copy("COPY ohlcv_stage (symbol, ts, open, high, low, close, volume) FROM STDIN WITH (FORMAT csv)") as copy:
+        await copy.write(buf.getvalue())
+
+
+async def import_files(
+    paths: List[str],
+    timeframe: str = "1D",
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    source: str = "import",
+    progress: Optional[Callable[[Dict[str, float]], None]] = None
+) -> Dict[str, float]:
+    """
+    Stream files into ohlcv_bar: COPY each chunk into a temp staging table, merge
+    it with one statement and commit. Memory stays bounded by `chunk_rows`.
+    Rows without a symbol or time are counted in "skipped", not in "rows".
+    """
+    files = list_input_files(paths)
+    stats = {"files": 0, "rows": 0, "skipped": 0, "inserted": 0, "changed": 0, "seconds": 0.0, "rows_per_sec": 0.0}
+    started = time.perf_counter()
+
+    async with engine.connect() as conn:
+        timeframe_id = await dimensions.timeframe_id(conn, timeframe)
+        if timeframe_id is None:
+            raise ValueError(f"Timeframe {timeframe} not found")
+
+        raw = await conn.get_raw_connection()
+        await conn.execute(text(STAGE_DDL))
+        for path in files:
+            for frame in iter_chunks(path, chunk_rows):
+                if frame.empty:
+                    continue
+                await conn.execute(text("TRUNCATE ohlcv_stage"))
+                async with raw.driver_connection.cursor() as cur:
+                    await _copy_frame(cur, frame)
+                await conn.execute(text(NEW_SYMBOLS_SQL))
+                await conn.execute(text(PARTITIONS_SQL), {"tf": timeframe_id})
+                inserted, changed, merged_rows = (await conn.execute(
+                    text(MERGE_SQL), {"tf": timeframe_id, "source": source}
+                )).one()
+                await conn.commit()
+
+                stats["rows"] += int(merged_rows)
+                stats["skipped"] += len(frame) - int(merged_rows)
+                stats["inserted"] += int(inserted)
+                stats["changed"] += int(changed)
+                stats["seconds"] = time.perf_counter() - started
+                stats["rows_per_sec"] = stats["rows"] / stats["seconds"] if stats["seconds"] else 0.0
+                if progress:
+                    progress({**stats, "file": path})
+            stats["files"] += 1
+        await conn.execute(text("DROP TABLE IF EXISTS ohlcv_stage"))
+        await conn.commit()
+
+    logger.info(f"Imported {stats['rows']} rows from {stats['files']} files "
+                f"({stats['inserted']} new, {stats['changed']} new or changed, {stats['skipped']} skipped) "
+                f"at {stats['rows_per_sec']:.0f} rows/s")
+    return stats
+
+
+def export_schema():
+    """
+    Arrow schema of Parquet exports (also written for an empty export).
+    """
+    return pa.schema([
+        ("symbol", pa.string()),
+        ("ts", pa.timestamp("us", tz="UTC")),
+        ("open", pa.float64()),
+        ("high", pa.float64()),
+        ("low", pa.float64()),
+        ("close", pa.float64()),
+        ("volume", pa.float64()),
+    ])
+
+
+def _export_query(timeframe_id: int, symbols: Optional[List[str]], start: Optional[datetime], end: Optional[datetime]) -> sql.Composed:
+    conds = [sql.SQL("b.timeframe_id = {}").format(sql.Literal(timeframe_id))]
+    if symbols:
+        conds.append(sql.SQL("ms.symbol = ANY({})").format(sql.Literal([s.upper() for s in symbols])))
+    if start:
+        conds.append(sql.SQL("b.ts >= {}").format(sql.Literal(start)))
+    if end:
+        conds.append(sql.SQL("b.ts <= {}").format(sql.Literal(end)))
+    return sql.SQL(
+        "SELECT ms.symbol, b.ts, b.open, b.high, b.low, b.close, b.volume "
+        "FROM trading.ohlcv_bar b JOIN trading.market_symbol ms ON ms.symbol_id = b.symbol_id "
+        "WHERE {} ORDER BY ms.symbol, b.ts"
+    ).format(sql.SQL(" AND ").join(conds))
+
+
+async def export_bars(
+    output: str,
+    timeframe: str = "1D",
+    symbols: Optional[List[str]] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    progress: Optional[Callable[[Dict[str, float]], None]] = None
+) -> Dict[str, float]:
+    """
+    Write bars to one combined CSV (optionally .gz) or Parquet file that
+    import_files reads back. CSV is streamed with COPY TO STDOUT; Parquet
+    through a server-side cursor, `chunk_rows` at a time.
+    """
+    is_parquet = output.lower().endswith('.parquet')
+    if is_parquet and pq is None:
+        raise RuntimeError("pyarrow is required for Parquet output (pip install pyarrow)")
+
+    stats = {"rows": 0, "bytes": 0, "seconds": 0.0, "rows_per_sec": 0.0}
+    started = time.perf_counter()
+
+    def tick(rows: int):
+        stats["rows"] += rows
+        stats["seconds"] = time.perf_counter() - started
+        stats["rows_per_sec"] = stats["rows"] / stats["seconds"] if stats["seconds"] else 0.0
+        if progress:
+            progress(dict(stats))
+
+    async with engine.connect() as conn:
+        timeframe_id = await dimensions.timeframe_id(conn, timeframe)
+        if timeframe_id is None:
+            raise ValueError(f"Timeframe {timeframe} not found")
+        raw = (await conn.get_raw_connection()).driver_connection
+        query = _export_query(timeframe_id, symbols, start, end)
+
+        if not is_parquet:
+            opener = gzip.open if output.lower().endswith('.gz') else open
+            copy_sql = sql.SQL("COPY ({}) TO STDOUT WITH (FORMAT csv, HEADER)").format(query)
+            with opener(output, "wb") as f:
+                async with raw.cursor() as cur:
+                    async with cur.copy(copy_sql) as copy:
+                        async for block in copy:
+                            f.write(block)
+                            stats["bytes"] += len(block)
+                            tick(bytes(block).count(b"\n"))
+            stats["rows"] = max(0, stats["rows"] - 1)  # header line
+        else:
+            schema = export_schema()
+            writer = None
+            try:
+                async with raw.cursor(name="ohlcv_export") as cur:
+                    await cur.execute(query)
+                    while True:
+                        rows = await cur.fetchmany(chunk_rows)
+                        if not rows:
+                            break
+                        frame = pd.DataFrame(rows, columns=COLUMNS)
+                        for col in ('open', 'high', 'low', 'close', 'volume'):
+                            frame[col] = pd.to_numeric(frame[col], errors='coerce')
+                        table = pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
+                        if writer is None:
+                            writer = pq.ParquetWriter(output, schema, compression="zstd")
+                        writer.write_table(table)
+                        tick(len(rows))
+                if writer is None:
+                    # No matching bars: still leave a (valid, empty) file behind
+                    writer = pq.ParquetWriter(output, schema, compression="zstd")
+            finally:
+                if writer is not None:
+                    writer.close()
+        await conn.rollback()
+
+    logger.info(f"Exported {stats['rows']} rows to {output} at {stats['rows_per_sec']:.0f} rows/s")
+    return stats
@@ -1,34 +1,57 @@
 import logging
 import asyncio
-from typing import List, Optional
+import time
+from typing import List, Optional, Tuple
 import pandas as pd
 from datetime import datetime, date, timedelta
-from sqlalchemy import select, and_, func
+from sqlalchemy import select, and_, func, text, literal_column
 from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from src.app.db.models import OhlcvBar, MarketSymbol, DataFetchLog, Timeframe
+from src.app.db.models import OhlcvBar, MarketSymbol, DataFetchLog
 from src.app.core.config import settings
 from src.app.db.session import AsyncSessionLocal
+from src.app.core.profiling import RunProfiler
+from src.app.core.metrics import FETCH_ROWS, FETCH_SECONDS, record_wait
+from src.app.db.instrumentation import QueryBudgetExceeded
+from src.app.db.lookups import dimensions
+from src.app.data_provider.coverage import coverage_upsert, get_coverage
+from src.app.data_provider.vendor import load_vnstock
 
+logger = logging.getLogger(__name__)
 
-# Import vnstock
-try:
-    from vnstock import Quote
-    try:
-        from vnstock import register_user
-    except ImportError:
-        register_user = None
-except ImportError:
-    Quote = None
-    register_user = None
-    import traceback
-    traceback.print_exc()
+FREE_TIER_DELAY_SECONDS = 5.0
+
+# (timeframe_id, first period, last period) already ensured by this process;
+# periods are (year, month) so a repeat ingest of the current month skips the round trip
+_ensured_partitions = set()
 
-logger = logging.getLogger(__name__)
+
+async def ensure_partitions(timeframe_id: int, start: datetime, end: datetime):
+    """
+    Make sure ohlcv_bar has leaf partitions covering [start, end] for the timeframe.
+    Runs in its own short transaction so a rolled-back upsert never leaves the
+    cache believing a partition exists.
+    """
+    key = (timeframe_id, (start.year, start.month), (end.year, end.month))
+    if key in _ensured_partitions:
+        return
+    async with AsyncSessionLocal() as s:
+        created = (await s.execute(
+            text("SELECT trading.ensure_ohlcv_partitions(CAST(:tf AS smallint), :start, :end)"),
+            {"tf": timeframe_id, "start": start, "end": end}
+        )).scalar_one()
+        await s.commit()
+    if created:
+        logger.info(f"Created {created} ohlcv_bar partition(s) for timeframe {timeframe_id}")
+    _ensured_partitions.add(key)
 
 class VnStockClient:
     def __init__(self, api_key: str = None):
-        if Quote is None:
+        vnstock = load_vnstock()
+        self.Quote = getattr(vnstock, "Quote", None)
+        register_user = getattr(vnstock, "register_user", None)
+        self.has_register = register_user is not None
+        if self.Quote is None:
              logger.warning("vnstock.Quote not available")
         self.api_key = api_key
         
@@ -45,6 +68,7 @@ class VnStockClient:
                 logger.warning(f"Error registering vnstock API key: {e}")
 
     def fetch_ohlcv(self, symbol: str, start_date: str, end_date: str, resolution: str = "1D"):
+        Quote = self.Quote
         if Quote is None:
             raise RuntimeError("Vnstock Quote not imported")
 
@@ -61,7 +85,7 @@ class VnStockClient:
                 # If register_user exists, we are likely on new version -> use Quote without api_key
                 # If register_user is None, we are on old version -> try Quote with api_key
                 
-                if register_user is not None:
+                if self.has_register:
                      quote = Quote(symbol=symbol, source='vci', show_log=False)
                 else:
                     # Old version fallback
@@ -76,97 +100,141 @@ class VnStockClient:
                 logger.debug(f"vnstock Quote instantiation retry for {symbol}")
                 quote = Quote(symbol=symbol, source='vci', show_log=False)
             
-            df = quote.history(start=start_date, end=end_date, interval=res)
+            start = time.perf_counter()
+            try:
+                df = quote.history(start=start_date, end=end_date, interval=res)
+            except Exception:
+                FETCH_SECONDS.observe(time.perf_counter() - start, timeframe=resolution, outcome="error")
+                raise
+            FETCH_SECONDS.observe(time.perf_counter() - start, timeframe=resolution, outcome="ok")
+            FETCH_ROWS.observe(0 if df is None else len(df), timeframe=resolution)
             return df
         except Exception as e:
             logger.error(f"vnstock error for {symbol}: {e}")
             raise e
 
 class DataProvider:
-    def __init__(self, db: AsyncSession):
+    def __init__(self, db: AsyncSession, profiler: RunProfiler = None):
         self.db = db
+        # Disabled profiler is a no-op
+        self.profiler = profiler or RunProfiler()
         # Pass API key from settings to VnStockClient
-        api_key = getattr(settings, 'VNSTOCK_API_KEY', None)
-        self.client = VnStockClient(api_key=api_key)
-        self.has_premium = bool(api_key)
+        self.api_key = getattr(settings, 'VNSTOCK_API_KEY', None)
+        self.has_premium = bool(self.api_key)
+        self._client = None
+
+    @property
+    def client(self) -> VnStockClient:
+        # Created (and vnstock imported) only when something is actually fetched
+        if self._client is None:
+            self._client = VnStockClient(api_key=self.api_key)
+        return self._client
+
+    async def _free_tier_wait(self):
+        # Free tier: 5s between requests to stay under 20 req/min
+        record_wait("vnstock", FREE_TIER_DELAY_SECONDS)
+        await asyncio.sleep(FREE_TIER_DELAY_SECONDS)
+
+    async def _resolve(self, symbol: str, timeframe: str) -> Tuple[int, int]:
+        """
+        (symbol_id, timeframe_id) from the dimension cache, so per-symbol calls
+        do not pay two lookups each; an unknown symbol is created.
+        """
+        symbol_id = await dimensions.symbol_id(self.db, symbol)
+        if symbol_id is None:
+            # Usually update-universe creates symbols; be robust for ad-hoc ones.
+            # Not cached here: the row is only flushed, the caller may roll back.
+            sym = MarketSymbol(symbol=symbol)
+            self.db.add(sym)
+            await self.db.flush() # get ID
+            symbol_id = sym.symbol_id
+
+        timeframe_id = await dimensions.timeframe_id(self.db, timeframe)
+        if timeframe_id is None:
+            raise ValueError(f"Timeframe {timeframe} not found")
+        return symbol_id, timeframe_id
+
+    async def ingest(self, symbol: str, timeframe: str = "1D", days: int = 365) -> int:
+        """
+        Fetch the latest bars into the DB without reading them back.
+        Re-fetches the last stored bar so a forming bar gets updated.
+        Returns the number of bars that were inserted or actually changed.
+        """
+        end_dt = datetime.now()
+        symbol_id, timeframe_id = await self._resolve(symbol, timeframe)
+
+        cov = await get_coverage(self.db, symbol_id, timeframe_id)
+        last_ts = cov.last_ts if cov else None
+        fetch_start = last_ts.date() if last_ts else (end_dt - timedelta(days=days)).date()
+
+        if not self.has_premium:
+            await self._free_tier_wait()
+
+        logger.info(f"Ingesting {symbol} from {fetch_start} to {end_dt.date()}")
+        with self.profiler.stage("fetch", symbol=symbol, symbol_id=symbol_id):
+            df_new = await asyncio.to_thread(
+                self.client.fetch_ohlcv, symbol, fetch_start.strftime('%Y-%m-%d'), end_dt.strftime('%Y-%m-%d'), timeframe
+            )
+        if df_new is None or df_new.empty:
+            return 0
+
+        with self.profiler.stage("save", symbol=symbol, symbol_id=symbol_id):
+            async with AsyncSessionLocal() as temp_db:
+                changed = await self._save_ohlcv(df_new, symbol_id, timeframe_id, db_session=temp_db)
+                await temp_db.commit()
+        return changed
 
-    async def get_ohlcv(self, symbol: str, timeframe: str = "1D", days: int = 365) -> pd.DataFrame:
+    async def get_ohlcv(self, symbol: str, timeframe: str = "1D", days: int = 365, fetch: bool = True) -> pd.DataFrame:
         """
         Get OHLCV from DB or fetch if missing.
+        With fetch=False only the DB is read (e.g. right after a separate ingest).
         """
         # Determine date range
         end_dt = datetime.now()
         start_dt = end_dt - timedelta(days=days)
         
-        # Check DB coverage (simplification: just check max date in DB, if recent enough return DB)
-        # Actually proper logic: fetch what we have, if gap at end, fetch new data.
-        
         # 1. Resolve Symbol ID and Timeframe ID
-        sym_stmt = select(MarketSymbol).where(MarketSymbol.symbol == symbol)
-        sym = (await self.db.execute(sym_stmt)).scalar_one_or_none()
-        if not sym:
-            # Need to create symbol if not exists? Usually update-universe handles this.
-            # But for robustness, let's create simple entry
-            sym = MarketSymbol(symbol=symbol)
-            self.db.add(sym)
-            await self.db.flush() # get ID
-            
-        tf_stmt = select(Timeframe).where(Timeframe.code == timeframe)
-        tf = (await self.db.execute(tf_stmt)).scalar_one_or_none()
-        if not tf:
-            raise ValueError(f"Timeframe {timeframe} not found")
+        symbol_id, timeframe_id = await self._resolve(symbol, timeframe)
 
-        # 2. Query DB
-        # Only select range needed
-        stmt = select(OhlcvBar).where(
-            OhlcvBar.symbol_id == sym.symbol_id,
-            OhlcvBar.timeframe_id == tf.timeframe_id,
-            OhlcvBar.ts >= start_dt
-        ).order_by(OhlcvBar.ts.asc())
-        
-        result = await self.db.execute(stmt)
-        rows = result.scalars().all()
-        
-        # 3. Gap Analysis
-        # If no rows or last row is old, fetch fresh
+        # 2. Gap analysis from the coverage row (one PK lookup, no bar scan)
         fetch_needed = False
-        last_date = None
-        if rows:
-            last_date = rows[-1].ts.date() # Ensure it's date
-            # If last_date < today (trading day), fetch.
-            # Simple check: if last_date < today - 1 (allowing for weekend/delay)
-            # Better: fetch from last_date + 1 day
+        cov = None
+        if fetch:
+            with self.profiler.stage("db_read", symbol=symbol, symbol_id=symbol_id):
+                cov = await get_coverage(self.db, symbol_id, timeframe_id)
+        if cov and cov.last_ts:
+            last_date = cov.last_ts.date()
             if last_date < end_dt.date():
-                fetch_start = (last_date + timedelta(days=1)).strftime('%Y-%m-%d')
+                # Fetch from the day after the last bar, but never before the window
+                fetch_start = max(last_date + timedelta(days=1), start_dt.date()).strftime('%Y-%m-%d')
                 fetch_needed = True
         else:
             fetch_start = start_dt.strftime('%Y-%m-%d')
             fetch_needed = True
-            
+
         fetch_end = end_dt.strftime('%Y-%m-%d')
 
-        if fetch_needed:
+        if fetch_needed and fetch:
             # Rate Limit Enforcement: Only for free tier
             # Premium key: no rate limit. Free tier: 5s delay to stay under 20 req/min
             if not self.has_premium:
-                await asyncio.sleep(5)
+                await self._free_tier_wait()
             
             logger.info(f"Fetching {symbol} from {fetch_start} to {fetch_end}")
             try:
-                df_new = await asyncio.to_thread(
-                    self.client.fetch_ohlcv, symbol, fetch_start, fetch_end, timeframe
-                )
+                with self.profiler.stage("fetch", symbol=symbol, symbol_id=symbol_id):
+                    df_new = await asyncio.to_thread(
+                        self.client.fetch_ohlcv, symbol, fetch_start, fetch_end, timeframe
+                    )
                 if df_new is not None and not df_new.empty:
                     try:
                         # Use ISOLATED session to prevent main session invalidation on error
-                        async with AsyncSessionLocal() as temp_db:
-                            await self._save_ohlcv(df_new, sym.symbol_id, tf.timeframe_id, db_session=temp_db)
-                            await temp_db.commit()
-                            
-                        # Refresh DB rows using main session (should see committed data)
-                        # We might need to expire session to see new data?
-                        # await self.db.expire_all() # safe?
-                        rows = (await self.db.execute(stmt)).scalars().all()
+                        with self.profiler.stage("save", symbol=symbol, symbol_id=symbol_id):
+                            async with AsyncSessionLocal() as temp_db:
+                                await self._save_ohlcv(df_new, symbol_id, timeframe_id, db_session=temp_db)
+                                await temp_db.commit()
+                    except QueryBudgetExceeded:
+                        raise
                     except Exception as db_err:
                          logger.error(f"DB Error saving {symbol}: {db_err}")
                          # Isolated session rollback happened automatically on exit
@@ -174,28 +242,41 @@ class DataProvider:
                          pass
 
 
+            except QueryBudgetExceeded:
+                raise
             except Exception as e:
                 logger.error(f"Failed to fetch/save: {e}")
                 # Do not rollback here; let caller handle session state.
                 # Continue with what we have (db data)
                 pass
 
+        # 3. Read the window once, after any fetch has been committed
+        stmt = select(OhlcvBar).where(
+            OhlcvBar.symbol_id == symbol_id,
+            OhlcvBar.timeframe_id == timeframe_id,
+            OhlcvBar.ts >= start_dt
+        ).order_by(OhlcvBar.ts.asc())
+        with self.profiler.stage("db_read", symbol=symbol, symbol_id=symbol_id):
+            rows = (await self.db.execute(stmt)).scalars().all()
 
-        
         # Convert to DataFrame
         if not rows:
             return pd.DataFrame()
             
-        data = [r.as_dict() for r in rows]
-        df = pd.DataFrame(data)
-        # Cleanup
-        if 'ts' in df.columns:
-            df['time'] = df['ts']
-            df.set_index('time', inplace=True)
+        with self.profiler.stage("frame_build", symbol=symbol, symbol_id=symbol_id):
+            data = [r.as_dict() for r in rows]
+            df = pd.DataFrame(data)
+            # Cleanup
+            if 'ts' in df.columns:
+                df['time'] = df['ts']
+                df.set_index('time', inplace=True)
             
         return df
 
-    async def _save_ohlcv(self, df: pd.DataFrame, symbol_id: int, timeframe_id: int, db_session: AsyncSession = None):
+    async def _save_ohlcv(self, df: pd.DataFrame, symbol_id: int, timeframe_id: int, db_session: AsyncSession = None) -> int:
+        """
+        Upsert bars. Returns the number of bars inserted or whose values changed.
+        """
         session = db_session or self.db
 
         # Map df columns to DB
@@ -220,7 +301,10 @@ class DataProvider:
             })
             
         if not records:
-            return
+            return 0
+
+        ts_values = [r['ts'] for r in records]
+        await ensure_partitions(timeframe_id, min(ts_values), max(ts_values))
 
         stmt = insert(OhlcvBar).values(records)
         stmt = stmt.on_conflict_do_update(
@@ -232,9 +316,67 @@ class DataProvider:
                 'close': stmt.excluded.close,
                 'volume': stmt.excluded.volume,
                 'ingested_at': stmt.excluded.ingested_at
-            }
-        )
-        await session.execute(stmt)
+            },
+            # Skip no-op rewrites so RETURNING only reports real changes
+            where=(
+                OhlcvBar.open.is_distinct_from(stmt.excluded.open) |
+                OhlcvBar.high.is_distinct_from(stmt.excluded.high) |
+                OhlcvBar.low.is_distinct_from(stmt.excluded.low) |
+                OhlcvBar.close.is_distinct_from(stmt.excluded.close) |
+                OhlcvBar.volume.is_distinct_from(stmt.excluded.volume)
+            )
+        ).returning(literal_column("xmax = 0").label("inserted"))
+        returned = (await session.execute(stmt)).scalars().all()
+        inserted = sum(1 for x in returned if x)
+
+        # Same transaction as the bars, so coverage never disagrees with them
+        await session.execute(coverage_upsert(
+            symbol_id, timeframe_id, min(ts_values), max(ts_values), inserted, changed=bool(returned)
+        ))
+        return len(returned)
+
+
+async def read_bars(
+    db: AsyncSession,
+    symbol: str,
+    timeframe: str = "1D",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    warmup: int = 0
+) -> Optional[pd.DataFrame]:
+    """
+    Read stored bars as a float DataFrame (ts, open, high, low, close, volume)
+    without touching vnstock. `warmup` extra bars before `start` are included
+    so indicators are settled at the first requested bar.
+    Returns None if the symbol or timeframe is unknown.
+    """
+    symbol_id = await dimensions.symbol_id(db, symbol)
+    timeframe_id = await dimensions.timeframe_id(db, timeframe)
+    if symbol_id is None or timeframe_id is None:
+        return None
 
-        # return result # optional
+    cond = [OhlcvBar.symbol_id == symbol_id, OhlcvBar.timeframe_id == timeframe_id]
+    if start is not None:
+        lower = start
+        if warmup:
+            # ts of the warmup-th bar before start (index scan, no row materialization)
+            warm_ts = (await db.execute(
+                select(OhlcvBar.ts).where(*cond, OhlcvBar.ts < start)
+                .order_by(OhlcvBar.ts.desc()).offset(warmup - 1).limit(1)
+            )).scalar_one_or_none()
+            if warm_ts is not None:
+                lower = warm_ts
+            else:
+                lower = None
+        if lower is not None:
+            cond.append(OhlcvBar.ts >= lower)
+    if end is not None:
+        cond.append(OhlcvBar.ts <= end)
 
+    cols = ['ts', 'open', 'high', 'low', 'close', 'volume']
+    stmt = select(OhlcvBar.ts, OhlcvBar.open, OhlcvBar.high, OhlcvBar.low, OhlcvBar.close, OhlcvBar.volume)\
+        .where(*cond).order_by(OhlcvBar.ts.asc())
+    rows = (await db.execute(stmt)).all()
+    df = pd.DataFrame(rows, columns=cols)
+    df[cols[1:]] = df[cols[1:]].astype(float)
+    return df
@@ -0,0 +1,69 @@
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import select, func, and_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.app.db.models import OhlcvCoverage, MarketSymbol, UniverseMember
+
+
+def coverage_upsert(symbol_id: int, timeframe_id: int, first_ts: datetime, last_ts: datetime,
+                    inserted: int, changed: bool):
+    """
+    Statement folding one bar upsert into ohlcv_coverage. Execute it in the
+    same transaction as the bars so both commit (or roll back) together.
+    """
+    now = func.now()
+    stmt = insert(OhlcvCoverage).values(
+        timeframe_id=timeframe_id,
+        symbol_id=symbol_id,
+        first_ts=first_ts,
+        last_ts=last_ts,
+        bar_count=inserted,
+        last_ingested_at=now,
+        last_changed_at=now if changed else None,
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=['timeframe_id', 'symbol_id'],
+        set_={
+            'first_ts': func.least(OhlcvCoverage.first_ts, stmt.excluded.first_ts),
+            'last_ts': func.greatest(OhlcvCoverage.last_ts, stmt.excluded.last_ts),
+            'bar_count': OhlcvCoverage.bar_count + stmt.excluded.bar_count,
+            'last_ingested_at': stmt.excluded.last_ingested_at,
+            'last_changed_at': func.coalesce(stmt.excluded.last_changed_at, OhlcvCoverage.last_changed_at),
+        }
+    )
+
+
+async def get_coverage(db: AsyncSession, symbol_id: int, timeframe_id: int) -> Optional[OhlcvCoverage]:
+    # populate_existing: long-lived sessions must not answer from a stale identity map
+    stmt = select(OhlcvCoverage).where(
+        OhlcvCoverage.timeframe_id == timeframe_id, OhlcvCoverage.symbol_id == symbol_id
+    ).execution_options(populate_existing=True)
+    return (await db.execute(stmt)).scalar_one_or_none()
+
+
+async def universe_coverage(db: AsyncSession, timeframe_id: int, universe_id: Optional[int] = None) -> List:
+    """
+    (symbol, first_ts, last_ts, bar_count, last_ingested_at, last_changed_at)
+    rows of one timeframe. With a universe, every current member is listed, including
+    members that have no bars yet (coverage columns are then None).
+    """
+    cols = (
+        MarketSymbol.symbol, OhlcvCoverage.first_ts, OhlcvCoverage.last_ts, OhlcvCoverage.bar_count,
+        OhlcvCoverage.last_ingested_at, OhlcvCoverage.last_changed_at
+    )
+    if universe_id is None:
+        stmt = select(*cols).join(MarketSymbol, MarketSymbol.symbol_id == OhlcvCoverage.symbol_id)\
+            .where(OhlcvCoverage.timeframe_id == timeframe_id)
+    else:
+        stmt = select(*cols)\
+            .select_from(UniverseMember)\
+            .join(MarketSymbol, MarketSymbol.symbol_id == UniverseMember.symbol_id)\
+            .outerjoin(OhlcvCoverage, and_(
+                OhlcvCoverage.symbol_id == UniverseMember.symbol_id,
+                OhlcvCoverage.timeframe_id == timeframe_id
+            ))\
+            .where(UniverseMember.universe_id == universe_id, UniverseMember.active_on())
+    return (await db.execute(stmt.order_by(MarketSymbol.symbol))).all()
@@ -0,0 +1,91 @@
+import logging
+from collections import namedtuple
+from datetime import datetime
+from typing import List, Optional
+
+from src.app.core.config import settings
+from src.app.data_provider.vendor import load_vnstock
+
+logger = logging.getLogger(__name__)
+
+# Latest quote of a symbol: last price, cumulative session volume and (when the
+# source has them) session open/high/low. Prices in the unit of stored bars.
+Quote = namedtuple('Quote', ['symbol', 'ts', 'price', 'volume', 'open', 'high', 'low'],
+                   defaults=(None, None, None, None))
+
+# Symbols per price board request
+PRICE_BOARD_CHUNK = 100
+
+# Price board columns (flattened; vnstock versions differ in naming)
+_COLUMNS = {
+    "symbol": ("listing_symbol", "symbol"),
+    "price": ("match_match_price", "match_price"),
+    "volume": ("match_accumulated_volume", "accumulated_volume"),
+    "open": ("match_open_price", "open_price", "open"),
+    "high": ("match_highest", "highest", "high"),
+    "low": ("match_lowest", "lowest", "low"),
+}
+
+
+def _flat_name(column) -> str:
+    if isinstance(column, tuple):
+        return "_".join(str(part) for part in column if part)
+    return str(column)
+
+
+def _number(value) -> Optional[float]:
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value == value else None  # NaN -> None
+
+
+def fetch_price_board(symbols: List[str], ts: datetime) -> List[Quote]:
+    """
+    Latest quotes of many symbols, one vnstock price board request per
+    PRICE_BOARD_CHUNK symbols (blocking; run it in a thread). Board prices
+    are in VND and scaled by LIVE_PRICE_SCALE to the unit of stored bars.
+    Symbols without a match price (not traded yet) are left out.
+    """
+    vnstock = load_vnstock()
+    Trading = getattr(vnstock, "Trading", None)
+    if Trading is None:
+        raise RuntimeError("vnstock Trading (price board) not available")
+
+    trading = Trading(source='vci')
+    quotes = []
+    for i in range(0, len(symbols), PRICE_BOARD_CHUNK):
+        board = trading.price_board(symbols[i:i + PRICE_BOARD_CHUNK])
+        if board is not None and not board.empty:
+            quotes.extend(_parse_board(board, ts))
+    return quotes
+
+
+def _parse_board(board, ts: datetime) -> List[Quote]:
+    names = {_flat_name(c): c for c in board.columns}
+    picked = {}
+    for field, candidates in _COLUMNS.items():
+        found = next((names[n] for n in candidates if n in names), None)
+        if found is not None:
+            picked[field] = found
+    if "symbol" not in picked or "price" not in picked:
+        raise RuntimeError(f"Unexpected price board columns: {sorted(names)[:20]}")
+
+    scale = settings.LIVE_PRICE_SCALE
+    quotes = []
+    for _, row in board.iterrows():
+        price = _number(row[picked["price"]])
+        if not price:
+            continue
+        values = {f: _number(row[c]) for f, c in picked.items() if f not in ("symbol", "price")}
+        quotes.append(Quote(
+            symbol=str(row[picked["symbol"]]).upper(),
+            ts=ts,
+            price=price * scale,
+            volume=values.get("volume"),
+            open=values["open"] * scale if values.get("open") else None,
+            high=values["high"] * scale if values.get("high") else None,
+            low=values["low"] * scale if values.get("low") else None,
+        ))
+    return quotes
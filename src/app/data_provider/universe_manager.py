@@ -1,17 +1,24 @@
 import logging
 from datetime import date
-from sqlalchemy import select, update
+from typing import Dict, List, Optional
+from sqlalchemy import func, select, update
 from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from src.app.db.models import Universe, UniverseMember, MarketSymbol
-
-try:
-    from vnstock import Listing
-except ImportError:
-    Listing = None
+from src.app.data_provider.vendor import load_vnstock
 
 logger = logging.getLogger(__name__)
 
+# Universes made of whole exchanges (every listed stock) rather than an index group
+EXCHANGE_UNIVERSES = {
+    "HOSE_ALL": ("HOSE",),
+    "HNX_ALL": ("HNX",),
+    "UPCOM_ALL": ("UPCOM",),
+    "ALL": ("HOSE", "HNX", "UPCOM"),
+}
+# vnstock/VCI exchange codes -> market_symbol.exchange
+EXCHANGE_ALIASES = {"HSX": "HOSE", "HOSE": "HOSE", "HNX": "HNX", "UPCOM": "UPCOM"}
+
 class UniverseManager:
     def __init__(self, db: AsyncSession, api_key: str = None):
         self.db = db
@@ -21,88 +28,189 @@ class UniverseManager:
         """
         Update VN30 universe members.
         """
-        # 1. Get or Create Universe
-        univ_stmt = select(Universe).where(Universe.code == 'VN30')
-        univ = (await self.db.execute(univ_stmt)).scalar_one_or_none()
-        if not univ:
-            univ = Universe(code='VN30', name='VN30 Index', source=source)
-            self.db.add(univ)
-            await self.db.flush()
-        
-        # 2. Get List
-        symbols = []
-        if source == "vnstock" and Listing is not None:
-             try:
-                 # Try with API key first (vnstock 3.4.2+)
-                 try:
-                     if self.api_key:
-                         lst = Listing(source='vci', api_key=self.api_key, show_log=False)
-                     else:
-                         lst = Listing(source='vci', show_log=False)
-                 except TypeError:
-                     # Fallback: older vnstock version doesn't support api_key
-                     logger.warning("vnstock Listing doesn't support api_key parameter, using without API key")
-                     lst = Listing(source='vci', show_log=False)
-                 
-                 # symbols_by_group("VN30")
-                 df = lst.symbols_by_group(group='VN30')
-                 if not df.empty and 'ticker' in df.columns:
-                     symbols = df['ticker'].tolist()
-                 # Some sources might use different column names? VCI usually 'ticker' or 'symbol'
-                 # If 'ticker' not present, check columns
-                 elif not df.empty and 'symbol' in df.columns:
-                     symbols = df['symbol'].tolist()
-             except Exception as e:
-                 logger.error(f"Failed to fetch VN30 from vnstock: {e}")
-        
+        return await self.update_universe("VN30", source=source, file_path=file_path, name="VN30 Index")
+
+    async def update_universe(self, code: str, source: str = "vnstock", file_path: str = None, name: str = None):
+        """
+        Fetch the constituents of index group `code` (vnstock, falling back to
+        a one-ticker-per-line file) and sync the universe to them.
+        """
+        file_path = file_path or f"{code.lower()}.txt"
+        symbols, exchanges = [], None
+        if source == "vnstock" and code in EXCHANGE_UNIVERSES:
+            exchanges = self.fetch_exchange_symbols(EXCHANGE_UNIVERSES[code])
+            symbols = list(exchanges)
+        elif source == "vnstock":
+            symbols = self.fetch_group_symbols(code)
+
         if not symbols:
              # Fallback to file
              try:
                  with open(file_path, "r", encoding="utf-8") as f:
                      symbols = [line.strip() for line in f if line.strip()]
              except FileNotFoundError:
-                 logger.error(f"vn30.txt not found at {file_path}")
-                 return
+                 logger.error(f"{file_path} not found")
+                 return None
 
         if not symbols:
-            logger.warning("No symbols found for VN30")
-            return
-
-        logger.info(f"Updating VN30 with {len(symbols)} symbols: {symbols}")
-
-        # 3. Upsert Symbols & Members
-        today = date.today()
-        
-        for ticker in symbols:
-            # Ensure Symbol Exists
-            sym_stmt = select(MarketSymbol).where(MarketSymbol.symbol == ticker)
-            sym = (await self.db.execute(sym_stmt)).scalar_one_or_none()
-            if not sym:
-                sym = MarketSymbol(symbol=ticker)
-                self.db.add(sym)
-                await self.db.flush()
-            
-            # Ensure Membership
-            # Check if already active member
-            mem_stmt = select(UniverseMember).where(
-                UniverseMember.universe_id == univ.universe_id,
-                UniverseMember.symbol_id == sym.symbol_id,
-                UniverseMember.effective_to.is_(None)
-            ).distinct()
-            # Use first() instead of scalar_one_or_none() to handle duplicates gracefully
-            mem = (await self.db.execute(mem_stmt)).scalars().first()
-            
-            if not mem:
-                # Add new membership
-                new_mem = UniverseMember(
-                    universe_id=univ.universe_id,
-                    symbol_id=sym.symbol_id,
-                    effective_from=today
+            logger.warning(f"No symbols found for {code}")
+            return None
+
+        if len(symbols) > 50:
+            logger.info(f"Updating {code} with {len(symbols)} symbols")
+        else:
+            logger.info(f"Updating {code} with {len(symbols)} symbols: {symbols}")
+        if not name:
+            name = f"All {'/'.join(EXCHANGE_UNIVERSES[code])} listings" if code in EXCHANGE_UNIVERSES else f"{code} Index"
+        return await self.sync_universe(code, symbols, name=name, source=source, exchanges=exchanges)
+
+    def _listing(self):
+        Listing = load_vnstock().Listing
+        # Try with API key first (vnstock 3.4.2+)
+        try:
+            if self.api_key:
+                return Listing(source='vci', api_key=self.api_key, show_log=False)
+            return Listing(source='vci', show_log=False)
+        except TypeError:
+            # Fallback: older vnstock version doesn't support api_key
+            logger.warning("vnstock Listing doesn't support api_key parameter, using without API key")
+            return Listing(source='vci', show_log=False)
+
+    def fetch_exchange_symbols(self, exchanges) -> Dict[str, str]:
+        """
+        {ticker: exchange} of every listed stock on the given exchanges
+        (funds, warrants and bonds are left out when the listing says so).
+        """
+        if getattr(load_vnstock(), "Listing", None) is None:
+            return {}
+        try:
+            df = self._listing().symbols_by_exchange()
+        except Exception as e:
+            logger.error(f"Failed to fetch listings from vnstock: {e}")
+            return {}
+        if df.empty:
+            return {}
+        ticker_col = 'symbol' if 'symbol' in df.columns else 'ticker'
+        exchange_col = 'exchange' if 'exchange' in df.columns else 'comGroupCode'
+        if 'type' in df.columns:
+            df = df[df['type'].astype(str).str.upper() == 'STOCK']
+        listed = df[exchange_col].astype(str).str.upper().map(EXCHANGE_ALIASES)
+        df = df[listed.isin(exchanges)]
+        return dict(zip(df[ticker_col].astype(str).str.upper(), listed[df.index]))
+
+    def fetch_group_symbols(self, group: str) -> List[str]:
+        if getattr(load_vnstock(), "Listing", None) is None:
+            return []
+        try:
+            df = self._listing().symbols_by_group(group=group)
+            # VCI usually returns 'ticker', some sources 'symbol'
+            if not df.empty and 'ticker' in df.columns:
+                return df['ticker'].tolist()
+            if not df.empty and 'symbol' in df.columns:
+                return df['symbol'].tolist()
+        except Exception as e:
+            logger.error(f"Failed to fetch {group} from vnstock: {e}")
+        return []
+
+    async def sync_universe(self, code: str, symbols: List[str], name: str = None, source: str = "manual",
+                            as_of: date = None, exchanges: Dict[str, str] = None) -> Optional[Dict[str, int]]:
+        """
+        Make `symbols` the current members of universe `code` as of `as_of`
+        (today by default), keeping history:
+
+        - new names get a membership starting at as_of
+        - names no longer listed get effective_to = as_of
+        - unchanged names keep their open membership
+
+        A handful of set-based statements regardless of universe size.
+        `exchanges` ({ticker: exchange}) also refreshes market_symbol.exchange.
+        Returns {"added", "removed", "kept"} counts, or None (nothing changed)
+        for an empty symbol list, which would otherwise close every membership.
+        Raises ValueError if as_of is before the universe's latest membership
+        change: history is only appended to, never rewritten.
+        """
+        as_of = as_of or date.today()
+        tickers = sorted({s.strip().upper() for s in symbols if s and s.strip()})
+        if not tickers:
+            logger.warning(f"No symbols given for {code}; universe left unchanged")
+            return None
+
+        # 1. Universe
+        univ = (await self.db.execute(select(Universe).where(Universe.code == code))).scalar_one_or_none()
+        if not univ:
+            univ = Universe(code=code, name=name or code, source=source)
+            self.db.add(univ)
+            await self.db.flush()
+        else:
+            last_change = (await self.db.execute(
+                select(func.max(func.greatest(UniverseMember.effective_from, UniverseMember.effective_to)))
+                .where(UniverseMember.universe_id == univ.universe_id)
+            )).scalar()
+            if last_change is not None and as_of < last_change:
+                raise ValueError(f"Cannot sync {code} as of {as_of}: memberships already change on {last_change}")
+
+        # 2. Symbols: insert the unknown ones, then resolve every id in one query
+        if exchanges:
+            stmt = insert(MarketSymbol).values([
+                {"symbol": t, "exchange": exchanges.get(t, "HOSE")} for t in tickers
+            ])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['symbol'],
+                set_={'exchange': stmt.excluded.exchange},
+                where=MarketSymbol.exchange.is_distinct_from(stmt.excluded.exchange)
+            )
+        else:
+            stmt = insert(MarketSymbol).values([{"symbol": t} for t in tickers])\
+                .on_conflict_do_nothing(index_elements=['symbol'])
+        await self.db.execute(stmt)
+        rows = await self.db.execute(
+            select(MarketSymbol.symbol, MarketSymbol.symbol_id).where(MarketSymbol.symbol.in_(tickers))
+        )
+        symbol_ids: Dict[str, int] = dict(rows.all())
+
+        # 3. Diff against the open memberships
+        active = set((await self.db.execute(
+            select(UniverseMember.symbol_id)
+            .where(UniverseMember.universe_id == univ.universe_id, UniverseMember.active_on())
+        )).scalars().all())
+        wanted = set(symbol_ids.values())
+        added, removed = wanted - active, active - wanted
+
+        # 4. Close removed names, open new ones
+        if removed:
+            await self.db.execute(
+                update(UniverseMember)
+                .where(
+                    UniverseMember.universe_id == univ.universe_id,
+                    UniverseMember.symbol_id.in_(removed),
+                    UniverseMember.active_on(),
                 )
-                self.db.add(new_mem)
-        
-        # TODO: Handle removals? If a symbol is no longer in list, set effective_to?
-        # For simplicity, we just add new ones. 
-        
+                .values(effective_to=as_of)
+                .execution_options(synchronize_session=False)
+            )
+        if added:
+            stmt = insert(UniverseMember).values([
+                {"universe_id": univ.universe_id, "symbol_id": sid, "effective_from": as_of} for sid in added
+            ])
+            # Removed and re-added on the same day: reopen that membership
+            await self.db.execute(stmt.on_conflict_do_update(
+                index_elements=['universe_id', 'symbol_id', 'effective_from'],
+                set_={'effective_to': None}
+            ))
+
         await self.db.commit()
-        logger.info("VN30 universe updated.")
+        stats = {"added": len(added), "removed": len(removed), "kept": len(wanted & active)}
+        logger.info(f"{code} universe synced as of {as_of}: +{stats['added']} -{stats['removed']} ={stats['kept']}")
+        return stats
+
+    async def members_as_of(self, code: str, as_of: date) -> List[str]:
+        """
+        Symbols that were members of universe `code` on `as_of`.
+        """
+        stmt = select(MarketSymbol.symbol)\
+            .join(UniverseMember, UniverseMember.symbol_id == MarketSymbol.symbol_id)\
+            .join(Universe, Universe.universe_id == UniverseMember.universe_id)\
+            .where(Universe.code == code, UniverseMember.active_on(as_of))\
+            .distinct()\
+            .order_by(MarketSymbol.symbol)
+        return list((await self.db.execute(stmt)).scalars().all())
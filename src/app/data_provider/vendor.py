@@ -0,0 +1,23 @@
+import importlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+_UNSET = object()
+_vnstock = _UNSET
+
+
+def load_vnstock():
+    """
+    The vnstock module, imported on first use: importing it takes seconds
+    (pandas, HTTP clients, its own setup), which commands and API requests
+    that never fetch should not pay. None if it is not installed.
+    """
+    global _vnstock
+    if _vnstock is _UNSET:
+        try:
+            _vnstock = importlib.import_module("vnstock")
+        except ImportError as e:
+            logger.warning(f"vnstock is not available: {e}")
+            _vnstock = None
+    return _vnstock
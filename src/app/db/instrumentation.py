@@ -0,0 +1,242 @@
+"""
+Statement-level instrumentation of the async engine.
+
+Every statement is timed into the db_query_seconds histogram. Inside
+track_queries() it is also attributed to a logical operation (a CLI command,
+a scheduler job, an API run, tagged with its run_id) that counts statements
+and time, keeps the slowest ones, groups them by normalized shape to spot
+N+1 patterns, and enforces a statement budget.
+
+The operation lives in a context variable: asyncio tasks, asyncio.to_thread
+and SQLAlchemy's greenlets all inherit it, so nothing has to be passed down.
+"""
+import heapq
+import logging
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from src.app.core.config import settings
+from src.app.core.metrics import (
+    DB_OPERATION_STATEMENTS, DB_QUERY_BUDGET_EXCEEDED, DB_QUERY_SECONDS, DB_SUSPECTED_N_PLUS_ONE,
+)
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+_OPERATIONS = {"select", "insert", "update", "delete", "with", "begin", "commit", "rollback"}
+# Transaction control is not application work; it never counts as an N+1 shape
+_CONTROL = {"begin", "commit", "rollback", "savepoint", "release"}
+
+_PARAM = re.compile(r"%\(\w+\)s|%s|\$\d+|\?")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_SPACE = re.compile(r"\s+")
+_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+_ROWS = re.compile(r"\(\?(?:, \.\.\.)?\)(?:\s*,\s*\(\?(?:, \.\.\.)?\))+")
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+def statement_operation(statement: str) -> str:
+    """
+    Coarse statement type for metric labels (select, insert, ..., other).
+    """
+    head = statement.lstrip()[:10].split(None, 1)
+    word = head[0].lower() if head else ""
+    return word if word in _OPERATIONS else "other"
+
+
+def normalize_statement(statement: str) -> str:
+    """
+    Statement shape: bind parameters and literals become `?`, IN lists and
+    multi-row VALUES collapse, so the same query with different values (or
+    batch sizes) maps to one shape.
+    """
+    shape = _SPACE.sub(" ", statement).strip()
+    shape = _STRING.sub("?", shape)
+    shape = _PARAM.sub("?", shape)
+    shape = _NUMBER.sub("?", shape)
+    shape = _LIST.sub("?, ...", shape)
+    return _ROWS.sub("(?, ...), ...", shape)
+
+
+class QueryStats:
+    """
+    Statements of one logical operation. Nested operations also count
+    towards their parents.
+    """
+    def __init__(self, operation: str, run_id=None, budget: int = None, strict: bool = None,
+                 parent: "QueryStats" = None):
+        self.operation = operation
+        self.run_id = run_id
+        self.budget = settings.DB_QUERY_BUDGET if budget is None else budget
+        self.strict = settings.DB_QUERY_BUDGET_STRICT if strict is None else strict
+        self.parent = parent
+        self.statements = 0
+        self.seconds = 0.0
+        self.shapes: Dict[str, List] = {}  # shape -> [count, seconds]
+        self._slowest: List[Tuple[float, str]] = []  # min-heap of (seconds, shape)
+        self._over_budget = False
+
+    @property
+    def label(self) -> str:
+        return f"{self.operation} (run {self.run_id})" if self.run_id else self.operation
+
+    def check_budget(self):
+        """
+        Called before each statement. In strict mode the statement that would
+        exceed the budget raises instead of running (once per operation, so
+        the failure can still be recorded). Per-symbol error handlers re-raise
+        QueryBudgetExceeded rather than skipping the symbol.
+        """
+        stats = self
+        while stats is not None:
+            if stats.budget and stats.statements >= stats.budget and not stats._over_budget:
+                stats._over_budget = True
+                DB_QUERY_BUDGET_EXCEEDED.inc(operation=stats.operation)
+                message = f"{stats.label} exceeded its query budget of {stats.budget} statements"
+                if stats.strict:
+                    raise QueryBudgetExceeded(message)
+                logger.warning(f"⚠️ {message}")
+            stats = stats.parent
+
+    def record(self, statement: str, seconds: float):
+        shape = normalize_statement(statement)
+        stats = self
+        while stats is not None:
+            stats._add(shape, seconds)
+            stats = stats.parent
+
+    def _add(self, shape: str, seconds: float):
+        self.statements += 1
+        self.seconds += seconds
+        entry = self.shapes.get(shape)
+        if entry is None:
+            entry = self.shapes[shape] = [0, 0.0]
+        entry[0] += 1
+        entry[1] += seconds
+        item = (seconds, shape)
+        if len(self._slowest) < settings.DB_SLOW_QUERY_TOP:
+            heapq.heappush(self._slowest, item)
+        elif item > self._slowest[0]:
+            heapq.heapreplace(self._slowest, item)
+
+    def slowest(self) -> List[Tuple[float, str]]:
+        return sorted(self._slowest, reverse=True)
+
+    def suspects(self, threshold: int = None) -> List[Tuple[str, int, float]]:
+        """
+        (shape, count, seconds) of non-control shapes repeated at least
+        `threshold` times: one query per row where one per batch would do.
+        """
+        threshold = settings.DB_N_PLUS_ONE_THRESHOLD if threshold is None else threshold
+        found = [(shape, count, secs) for shape, (count, secs) in self.shapes.items()
+                 if count >= threshold and shape.split(" ", 1)[0].lower() not in _CONTROL]
+        return sorted(found, key=lambda x: x[1], reverse=True)
+
+    def summary(self) -> Dict:
+        return {
+            "operation": self.operation,
+            "run_id": str(self.run_id) if self.run_id else None,
+            "statements": self.statements,
+            "seconds": round(self.seconds, 4),
+            "shapes": len(self.shapes),
+            "slowest": [{"seconds": round(s, 4), "statement": shape[:300]} for s, shape in self.slowest()],
+            "suspects": [{"count": c, "seconds": round(s, 4), "statement": shape[:300]} for shape, c, s in self.suspects()],
+        }
+
+
+def format_query_summary(stats: QueryStats, top: int = 5) -> str:
+    """
+    Plain-text report for the CLI.
+    """
+    lines = [f"Queries: {stats.statements} statements, {stats.seconds * 1000:.1f} ms, {len(stats.shapes)} shapes"]
+    if stats.slowest():
+        lines.append("Slowest statements:")
+        lines.extend(f"{s * 1000:>10.1f} ms  {shape[:120]}" for s, shape in stats.slowest()[:top])
+    suspects = stats.suspects()
+    if suspects:
+        lines.append("Possible N+1 (same statement shape repeated):")
+        lines.extend(f"{count:>8}x {secs * 1000:>9.1f} ms  {shape[:120]}" for shape, count, secs in suspects[:top])
+    return "\n".join(lines)
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def current_query_stats() -> Optional[QueryStats]:
+    return _current.get()
+
+
+@contextmanager
+def track_queries(operation: str, run_id=None, budget: int = None, strict: bool = None):
+    """
+    Attribute statements issued inside the block (and tasks it starts) to
+    `operation`. Logs a summary with N+1 suspects on exit. `operation` is a
+    metric label, so keep it low-cardinality ("cli run", "scheduler ingest")
+    and pass the run id separately; it can also be set later via
+    current_query_stats().run_id.
+    """
+    stats = QueryStats(operation, run_id=run_id, budget=budget, strict=strict, parent=_current.get())
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+        _report(stats)
+
+
+def _report(stats: QueryStats):
+    if not stats.statements:
+        return
+    DB_OPERATION_STATEMENTS.observe(stats.statements, operation=stats.operation)
+    logger.info(f"🗄 {stats.label}: {stats.statements} statements in {stats.seconds * 1000:.0f} ms "
+                f"({len(stats.shapes)} shapes)")
+    for shape, count, secs in stats.suspects():
+        DB_SUSPECTED_N_PLUS_ONE.inc(operation=stats.operation)
+        logger.warning(f"Possible N+1 in {stats.label}: {count}x ({secs * 1000:.0f} ms) {shape[:200]}")
+
+
+def instrument_engine(engine: "AsyncEngine"):
+    """
+    Install the statement hooks on the engine. They run on the connection's
+    greenlet, so a stack on the connection is enough to pair before/after
+    even with executemany.
+    """
+    # Imported here so track_queries() stays usable without loading SQLAlchemy (CLI startup)
+    from sqlalchemy import event
+
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        # Pushed first: a budget error still goes through handle_error, which pops it
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+        stats = _current.get()
+        if stats is not None:
+            stats.check_budget()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get("query_start")
+        if not stack:
+            return
+        seconds = time.perf_counter() - stack.pop()
+        DB_QUERY_SECONDS.observe(seconds, operation=statement_operation(statement))
+        stats = _current.get()
+        if stats is not None:
+            stats.record(statement, seconds)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(exception_context):
+        conn = exception_context.connection
+        stack = conn.info.get("query_start") if conn is not None else None
+        if stack:
+            stack.pop()
@@ -0,0 +1,56 @@
+import logging
+from typing import Dict, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.app.db.models import MarketSymbol, Timeframe, Universe
+
+logger = logging.getLogger(__name__)
+
+
+class DimensionCache:
+    """
+    In-memory maps of the small dimension tables (symbol, timeframe, universe
+    code -> id). They change only on universe updates, so lookups can skip a
+    round trip per request; misses fall back to the DB.
+    """
+    def __init__(self):
+        self.symbols: Dict[str, int] = {}
+        self.timeframes: Dict[str, int] = {}
+        self.universes: Dict[str, int] = {}
+        self.loaded = False
+
+    async def load(self, db: AsyncSession):
+        self.symbols = dict((await db.execute(select(MarketSymbol.symbol, MarketSymbol.symbol_id))).all())
+        self.timeframes = dict((await db.execute(select(Timeframe.code, Timeframe.timeframe_id))).all())
+        self.universes = dict((await db.execute(select(Universe.code, Universe.universe_id))).all())
+        self.loaded = True
+        logger.info(f"Dimension cache loaded: {len(self.symbols)} symbols, {len(self.timeframes)} timeframes, {len(self.universes)} universes")
+
+    async def symbol_id(self, db: AsyncSession, symbol: str) -> Optional[int]:
+        if symbol not in self.symbols:
+            sid = (await db.execute(select(MarketSymbol.symbol_id).where(MarketSymbol.symbol == symbol))).scalar_one_or_none()
+            if sid is None:
+                return None
+            self.symbols[symbol] = sid
+        return self.symbols[symbol]
+
+    async def timeframe_id(self, db: AsyncSession, code: str) -> Optional[int]:
+        if code not in self.timeframes:
+            tid = (await db.execute(select(Timeframe.timeframe_id).where(Timeframe.code == code))).scalar_one_or_none()
+            if tid is None:
+                return None
+            self.timeframes[code] = tid
+        return self.timeframes[code]
+
+    async def universe_id(self, db: AsyncSession, code: str) -> Optional[int]:
+        if code not in self.universes:
+            uid = (await db.execute(select(Universe.universe_id).where(Universe.code == code))).scalar_one_or_none()
+            if uid is None:
+                return None
+            self.universes[code] = uid
+        return self.universes[code]
+
+
+dimensions = DimensionCache()
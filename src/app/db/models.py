@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, Numeric, TIMESTAMP, Date, ForeignKey, JSON, null
+from sqlalchemy import Column, Integer, String, Boolean, Numeric, TIMESTAMP, Date, ForeignKey, JSON, null, and_, or_
 from sqlalchemy.orm import declarative_base, relationship
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
@@ -60,7 +60,18 @@ class UniverseMember(BaseModel):
     effective_from = Column(Date, primary_key=True)
     effective_to = Column(Date)
 
+    @classmethod
+    def active_on(cls, as_of=None):
+        """
+        Filter for memberships in effect on `as_of` (the current ones if None).
+        A membership covers [effective_from, effective_to).
+        """
+        if as_of is None:
+            return cls.effective_to.is_(None)
+        return and_(cls.effective_from <= as_of, or_(cls.effective_to.is_(None), cls.effective_to > as_of))
+
 class OhlcvBar(BaseModel):
+    # Partitioned by timeframe_id, then ts; inserts need ensure_partitions() first
     __tablename__ = 'ohlcv_bar'
     __table_args__ = {'schema': 'trading'}
 
@@ -75,6 +86,19 @@ class OhlcvBar(BaseModel):
     source = Column(String, default='vnstock')
     ingested_at = Column(TIMESTAMP(timezone=True))
 
+class OhlcvCoverage(BaseModel):
+    # One row per (timeframe, symbol), maintained by _save_ohlcv in the same transaction as the bars
+    __tablename__ = 'ohlcv_coverage'
+    __table_args__ = {'schema': 'trading'}
+
+    timeframe_id = Column(Integer, primary_key=True)
+    symbol_id = Column(Integer, primary_key=True)
+    first_ts = Column(TIMESTAMP(timezone=True))
+    last_ts = Column(TIMESTAMP(timezone=True))
+    bar_count = Column(Integer, nullable=False, default=0)
+    last_ingested_at = Column(TIMESTAMP(timezone=True))
+    last_changed_at = Column(TIMESTAMP(timezone=True))
+
 class DataFetchLog(BaseModel):
     __tablename__ = 'data_fetch_log'
     __table_args__ = {'schema': 'trading'}
@@ -146,3 +170,46 @@ class RunReport(BaseModel):
     ranking = Column(JSON)
     summary = Column(JSON)
     created_at = Column(TIMESTAMP(timezone=True))
+
+class RunMetric(BaseModel):
+    __tablename__ = 'run_metrics'
+    __table_args__ = {'schema': 'trading'}
+
+    metric_id = Column(Integer, primary_key=True)
+    run_id = Column(UUID(as_uuid=True))
+    stage = Column(String, nullable=False)
+    symbol_id = Column(Integer)
+    wall_ms = Column(Numeric(12, 3))
+    cpu_ms = Column(Numeric(12, 3))
+    peak_mem_kb = Column(Integer)
+    created_at = Column(TIMESTAMP(timezone=True))
+
+class QueueJob(BaseModel):
+    __tablename__ = 'job_queue'
+    __table_args__ = {'schema': 'trading'}
+
+    job_id = Column(Integer, primary_key=True)
+    batch_id = Column(UUID(as_uuid=True), nullable=False)
+    kind = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+    status = Column(String, default='queued')
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    worker_id = Column(String)
+    result = Column(JSON)
+    error_message = Column(String)
+    created_at = Column(TIMESTAMP(timezone=True))
+    claimed_at = Column(TIMESTAMP(timezone=True))
+    heartbeat_at = Column(TIMESTAMP(timezone=True))
+    finished_at = Column(TIMESTAMP(timezone=True))
+
+class NotificationDigest(BaseModel):
+    __tablename__ = 'notification_digest'
+    __table_args__ = {'schema': 'trading'}
+
+    subscriber = Column(String, primary_key=True)
+    topic = Column(String, primary_key=True)
+    digest = Column(String, nullable=False)
+    run_id = Column(UUID(as_uuid=True))
+    summary = Column(JSON)
+    delivered_at = Column(TIMESTAMP(timezone=True))
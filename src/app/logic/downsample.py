@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+
+def ohlc_buckets(df: pd.DataFrame, max_points: int) -> pd.DataFrame:
+    """
+    Aggregate consecutive bars into at most `max_points` OHLCV buckets
+    (first open, max high, min low, last close, summed volume).
+    Expects columns ts, open, high, low, close, volume in time order.
+    """
+    n = len(df)
+    if max_points <= 0 or n <= max_points:
+        return df
+    bucket = (np.arange(n) * max_points) // n
+    g = df.groupby(bucket, sort=True)
+    return pd.DataFrame({
+        'ts': g['ts'].first(),
+        'open': g['open'].first(),
+        'high': g['high'].max(),
+        'low': g['low'].min(),
+        'close': g['close'].last(),
+        'volume': g['volume'].sum(),
+    }).reset_index(drop=True)
+
+
+def lttb_indices(y: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: indices of `max_points` samples that keep
+    the visual shape of the series y (x is taken as the sample position).
+    """
+    n = len(y)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+
+    y = np.nan_to_num(np.asarray(y, dtype=float))
+    x = np.arange(n, dtype=float)
+    out = np.empty(max_points, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    # Interior buckets split points 1..n-2 evenly
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    a = 0
+    for i in range(max_points - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        # Average of the next bucket (or the last point for the final bucket)
+        nlo, nhi = edges[i + 1], (edges[i + 2] if i + 2 < len(edges) else n)
+        nhi = max(nhi, nlo + 1)
+        avg_x, avg_y = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def lttb(df: pd.DataFrame, max_points: int, column: str = 'close') -> pd.DataFrame:
+    """
+    Downsample every column of df to the rows LTTB selects on `column`.
+    """
+    if max_points <= 0 or len(df) <= max_points:
+        return df
+    return df.iloc[lttb_indices(df[column].to_numpy(), max_points)].reset_index(drop=True)
@@ -1,89 +1,224 @@
+import gzip
 import json
 import os
+import threading
 from datetime import datetime
-from typing import Dict, Any, List
+from functools import lru_cache
+from typing import Dict, Any, List, Optional
+
+from jinja2 import Environment, FileSystemLoader, StrictUndefined, select_autoescape
+
+from src.app.core.config import settings
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "templates")
+MANIFEST_FILE = "manifest.jsonl"
+
+# Parsed and compiled once per process; get_template() then hits the env cache
+_env = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    autoescape=select_autoescape(enabled_extensions=("html.j2",), default_for_string=False),
+    trim_blocks=True,
+    lstrip_blocks=True,
+    undefined=StrictUndefined,
+    auto_reload=False,
+)
+TEMPLATES = {"md": "report.md.j2", "html": "report.html.j2"}
+
+
+def _key_reasons(item: Dict[str, Any]) -> List[str]:
+    signal = item.get('signal') or {}
+    reasons = list(signal.get('key_reasons') or [])
+    if not reasons:
+        # Generate simple text from breakdown
+        bd = item.get('breakdown') or {}
+        if bd.get('trend', 0) > 80: reasons.append("Strong Uptrend")
+        if bd.get('base', 0) > 80: reasons.append("Tight Base / Squeeze")
+        if bd.get('breakout', 0) > 80: reasons.append("Potential Breakout")
+        if bd.get('volume', 0) > 80: reasons.append("High Relative Volume")
+    return reasons
+
+
+def _view(item: Dict[str, Any], with_reasons: bool = False) -> Dict[str, Any]:
+    signal = item.get('signal') or {}
+    view = {
+        'symbol': item['symbol'],
+        'score_total': item['score_total'],
+        'signal': signal,
+        'entry': signal.get('entry_zone') or {},
+        'bd': item.get('breakdown') or {},
+    }
+    if with_reasons:
+        view['reasons'] = _key_reasons(item)
+    return view
+
 
 class Reporter:
-    def __init__(self, output_dir: str = "reports"):
-        self.output_dir = output_dir
-        os.makedirs(output_dir, exist_ok=True)
-        
+    """
+    Report store under `output_dir`:
+
+    - YYYYMMDD/run_<id>.json.gz: compact gzipped {run_id, as_of, top3, ranking}
+    - YYYYMMDD/run_<id>.md (and .html if enabled): rendered from templates/
+    - manifest.jsonl: append-only index, one line per run
+      (run_id, date, as_of, paths, top symbols)
+
+    The manifest is read once into a dict and then only its new tail is
+    read, so find()/load() are O(1) per lookup after the first.
+    """
+    def __init__(self, output_dir: str = None, formats: List[str] = None):
+        self.output_dir = output_dir or settings.REPORT_DIR
+        self.formats = formats if formats is not None else [f.strip() for f in settings.REPORT_FORMATS.split(",") if f.strip()]
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.manifest_path = os.path.join(self.output_dir, MANIFEST_FILE)
+        self._index: Dict[str, Dict[str, Any]] = {}
+        self._offset = 0
+        self._lock = threading.Lock()
+
     def save_run_results(self, run_id: str, top3: List[Dict], ranking: List[Dict], as_of: datetime):
         """
-        Save JSON and Markdown reports.
+        Save the compressed JSON artifact and rendered reports, then index them.
+        Returns the Markdown path.
         """
         date_str = as_of.strftime("%Y%m%d")
         day_dir = os.path.join(self.output_dir, date_str)
         os.makedirs(day_dir, exist_ok=True)
-        
-        # 1. Save JSON
-        top3_path = os.path.join(day_dir, f"run_{run_id}_top3.json")
-        ranking_path = os.path.join(day_dir, f"run_{run_id}_ranking.json")
-        
-        with open(top3_path, "w", encoding="utf-8") as f:
-            json.dump(top3, f, indent=2, default=str)
-            
-        with open(ranking_path, "w", encoding="utf-8") as f:
-            json.dump(ranking, f, indent=2, default=str)
-            
-        # 2. Save Markdown
-        md_content = self._generate_markdown(top3, ranking, run_id, as_of)
-        md_path = os.path.join(day_dir, f"run_{run_id}.md")
-        with open(md_path, "w", encoding="utf-8") as f:
-            f.write(md_content)
-            
-        return md_path
+
+        # 1. Save JSON (the bar 'row' is bulky and lives in ohlcv_bar anyway)
+        paths = {"json": self._write_json(day_dir, run_id, top3, ranking, as_of)}
+
+        # 2. Render reports
+        for fmt in ["md"] + [f for f in self.formats if f != "md"]:
+            paths[fmt] = os.path.join(day_dir, f"run_{run_id}.{fmt}")
+            with open(paths[fmt], "w", encoding="utf-8") as f:
+                f.write(self.render(fmt, run_id, top3, ranking, as_of))
+
+        # 3. Index
+        self._append_manifest(self._manifest_entry(run_id, date_str, as_of, paths, top3))
+        return paths["md"]
+
+    def _write_json(self, day_dir: str, run_id: str, top3: List[Dict], ranking: List[Dict], as_of: datetime) -> str:
+        payload = {
+            "run_id": run_id,
+            "as_of": as_of,
+            "top3": [{k: v for k, v in item.items() if k != 'row'} for item in top3],
+            "ranking": [{k: v for k, v in item.items() if k != 'row'} for item in ranking],
+        }
+        json_path = os.path.join(day_dir, f"run_{run_id}.json.gz")
+        with gzip.open(json_path, "wt", encoding="utf-8", compresslevel=6) as f:
+            json.dump(payload, f, default=str, separators=(",", ":"), ensure_ascii=False)
+        return json_path
+
+    def _manifest_entry(self, run_id: str, date_str: str, as_of: datetime, paths: Dict[str, str], top3: List[Dict]) -> Dict[str, Any]:
+        return {
+            "run_id": run_id,
+            "date": date_str,
+            "as_of": as_of.isoformat(),
+            "paths": {k: os.path.relpath(v, self.output_dir) for k, v in paths.items()},
+            "top": [item['symbol'] for item in top3],
+        }
+
+    def render(self, fmt: str, run_id: str, top3: List[Dict], ranking: List[Dict], as_of: datetime) -> str:
+        template = _env.get_template(TEMPLATES[fmt])
+        return template.render(
+            run_id=run_id,
+            as_of=as_of,
+            top3=[_view(item, with_reasons=True) for item in top3],
+            ranking=[_view(item) for item in ranking],
+        )
 
     def _generate_markdown(self, top3: List[Dict], ranking: List[Dict], run_id: str, as_of: datetime) -> str:
-        lines = []
-        lines.append(f"# VN30 Short-term Trading Report")
-        lines.append(f"**Run ID**: {run_id}")
-        lines.append(f"**Date**: {as_of.strftime('%Y-%m-%d %H:%M')}")
-        lines.append("")
-        lines.append("> [!WARNING]")
-        lines.append("> Disclaimer: This report is for technical analysis purposes only and does not constitute financial advice.")
-        lines.append("")
-        
-        lines.append("## Top 3 Candidates")
-        
-        for item in top3:
-            symbol = item['symbol']
-            score = item['score_total']
-            signal = item.get('signal', {})
-            entry = signal.get('entry_zone', {})
-            
-            lines.append(f"### {symbol} (Score: {score})")
-            lines.append(f"- **Entry Zone**: {entry.get('from')} - {entry.get('to')}")
-            lines.append(f"- **Stop Loss**: {signal.get('stop_loss')}")
-            lines.append(f"- **Targets**: TP1 {signal.get('take_profit_1')} | TP2 {signal.get('take_profit_2')}")
-            
-            # Breakdown
-            bd = item.get('breakdown', {})
-            lines.append(f"#### Score Breakdown")
-            lines.append(f"- Trend: {bd.get('trend')} | Base: {bd.get('base')} | Vol: {bd.get('volume')} | Mom: {bd.get('momentum')} | Risk: {bd.get('risk')}")
-            
-            # Reasons (Mock logic for now, or use what's generated)
-            reasons = signal.get('key_reasons', [])
-            if not reasons:
-                # Generate simple text from breakdown
-                if bd.get('trend', 0) > 80: reasons.append("Strong Uptrend")
-                if bd.get('base', 0) > 80: reasons.append("Tight Base / Squeeze")
-                if bd.get('breakout', 0) > 80: reasons.append("Potential Breakout")
-                if bd.get('volume', 0) > 80: reasons.append("High Relative Volume")
-            
-            if reasons:
-                lines.append(f"#### Key Reasons")
-                for r in reasons:
-                    lines.append(f"- {r}")
-            
-            lines.append("")
-            
-        lines.append("## Full Ranking")
-        lines.append("| Rank | Symbol | Score | Trend | Base | Vol | Mom | Risk |")
-        lines.append("|---|---|---|---|---|---|---|---|")
-        
-        for idx, item in enumerate(ranking, 1):
-            bd = item.get('breakdown', {})
-            lines.append(f"| {idx} | {item['symbol']} | {item['score_total']} | {bd.get('trend')} | {bd.get('base')} | {bd.get('volume')} | {bd.get('momentum')} | {bd.get('risk')} |")
-            
-        return "\n".join(lines)
+        return self.render("md", run_id, top3, ranking, as_of)
+
+    def _append_manifest(self, entry: Dict[str, Any]):
+        line = json.dumps(entry, separators=(",", ":"), ensure_ascii=False) + "\n"
+        with self._lock:
+            # One write() of a short line in append mode, so concurrent writers don't interleave
+            with open(self.manifest_path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+    def _refresh_index(self):
+        if not os.path.exists(self.manifest_path):
+            return
+        with open(self.manifest_path, "rb") as f:
+            f.seek(self._offset)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # partially written line; pick it up next time
+                self._offset += len(raw)
+                entry = json.loads(raw)
+                self._index[entry["run_id"]] = entry
+
+    def find(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Manifest entry of a run (paths relative to output_dir), or None.
+        """
+        with self._lock:
+            if run_id not in self._index:
+                self._refresh_index()
+            return self._index.get(run_id)
+
+    def load(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """
+        {run_id, as_of, top3, ranking} of a stored run, or None.
+        """
+        entry = self.find(run_id)
+        if not entry:
+            return None
+        path = os.path.join(self.output_dir, entry["paths"]["json"])
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            return json.load(f)
+
+    def migrate_legacy(self, delete: bool = True) -> int:
+        """
+        Convert old per-run run_<id>_top3.json / run_<id>_ranking.json pairs into
+        the compressed artifact and index them (existing Markdown is kept as is).
+        Returns the number of runs converted.
+        """
+        converted = 0
+        for date_str in sorted(os.listdir(self.output_dir)):
+            day_dir = os.path.join(self.output_dir, date_str)
+            if not os.path.isdir(day_dir):
+                continue
+            for name in sorted(os.listdir(day_dir)):
+                if not name.endswith("_ranking.json"):
+                    continue
+                run_id = name[len("run_"):-len("_ranking.json")]
+                if self.find(run_id):
+                    continue
+                ranking_path = os.path.join(day_dir, name)
+                top3_path = os.path.join(day_dir, f"run_{run_id}_top3.json")
+                md_path = os.path.join(day_dir, f"run_{run_id}.md")
+                with open(ranking_path, encoding="utf-8") as f:
+                    ranking = json.load(f)
+                top3 = ranking[:3]
+                if os.path.exists(top3_path):
+                    with open(top3_path, encoding="utf-8") as f:
+                        top3 = json.load(f)
+
+                as_of = datetime.strptime(date_str, "%Y%m%d")
+                if os.path.exists(md_path):
+                    with open(md_path, encoding="utf-8") as f:
+                        for line in f:
+                            if line.startswith("**Date**: "):
+                                as_of = datetime.strptime(line[len("**Date**: "):].strip(), "%Y-%m-%d %H:%M")
+                                break
+                else:
+                    with open(md_path, "w", encoding="utf-8") as f:
+                        f.write(self.render("md", run_id, top3, ranking, as_of))
+
+                paths = {"json": self._write_json(day_dir, run_id, top3, ranking, as_of), "md": md_path}
+                self._append_manifest(self._manifest_entry(run_id, date_str, as_of, paths, top3))
+                if delete:
+                    os.remove(ranking_path)
+                    if os.path.exists(top3_path):
+                        os.remove(top3_path)
+                converted += 1
+        return converted
+
+
+@lru_cache()
+def get_report_store() -> Reporter:
+    """
+    Shared instance for lookups, so the manifest index is built once per process.
+    """
+    return Reporter()
@@ -23,7 +23,19 @@ class Scorer:
             
         row = df.iloc[-1]
         prev = df.iloc[-2]
-        
+        # Relative BB width: Current Width / Avg Width(20)
+        avg_width = df['bb_width'].rolling(20).mean().iloc[-1]
+
+        result = self.score_row(row, prev['ema20'], avg_width)
+        result["row"] = row.to_dict() # debug info
+        return result
+
+    def score_row(self, row, prev_ema20: float, avg_width: float) -> Dict[str, Any]:
+        """
+        Score one bar from its indicator values (a Series or a plain dict),
+        the previous bar's EMA20 and the 20-bar average BB width. The live
+        mode calls this directly with incrementally updated indicators.
+        """
         # 1. Trend (0-100)
         # Price > EMA20 > EMA50 -> Strong Trend
         trend_score = 0
@@ -35,7 +47,7 @@ class Scorer:
             trend_score = 0
             
         # Slope check (proxy: EMA20 > EMA20[prev])
-        if row['ema20'] > prev['ema20']:
+        if row['ema20'] > prev_ema20:
              trend_score += 10 # Bonus for rising
         trend_score = min(100, trend_score)
 
@@ -43,7 +55,6 @@ class Scorer:
         # Low BB width or ATR compression implies base
         # BB width < 0.10 (10%) is decent for VN30? Or relative to recent average?
         # Let's use relative width: Current Width / Avg Width(20)
-        avg_width = df['bb_width'].rolling(20).mean().iloc[-1]
         base_score = 0
         if avg_width > 0:
             compression = row['bb_width'] / avg_width
@@ -133,5 +144,4 @@ class Scorer:
                 "risk": risk_score
             },
             "penalties": penalties,
-            "row": row.to_dict() # debug info
         }
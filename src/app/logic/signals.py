@@ -8,8 +8,12 @@ def generate_trade_plan(df: pd.DataFrame, score_data: Dict[str, Any]) -> Dict[st
     if df.empty or len(df) < 20:
         return {}
         
-    row = df.iloc[-1]
-    
+    return plan_from_row(df.iloc[-1])
+
+def plan_from_row(row) -> Dict[str, Any]:
+    """
+    Trade plan from one bar's indicator values (a Series or a plain dict).
+    """
     # Logic:
     # Entry: Current Close to High (or breakout level)
     # SL: Recent Swing Low or EMA50 (if close) or EMA20 (aggressive)
@@ -22,7 +26,7 @@ def generate_trade_plan(df: pd.DataFrame, score_data: Dict[str, Any]) -> Dict[st
     sl_level = row['ema20'] # Default to EMA20 support
     if row['close'] < row['ema20']: 
         # Below EMA20, use Swing Low
-        sl_level = df['low'].rolling(20).min().iloc[-1]
+        sl_level = row['low_20'] # Swing low: rolling 20-bar min of low
     
     atr = row['atr']
     sl_level = sl_level - (0.5 * atr) # Buffer
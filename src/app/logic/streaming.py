@@ -0,0 +1,253 @@
+"""
+Incremental counterparts of calculate_indicators for the live mode.
+
+A batch run recomputes every indicator over the whole lookback on each call.
+During the session only the last (forming) bar moves, so IndicatorState keeps
+the recursive state of the completed bars (EMAs, Wilder averages) plus the last
+19 values of each rolling window, and recomputes just the forming bar in O(20)
+per quote. Values match calculate_indicators on the same bars up to float
+rounding (checked by benchmarks/live_latency.py).
+
+Pure Python on purpose: a few hundred scalar updates per tick are far cheaper
+than building pandas objects for them.
+"""
+import math
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+WINDOW = 20
+
+# Minutes per bar of the intraday timeframes a quote can be bucketed into
+TIMEFRAME_MINUTES = {"1m": 1, "5m": 5, "15m": 15, "30m": 30, "1H": 60}
+
+# FormingBar.apply results
+UNCHANGED = 0
+CHANGED = 1
+NEW_BAR = 2
+
+_A20 = 2 / 21
+_A50 = 2 / 51
+_WILDER = 1 / 14
+
+
+def bar_key(ts: datetime, timeframe: str, tz: ZoneInfo) -> datetime:
+    """
+    Start of the bar `ts` falls in, as naive exchange-local time: the day for
+    1D, otherwise ts floored to the bar length. Naive `ts` is taken as local.
+    """
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(tz).replace(tzinfo=None)
+    if timeframe == "1D":
+        return datetime(ts.year, ts.month, ts.day)
+    minutes = TIMEFRAME_MINUTES.get(timeframe)
+    if minutes is None:
+        raise ValueError(f"Live mode does not support timeframe {timeframe}")
+    of_day = ts.hour * 60 + ts.minute
+    of_day -= of_day % minutes
+    return datetime(ts.year, ts.month, ts.day, of_day // 60, of_day % 60)
+
+
+class FormingBar:
+    """
+    The latest bar of one symbol, folded from quotes.
+
+    Quotes carry the cumulative session volume (what price boards report).
+    A daily bar takes it as is, together with the session open/high/low when
+    the quote has them; an intraday bar counts the volume traded since the
+    bar started.
+    """
+    def __init__(self, key: datetime, open: float, high: float, low: float, close: float, volume: float,
+                 daily: bool = True):
+        self.key = key
+        self.open, self.high, self.low, self.close, self.volume = open, high, low, close, volume
+        self.daily = daily
+        self._base: Optional[float] = None  # cumulative volume when this bar started
+        self._last_cum: Optional[float] = None
+
+    def values(self) -> Tuple[float, float, float, float, float]:
+        return self.open, self.high, self.low, self.close, self.volume
+
+    def apply(self, key: datetime, price: float, volume: float = None,
+              open: float = None, high: float = None, low: float = None) -> int:
+        """
+        Fold one quote in. Returns NEW_BAR if it starts a later bar, CHANGED if
+        it moved the current one, UNCHANGED otherwise (including stale quotes).
+        """
+        if key < self.key:
+            return UNCHANGED
+        before = self.values()
+        new_bar = key > self.key
+        if new_bar:
+            self.key = key
+            self.open = self.high = self.low = price
+            self.volume = 0.0
+            if not self.daily and volume is not None:
+                last = self._last_cum
+                if last is None:
+                    # Nothing seen before this quote: count from here
+                    self._base = volume
+                elif volume < last:
+                    # Cumulative volume restarted with a new session
+                    self._base = 0.0
+                else:
+                    self._base = last
+        self.close = price
+        self.high = max(self.high, price)
+        self.low = min(self.low, price)
+
+        if self.daily:
+            if open is not None and new_bar:
+                self.open = open
+            if high is not None:
+                self.high = max(self.high, high)
+            if low is not None:
+                self.low = min(self.low, low)
+            if volume is not None:
+                self.volume = float(volume)
+        elif volume is not None:
+            if self._base is None:
+                # First quote on a bar loaded from the DB: keep its stored volume
+                self._base = max(volume - self.volume, 0.0)
+            self.volume = max(volume - self._base, 0.0)
+            self._last_cum = volume
+
+        if new_bar:
+            return NEW_BAR
+        return CHANGED if self.values() != before else UNCHANGED
+
+
+def _rsi(avg_gain: float, avg_loss: float) -> float:
+    if avg_loss == 0:
+        # pandas: x/0 is inf (RSI 100), 0/0 is NaN
+        return 100.0 if avg_gain > 0 else math.nan
+    return 100 - (100 / (1 + avg_gain / avg_loss))
+
+
+def _mean(values) -> float:
+    return sum(values) / len(values) if len(values) == WINDOW else math.nan
+
+
+def _std(values, mean: float) -> float:
+    if len(values) < WINDOW:
+        return math.nan
+    return math.sqrt(sum((v - mean) ** 2 for v in values) / (WINDOW - 1))
+
+
+class IndicatorState:
+    """
+    Indicator state of one symbol: the completed bars are folded into EMA /
+    Wilder averages and 19-value windows; row() holds the indicators of the
+    current bar, recomputed by update() and committed by roll() when a later
+    bar starts.
+    """
+    def __init__(self):
+        self.bars = 0  # completed bars
+        self.ema20 = self.ema50 = self.avg_gain = self.avg_loss = self.atr = self.close = math.nan
+        self.closes = deque(maxlen=WINDOW - 1)
+        self.volumes = deque(maxlen=WINDOW - 1)
+        self.highs = deque(maxlen=WINDOW - 1)
+        self.lows = deque(maxlen=WINDOW - 1)
+        self.widths = deque(maxlen=WINDOW - 1)
+        self.row: Dict[str, float] = {}
+        self._gain = self._loss = 0.0  # current bar's averages, committed by roll()
+
+    @classmethod
+    def from_bars(cls, df) -> "IndicatorState":
+        """
+        State whose current bar is the last row of `df`, a single-symbol
+        frame with calculate_indicators columns (time order).
+        """
+        state = cls()
+        completed = df.iloc[:-1]
+        state.bars = len(completed)
+        if state.bars:
+            delta = df['close'].iloc[:-1].diff()
+            gain = delta.where(delta > 0, 0).fillna(0)
+            loss = (-delta.where(delta < 0, 0)).fillna(0)
+            last = completed.iloc[-1]
+            state.ema20, state.ema50, state.atr = float(last['ema20']), float(last['ema50']), float(last['atr'])
+            state.avg_gain = float(gain.ewm(alpha=_WILDER, adjust=False).mean().iloc[-1])
+            state.avg_loss = float(loss.ewm(alpha=_WILDER, adjust=False).mean().iloc[-1])
+            state.close = float(last['close'])
+            tail = completed.iloc[-(WINDOW - 1):]
+            state.closes.extend(map(float, tail['close']))
+            state.volumes.extend(map(float, tail['volume']))
+            state.highs.extend(map(float, tail['high']))
+            state.lows.extend(map(float, tail['low']))
+            state.widths.extend(map(float, tail['bb_width']))
+        current = df.iloc[-1]
+        state.update(*(float(current[c]) for c in ('open', 'high', 'low', 'close', 'volume')))
+        return state
+
+    @property
+    def length(self) -> int:
+        """
+        Bars including the current one (the len(df) of a batch run).
+        """
+        return self.bars + 1
+
+    def update(self, open: float, high: float, low: float, close: float, volume: float) -> Dict[str, float]:
+        """
+        Recompute the current bar's indicators from its latest OHLCV.
+        """
+        if self.bars:
+            ema20 = (1 - _A20) * self.ema20 + _A20 * close
+            ema50 = (1 - _A50) * self.ema50 + _A50 * close
+            delta = close - self.close
+            self._gain = (1 - _WILDER) * self.avg_gain + _WILDER * max(delta, 0.0)
+            self._loss = (1 - _WILDER) * self.avg_loss + _WILDER * max(-delta, 0.0)
+            true_range = max(high - low, abs(high - self.close), abs(low - self.close))
+            atr = (1 - _WILDER) * self.atr + _WILDER * true_range
+        else:
+            ema20 = ema50 = close
+            self._gain = self._loss = 0.0
+            atr = high - low
+
+        closes = [*self.closes, close]
+        bb_mid = _mean(closes)
+        bb_std = _std(closes, bb_mid)
+        bb_upper = bb_mid + bb_std * 2
+        bb_lower = bb_mid - bb_std * 2
+        highs = [*self.highs, high]
+        lows = [*self.lows, low]
+        full = len(closes) == WINDOW
+
+        self.row = {
+            "open": open, "high": high, "low": low, "close": close, "volume": volume,
+            "ema20": ema20,
+            "ema50": ema50,
+            "rsi": _rsi(self._gain, self._loss),
+            "atr": atr,
+            "vol_ma20": _mean([*self.volumes, volume]),
+            "bb_mid": bb_mid,
+            "bb_std": bb_std,
+            "bb_upper": bb_upper,
+            "bb_lower": bb_lower,
+            "bb_width": (bb_upper - bb_lower) / bb_mid if full else math.nan,
+            "high_20": max(highs) if full else math.nan,
+            "low_20": min(lows) if full else math.nan,
+        }
+        return self.row
+
+    def roll(self):
+        """
+        Commit the current bar; the next update() starts a new one.
+        """
+        row = self.row
+        self.ema20, self.ema50, self.atr = row['ema20'], row['ema50'], row['atr']
+        self.avg_gain, self.avg_loss = self._gain, self._loss
+        self.close = row['close']
+        self.closes.append(row['close'])
+        self.volumes.append(row['volume'])
+        self.highs.append(row['high'])
+        self.lows.append(row['low'])
+        self.widths.append(row['bb_width'])
+        self.bars += 1
+
+    def score_inputs(self) -> Tuple[Dict[str, Any], float, float]:
+        """
+        (row, previous EMA20, 20-bar average BB width) for Scorer.score_row.
+        """
+        return self.row, self.ema20, _mean([*self.widths, self.row['bb_width']])
@@ -1,10 +1,103 @@
+import asyncio
+import importlib
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from sqlalchemy import text
+
 from src.app.api.endpoints import router
 from src.app.core.config import settings
 
-app = FastAPI(title="VN30 Best Buy Finder")
+logger = logging.getLogger(__name__)
+
+
+async def warmup(app: FastAPI):
+    """
+    Open pool connections, load dimension lookups, prime the latest-run
+    cache and import the analysis stack so the first requests after a
+    (re)start don't pay for them.
+    /ready reports 503 until this has finished.
+    """
+    from src.app.db.session import engine, AsyncSessionLocal
+    from src.app.db.lookups import dimensions
+    from src.app.api.cache import latest_run_cache
+
+    async def ping():
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    delay = 1.0
+    while True:
+        try:
+            await asyncio.gather(*(ping() for _ in range(max(1, settings.API_WARMUP_CONNECTIONS))))
+            async with AsyncSessionLocal() as db:
+                await dimensions.load(db)
+            for field in latest_run_cache.FIELDS:
+                await latest_run_cache.get(field)
+            # The analysis stack (pandas, numpy, ...) is imported lazily; pay for it
+            # here rather than on the first /run
+            await asyncio.to_thread(importlib.import_module, "src.app.core.pipeline")
+            break
+        except Exception as e:
+            # DB may come up after the API (compose, restarts); keep retrying
+            app.state.warmup_error = str(e)
+            logger.error(f"API warmup failed, retrying in {delay:.0f}s: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+    app.state.ready = True
+    app.state.warmup_error = None
+    app.state.warmup_done.set()
+    logger.info("✅ API warmup complete")
+
+
+async def start_live(app: FastAPI):
+    """
+    Load the live ranking once warmup is done (LIVE_ENABLED).
+    """
+    from src.app.core.live import live_engine
+
+    await app.state.warmup_done.wait()
+    try:
+        await live_engine.start()
+    except Exception as e:
+        logger.error(f"Live mode failed to start: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.ready = False
+    app.state.warmup_error = None
+    app.state.warmup_done = asyncio.Event()
+    # Warm up in the background: /health answers immediately, /ready once warm
+    task = asyncio.create_task(warmup(app))
+    live_task = asyncio.create_task(start_live(app)) if settings.LIVE_ENABLED else None
+    try:
+        yield
+    finally:
+        task.cancel()
+        if live_task is not None:
+            live_task.cancel()
+            from src.app.core.live import live_engine
+            await live_engine.stop()
+        # Deliver reports queued by background runs
+        from src.app.notification.router import shutdown_notifications
+        await shutdown_notifications()
+        from src.app.db.session import engine
+        await engine.dispose()
+
+
+def create_app() -> FastAPI:
+    """
+    App factory; each uvicorn worker process builds its own app, pool and caches.
+    """
+    app = FastAPI(title="VN30 Best Buy Finder", lifespan=lifespan)
+    app.include_router(router)
+    return app
+
 
-app.include_router(router)
+app = create_app()
 
 if __name__ == "__main__":
     import uvicorn
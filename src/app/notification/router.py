@@ -0,0 +1,296 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, Optional
+
+import httpx
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.app.core.config import settings
+from src.app.db.models import NotificationDigest
+from src.app.db.session import AsyncSessionLocal
+from src.app.notification.telegram import TelegramBot, score_action, shutdown_outbox
+
+logger = logging.getLogger(__name__)
+
+MAX_RETRY_AFTER_SECONDS = 300.0
+
+
+def _round_price(value) -> float:
+    # Significant digits, so a one-tick wobble of the plan does not count as a change
+    value = float(value or 0)
+    if value <= 0:
+        return 0.0
+    return float(f"{value:.{settings.NOTIFY_PRICE_DIGITS}g}")
+
+
+def report_summary(top3: List[Dict]) -> List[Dict[str, Any]]:
+    """
+    The parts of a report that matter to a reader: picks in order, their
+    action label and the (rounded) trade plan. Raw scores are left out.
+    """
+    summary = []
+    for item in top3:
+        signal = item.get('signal') or {}
+        entry = signal.get('entry_zone') or {}
+        summary.append({
+            "symbol": item['symbol'],
+            "action": score_action(float(item['score_total'])),
+            "entry": [_round_price(entry.get('from', entry.get('min'))), _round_price(entry.get('to', entry.get('max')))],
+            "targets": [_round_price(signal.get('take_profit_1')), _round_price(signal.get('take_profit_2'))],
+            "stop": _round_price(signal.get('stop_loss')),
+        })
+    return summary
+
+
+def report_digest(summary: List[Dict[str, Any]]) -> str:
+    canonical = json.dumps(summary, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class TelegramSink:
+    def __init__(self, chat_id: str):
+        self.key = f"telegram:{chat_id}"
+        self.bot = TelegramBot(chat_id=chat_id)
+
+    async def send_report(self, router: "NotificationRouter", topic: str, run_id: str, top3: List[Dict], summary: List[Dict]):
+        # Sent through the Telegram outbox (rate limits, retries); waits for the
+        # delivery so the digest is only stored for a report that arrived
+        await self.bot.send_report(top3, run_id, wait=True)
+
+    async def send_message(self, router: "NotificationRouter", text: str):
+        await self.bot.send_message(text)
+
+
+class WebhookSink:
+    def __init__(self, url: str):
+        self.key = f"webhook:{url}"
+        self.url = url
+
+    async def send_report(self, router: "NotificationRouter", topic: str, run_id: str, top3: List[Dict], summary: List[Dict]):
+        await self._post(router, {"type": "report", "topic": topic, "run_id": run_id, "top": summary})
+
+    async def send_message(self, router: "NotificationRouter", text: str):
+        await self._post(router, {"type": "message", "text": text})
+
+    async def _post(self, router: "NotificationRouter", payload: Dict[str, Any]):
+        payload["sent_at"] = datetime.now(timezone.utc).isoformat()
+        retries = settings.NOTIFY_WEBHOOK_RETRIES
+        for attempt in range(retries + 1):
+            delay = min(2.0 ** attempt, 30.0)
+            try:
+                resp = await router.client.post(self.url, json=payload)
+                if resp.status_code < 500 and resp.status_code != 429:
+                    resp.raise_for_status()
+                    return
+                error = f"HTTP {resp.status_code}"
+                if resp.status_code == 429:
+                    delay = _retry_after(resp) or delay
+            except httpx.TransportError as e:
+                error = type(e).__name__
+            if attempt < retries:
+                await asyncio.sleep(delay)
+        raise RuntimeError(f"webhook failed after {retries + 1} attempts: {error}")
+
+
+def _retry_after(resp: httpx.Response) -> Optional[float]:
+    """
+    Seconds asked for by a Retry-After header (HTTP-date form included), capped
+    so a misbehaving endpoint cannot park the notification for long.
+    """
+    value = resp.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER_SECONDS)
+
+
+class FileSink:
+    """
+    Appends one JSON line per notification (a local feed / audit trail).
+    """
+    def __init__(self, path: str):
+        self.key = f"file:{path}"
+        self.path = path
+
+    async def send_report(self, router: "NotificationRouter", topic: str, run_id: str, top3: List[Dict], summary: List[Dict]):
+        await self._append({"type": "report", "topic": topic, "run_id": run_id, "top": summary})
+
+    async def send_message(self, router: "NotificationRouter", text: str):
+        await self._append({"type": "message", "text": text})
+
+    async def _append(self, payload: Dict[str, Any]):
+        payload["sent_at"] = datetime.now(timezone.utc).isoformat()
+        line = json.dumps(payload, ensure_ascii=False, separators=(",", ":")) + "\n"
+        await asyncio.to_thread(self._write, line)
+
+    def _write(self, line: str):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+SINKS = {"telegram": TelegramSink, "webhook": WebhookSink, "file": FileSink}
+
+
+def parse_subscribers(spec: str) -> List:
+    """
+    "telegram:<chat_id>,webhook:<url>,file:<path>" -> sinks. An empty spec
+    means the configured TELEGRAM_CHAT_ID (the single-chat setup).
+    """
+    if not spec.strip():
+        return [TelegramSink(settings.TELEGRAM_CHAT_ID)] if settings.TELEGRAM_CHAT_ID else []
+    sinks = []
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        kind, _, target = entry.partition(":")
+        if kind not in SINKS or not target:
+            raise ValueError(f"Invalid notification subscriber '{entry}' (expected telegram:, webhook: or file:)")
+        sinks.append(SINKS[kind](target))
+    return sinks
+
+
+class NotificationRouter:
+    """
+    Fans reports out to every subscriber concurrently, but only to those whose
+    last delivered report on the topic (notification_digest) differs from this
+    one; message volume follows market changes, not scheduler ticks.
+    """
+    def __init__(self, sinks: List = None):
+        self.loop = asyncio.get_running_loop()
+        self.sinks = sinks if sinks is not None else parse_subscribers(settings.NOTIFY_SUBSCRIBERS)
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=settings.NOTIFY_WEBHOOK_TIMEOUT_SECONDS)
+        return self._client
+
+    async def publish_report(self, topic: str, top3: List[Dict], run_id, force: bool = False,
+                             db: AsyncSession = None) -> int:
+        """
+        Deliver a run's Top 3 to subscribers whose stored digest differs (all
+        of them with `force`). Returns the number of subscribers reached.
+        """
+        if not self.sinks:
+            return 0
+        if db is None:
+            async with AsyncSessionLocal() as session:
+                return await self.publish_report(topic, top3, run_id, force=force, db=session)
+
+        summary = report_summary(top3)
+        digest = report_digest(summary)
+        keys = [s.key for s in self.sinks]
+        try:
+            rows = await db.execute(
+                select(NotificationDigest.subscriber, NotificationDigest.digest)
+                .where(NotificationDigest.topic == topic, NotificationDigest.subscriber.in_(keys))
+            )
+            last = dict(rows.all())
+        except Exception as e:
+            # Better a duplicate report than a missed one
+            logger.warning(f"Could not read notification digests ({e}); notifying every subscriber.")
+            await db.rollback()
+            last = {}
+
+        due = [s for s in self.sinks if force or last.get(s.key) != digest]
+        if not due:
+            logger.info(f"🔕 {topic}: report unchanged for all {len(keys)} subscriber(s); nothing sent.")
+            return 0
+
+        results = await asyncio.gather(
+            *(s.send_report(self, topic, str(run_id), top3, summary) for s in due), return_exceptions=True
+        )
+        delivered = []
+        for sink, result in zip(due, results):
+            if isinstance(result, Exception):
+                logger.error(f"Notification to {sink.key} failed: {result}")
+            else:
+                delivered.append(sink.key)
+
+        if delivered:
+            stmt = insert(NotificationDigest).values([
+                {"subscriber": key, "topic": topic, "digest": digest, "run_id": uuid.UUID(str(run_id)), "summary": summary}
+                for key in delivered
+            ])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['subscriber', 'topic'],
+                set_={
+                    'digest': stmt.excluded.digest,
+                    'run_id': stmt.excluded.run_id,
+                    'summary': stmt.excluded.summary,
+                    'delivered_at': stmt.excluded.delivered_at,
+                }
+            )
+            try:
+                await db.execute(stmt)
+                await db.commit()
+            except Exception as e:
+                logger.warning(f"Could not store notification digests: {e}")
+                await db.rollback()
+
+        logger.info(f"🔔 {topic}: report sent to {len(delivered)}/{len(keys)} subscriber(s).")
+        return len(delivered)
+
+    async def publish_message(self, text: str) -> int:
+        """
+        Broadcast a plain message (alerts, failures) to every subscriber, undeduplicated.
+        """
+        results = await asyncio.gather(*(s.send_message(self, text) for s in self.sinks), return_exceptions=True)
+        for sink, result in zip(self.sinks, results):
+            if isinstance(result, Exception):
+                logger.error(f"Notification to {sink.key} failed: {result}")
+        return sum(1 for r in results if not isinstance(r, Exception))
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+_router: Optional[NotificationRouter] = None
+
+
+def get_router() -> NotificationRouter:
+    """
+    Router of the running event loop (its webhook client is bound to the loop).
+    """
+    global _router
+    loop = asyncio.get_running_loop()
+    if _router is None or _router.loop is not loop:
+        _router = NotificationRouter()
+    return _router
+
+
+async def shutdown_notifications(timeout: float = None):
+    """
+    Close the router and deliver whatever the Telegram outbox still holds.
+    """
+    global _router
+    router = _router
+    if router is not None and router.loop is asyncio.get_running_loop():
+        _router = None
+        await router.close()
+    await shutdown_outbox(timeout)
+
+
+def run_topic(universe: str, timeframe: str, strategy: str) -> str:
+    return f"{universe}/{timeframe}/{strategy}"
@@ -1,50 +1,332 @@
+import asyncio
 import logging
+from typing import Dict, List, Optional
+
 import httpx
 from src.app.core.config import settings
+from src.app.core.metrics import TELEGRAM_RETRIES, record_wait
 
 logger = logging.getLogger(__name__)
 
-class TelegramBot:
+TELEGRAM_MAX_LENGTH = 4096
+MAX_BACKOFF_SECONDS = 60.0
+
+
+class TelegramDeliveryError(RuntimeError):
+    pass
+
+
+def split_message(text: str, limit: int = TELEGRAM_MAX_LENGTH) -> List[str]:
+    """
+    Split text into chunks of at most `limit` characters, on line boundaries
+    where possible (a single overlong line is cut hard).
+    """
+    if len(text) <= limit:
+        return [text]
+    chunks, current = [], ""
+    for line in text.split("\n"):
+        while len(line) > limit:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:limit])
+            line = line[limit:]
+        candidate = f"{current}\n{line}" if current else line
+        if len(candidate) > limit:
+            chunks.append(current)
+            current = line
+        else:
+            current = candidate
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class _RateLimiter:
+    """
+    Spaces acquisitions at least `interval` seconds apart.
+    """
+    def __init__(self, interval: float, name: str = "telegram"):
+        self.interval = interval
+        self.name = name
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            if self._next > now:
+                record_wait(self.name, self._next - now)
+                await asyncio.sleep(self._next - now)
+                now = self._next
+            self._next = now + self.interval
+
+
+class TelegramOutbox:
+    """
+    Outbound message queue bound to one event loop.
+
+    - One pooled httpx client, kept alive across messages
+    - One queue + sender task per chat, so a throttled chat never delays the
+      others; each chat is spaced TELEGRAM_CHAT_INTERVAL_SECONDS apart and all
+      chats together stay under TELEGRAM_GLOBAL_RATE messages/s
+    - 429s are retried after Telegram's `retry_after`, network errors and 5xx
+      with exponential backoff; other 4xx are logged and dropped
+    - Markdown that Telegram cannot parse is resent as plain text
+    - submit() returns a future that resolves once every part of the message
+      is delivered, or fails with TelegramDeliveryError if one is given up on
+    """
     def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+        self._global_limit = _RateLimiter(1.0 / max(settings.TELEGRAM_GLOBAL_RATE, 0.1), "telegram_global")
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=settings.TELEGRAM_TIMEOUT_SECONDS,
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=5),
+            )
+        return self._client
+
+    def submit(self, url: str, chat_id: str, text: str, parse_mode: Optional[str] = "Markdown") -> asyncio.Future:
+        """
+        Queue a message (split into <= 4096-char parts) and return at once.
+        Await the returned future to wait for its delivery; fire-and-forget
+        callers can ignore it.
+        """
+        queue = self._queues.get(chat_id)
+        if queue is None:
+            queue = self._queues[chat_id] = asyncio.Queue(maxsize=settings.TELEGRAM_QUEUE_SIZE)
+            self._workers[chat_id] = self.loop.create_task(self._sender(chat_id, queue), name=f"telegram-{chat_id}")
+
+        done = self.loop.create_future()
+        # Mark failures as retrieved so ignored futures do not log "never retrieved"
+        done.add_done_callback(lambda f: f.cancelled() or f.exception())
+        parts = split_message(text)
+        message = {"done": done, "pending": len(parts)}
+        for part in parts:
+            try:
+                queue.put_nowait({"url": url, "chat_id": chat_id, "text": part, "parse_mode": parse_mode,
+                                  "message": message})
+            except asyncio.QueueFull:
+                self.dropped += 1
+                logger.warning(f"Telegram queue for chat {chat_id} is full; dropping message.")
+                _fail(message, "queue full")
+                break
+        return done
+
+    async def _sender(self, chat_id: str, queue: asyncio.Queue):
+        chat_limit = _RateLimiter(settings.TELEGRAM_CHAT_INTERVAL_SECONDS, "telegram_chat")
+        while True:
+            item = await queue.get()
+            if item["message"]["done"].done():
+                # An earlier part of this message was given up on
+                queue.task_done()
+                continue
+            try:
+                reason = await self._deliver(item, chat_limit)
+            except asyncio.CancelledError:
+                _fail(item["message"], "outbox closed before delivery")
+                raise
+            except Exception as e:
+                self.failed += 1
+                reason = f"{type(e).__name__}: {e}"
+                logger.error(f"Telegram sender for chat {chat_id} failed: {reason}")
+            finally:
+                queue.task_done()
+            if reason is None:
+                _delivered(item["message"])
+            else:
+                _fail(item["message"], reason)
+
+    async def _deliver(self, item: Dict, chat_limit: _RateLimiter) -> Optional[str]:
+        """
+        Send one part. Returns None once delivered, else why it was given up on.
+        """
+        payload = {"chat_id": item["chat_id"], "text": item["text"]}
+        if item["parse_mode"]:
+            payload["parse_mode"] = item["parse_mode"]
+
+        for attempt in range(settings.TELEGRAM_MAX_RETRIES + 1):
+            delay = min(2.0 ** attempt, MAX_BACKOFF_SECONDS)
+            await chat_limit.wait()
+            await self._global_limit.wait()
+            try:
+                resp = await self.client.post(item["url"], json=payload)
+            except httpx.HTTPError as e:
+                # Never log the request URL: it carries the bot token
+                reason = type(e).__name__
+                kind = "network"
+            else:
+                if resp.status_code == 200:
+                    self.sent += 1
+                    logger.info("Telegram message sent successfully.")
+                    return None
+                body = _json_body(resp)
+                description = body.get("description", "")
+                reason = f"HTTP {resp.status_code} {description}".strip()
+                kind = "rate_limited" if resp.status_code == 429 else "server_error"
+                if resp.status_code == 429:
+                    retry_after = (body.get("parameters") or {}).get("retry_after")
+                    if retry_after:
+                        delay = float(retry_after)
+                elif resp.status_code == 400 and "parse_mode" in payload and "parse entities" in description:
+                    # e.g. a split cut a Markdown entity in half
+                    logger.warning("Telegram rejected Markdown; resending as plain text.")
+                    TELEGRAM_RETRIES.inc(reason="markdown")
+                    payload.pop("parse_mode")
+                    continue
+                elif resp.status_code < 500:
+                    self.failed += 1
+                    logger.error(f"Failed to send Telegram message: {reason}")
+                    return reason
+
+            if attempt < settings.TELEGRAM_MAX_RETRIES:
+                TELEGRAM_RETRIES.inc(reason=kind)
+                logger.warning(f"Telegram send failed ({reason}); retry {attempt + 1}/{settings.TELEGRAM_MAX_RETRIES} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+        self.failed += 1
+        logger.error(f"Failed to send Telegram message after {settings.TELEGRAM_MAX_RETRIES + 1} attempts: {reason}")
+        return reason
+
+    async def drain(self, timeout: float = None) -> bool:
+        """
+        Wait until every queued message is delivered (or given up on).
+        Returns False if the timeout expired first.
+        """
+        if not self._queues:
+            return True
+        timeout = settings.TELEGRAM_DRAIN_TIMEOUT_SECONDS if timeout is None else timeout
+        try:
+            await asyncio.wait_for(asyncio.gather(*(q.join() for q in self._queues.values())), timeout)
+            return True
+        except asyncio.TimeoutError:
+            left = sum(q.qsize() for q in self._queues.values())
+            logger.warning(f"Telegram outbox not drained after {timeout}s; {left} message(s) still queued.")
+            return False
+
+    async def close(self, timeout: float = None):
+        """
+        Drain, stop the senders and release the pooled connections.
+        """
+        await self.drain(timeout)
+        for task in self._workers.values():
+            task.cancel()
+        await asyncio.gather(*self._workers.values(), return_exceptions=True)
+        for queue in self._queues.values():
+            while not queue.empty():
+                _fail(queue.get_nowait()["message"], "outbox closed before delivery")
+        self._workers.clear()
+        self._queues.clear()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def _delivered(message: Dict):
+    message["pending"] -= 1
+    if message["pending"] <= 0 and not message["done"].done():
+        message["done"].set_result(None)
+
+
+def _fail(message: Dict, reason: str):
+    if not message["done"].done():
+        message["done"].set_exception(TelegramDeliveryError(f"Telegram message not delivered: {reason}"))
+
+
+def _json_body(resp: httpx.Response) -> Dict:
+    try:
+        body = resp.json()
+    except ValueError:
+        return {}
+    return body if isinstance(body, dict) else {}
+
+
+_outbox: Optional[TelegramOutbox] = None
+
+
+def get_outbox() -> TelegramOutbox:
+    """
+    Outbox of the running event loop (CLI commands each run their own loop).
+    """
+    global _outbox
+    loop = asyncio.get_running_loop()
+    if _outbox is None or _outbox.loop is not loop:
+        _outbox = TelegramOutbox()
+    return _outbox
+
+
+async def shutdown_outbox(timeout: float = None):
+    """
+    Deliver what is still queued and close the client. Call before the event
+    loop ends (end of a CLI command, API shutdown), or queued messages are lost.
+    """
+    global _outbox
+    outbox = _outbox
+    if outbox is None or outbox.loop is not asyncio.get_running_loop():
+        return
+    _outbox = None
+    await outbox.close(timeout)
+
+
+def score_action(score: float) -> str:
+    """
+    Action label shown for a score (also part of the notification digest).
+    """
+    if score >= 80: return "STRONG BUY"
+    if score >= 60: return "BUY"
+    if score >= 50: return "ACCUMULATE"
+    return "WATCH"
+
+
+class TelegramBot:
+    def __init__(self, chat_id: str = None):
         self.token = settings.TELEGRAM_BOT_TOKEN
-        self.chat_id = settings.TELEGRAM_CHAT_ID
+        self.chat_id = chat_id or settings.TELEGRAM_CHAT_ID
         self.base_url = f"https://api.telegram.org/bot{self.token}"
 
-    async def send_message(self, text: str):
+    @property
+    def configured(self) -> bool:
+        return bool(self.token and self.chat_id)
+
+    async def send_message(self, text: str, wait: bool = False):
         """
-        Send a text message to the configured chat.
+        Queue a text message for the configured chat. Returns immediately
+        unless `wait` is set; delivery happens on the outbox's sender task.
+        With `wait`, raises TelegramDeliveryError if it was not delivered
+        (or Telegram is not configured).
         """
-        if not self.token or not self.chat_id:
+        if not self.configured:
+            if wait:
+                raise TelegramDeliveryError("Telegram token or chat_id not configured")
             logger.warning("Telegram token or chat_id not configured. Skipping message.")
             return
 
-        url = f"{self.base_url}/sendMessage"
-        payload = {
-            "chat_id": self.chat_id,
-            "text": text,
-            "parse_mode": "Markdown"
-        }
-        
-        try:
-            async with httpx.AsyncClient() as client:
-                resp = await client.post(url, json=payload, timeout=10.0)
-                resp.raise_for_status()
-                logger.info("Telegram message sent successfully.")
-        except Exception as e:
-            logger.error(f"Failed to send Telegram message: {e}")
-
-    async def send_report(self, top3: list, run_id: str):
+        done = get_outbox().submit(f"{self.base_url}/sendMessage", str(self.chat_id), text, parse_mode="Markdown")
+        if wait:
+            await done
+
+    async def send_report(self, top3: list, run_id: str, wait: bool = False):
         """
         Format and send the Top 3 analysis report.
         """
         if not top3:
-            await self.send_message(f"📉 *Market Update*: Analysis `{run_id}` completed. No high-conviction setups found today.")
+            await self.send_message(f"📉 *Market Update*: Analysis `{run_id}` completed. No high-conviction setups found today.",
+                                    wait=wait)
             return
 
         from datetime import datetime
         now_str = datetime.now().strftime("%Y-%m-%d %H:%M")
 
-        lines = [f"👔 **VN30 EXECUTIVE BRIEFING**"]
+        lines = ["👔 **VN30 EXECUTIVE BRIEFING**"]
         lines.append(f"🗓 *{now_str}* | Run: `{str(run_id)[:8]}`")
         lines.append("")
         lines.append("**TOP HIGH-CONVICTION SETUPS**")
@@ -58,10 +340,7 @@ class TelegramBot:
             breakdown = item.get('breakdown', {})
             
             # Determine Action based on score
-            action = "WATCH"
-            if score >= 80: action = "STRONG BUY"
-            elif score >= 60: action = "BUY"
-            elif score >= 50: action = "ACCUMULATE"
+            action = score_action(score)
             
             icon = ["🥇", "🥈", "🥉"][i] if i < 3 else "🔹"
             
@@ -96,4 +375,4 @@ class TelegramBot:
         lines.append("⚠️ *Disclaimer: AI-generated analysis for reference only.*")
         
         msg = "\n".join(lines)
-        await self.send_message(msg)
+        await self.send_message(msg, wait=wait)
@@ -16,6 +16,7 @@ if sys.platform == 'win32':
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
 from src.app.core.scheduler import pipeline_job
+from src.app.notification.router import shutdown_notifications
 
 async def test():
     print("\n" + "=" * 60)
@@ -24,6 +25,8 @@ async def test():
     
     # This is what the scheduler calls
     await pipeline_job()
+    # Deliver the queued Telegram report before the loop closes
+    await shutdown_notifications()
     
     print("\n" + "=" * 60)
     print("TEST COMPLETED - Check Telegram for message")
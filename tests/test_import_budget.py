@@ -0,0 +1,12 @@
+"""
+Lightweight entry points stay within their import-time budgets and do not
+load heavy modules at import (see benchmarks/import_budget.py).
+"""
+import pytest
+
+from benchmarks.import_budget import TARGETS, check
+
+
+@pytest.mark.parametrize("name", sorted(TARGETS))
+def test_import_budget(name):
+    assert check(name, repeat=3) == []
@@ -0,0 +1,124 @@
+"""
+Claim / complete / fail / requeue state machine of the job queue.
+
+Runs against the Postgres in TEST_DATABASE_URL (claims rely on
+FOR UPDATE SKIP LOCKED); skipped when it is not set. The job_queue table is
+created if missing and emptied before each test.
+"""
+import os
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import delete, text, update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from src.app.core import jobqueue
+from src.app.db.models import QueueJob
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL not set")
+
+
+@pytest.fixture
+async def db():
+    engine = create_async_engine(TEST_DATABASE_URL)
+    async with engine.begin() as conn:
+        await conn.execute(text("CREATE SCHEMA IF NOT EXISTS trading"))
+        await conn.run_sync(lambda c: QueueJob.__table__.create(c, checkfirst=True))
+        await conn.execute(delete(QueueJob))
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        yield session
+    await engine.dispose()
+
+
+async def _enqueue(db, max_attempts: int = 3) -> int:
+    await jobqueue.enqueue(db, uuid.uuid4(), jobqueue.KIND_INGEST, [{"symbols": ["AAA"]}])
+    await db.execute(update(QueueJob).values(max_attempts=max_attempts))
+    await db.commit()
+    return (await db.execute(QueueJob.__table__.select())).one().job_id
+
+
+async def _job(db, job_id: int) -> QueueJob:
+    db.expire_all()
+    return await db.get(QueueJob, job_id)
+
+
+async def _age_heartbeat(db, job_id: int):
+    await db.execute(update(QueueJob).where(QueueJob.job_id == job_id)
+                     .values(heartbeat_at=datetime.now() - timedelta(hours=1)))
+    await db.commit()
+
+
+async def test_claim_marks_running(db):
+    job_id = await _enqueue(db)
+    job = await jobqueue.claim(db, "w1", [jobqueue.KIND_INGEST])
+    assert job.job_id == job_id
+    assert (job.status, job.attempts, job.worker_id) == ("running", 1, "w1")
+    assert await jobqueue.claim(db, "w2", [jobqueue.KIND_INGEST]) is None
+
+
+async def test_fail_requeues_until_attempts_are_used(db):
+    job_id = await _enqueue(db, max_attempts=2)
+
+    await jobqueue.claim(db, "w1", [jobqueue.KIND_INGEST])
+    await jobqueue.fail(db, job_id, "w1", ValueError("boom"))
+    job = await _job(db, job_id)
+    assert (job.status, job.worker_id, job.error_message) == ("queued", None, "boom")
+
+    job = await jobqueue.claim(db, "w1", [jobqueue.KIND_INGEST])
+    assert job.attempts == 2
+    await jobqueue.fail(db, job_id, "w1", ValueError("boom again"))
+    job = await _job(db, job_id)
+    assert job.status == "failed"
+    assert job.finished_at is not None
+    assert await jobqueue.claim(db, "w1", [jobqueue.KIND_INGEST]) is None
+
+
+async def test_fail_after_a_failed_complete(db):
+    job_id = await _enqueue(db)
+    await jobqueue.claim(db, "w1", [jobqueue.KIND_INGEST])
+    # The result cannot be serialized: complete() raises and the session must roll back
+    with pytest.raises(Exception):
+        await jobqueue.complete(db, job_id, "w1", {"bad": object()})
+    await jobqueue.fail(db, job_id, "w1", RuntimeError("unserializable result"))
+    assert (await _job(db, job_id)).status == "queued"
+
+
+async def test_requeue_stale(db):
+    job_id = await _enqueue(db, max_attempts=2)
+    await jobqueue.claim(db, "w1", [jobqueue.KIND_INGEST])
+
+    assert await jobqueue.requeue_stale(db, stale_seconds=60) == 0
+    assert (await _job(db, job_id)).status == "running"
+
+    await _age_heartbeat(db, job_id)
+    assert await jobqueue.requeue_stale(db, stale_seconds=60) == 1
+    job = await _job(db, job_id)
+    assert (job.status, job.worker_id, job.error_message) == ("queued", None, "heartbeat lost")
+
+    # Out of attempts: failed rather than requeued
+    await jobqueue.claim(db, "w2", [jobqueue.KIND_INGEST])
+    await _age_heartbeat(db, job_id)
+    assert await jobqueue.requeue_stale(db, stale_seconds=60) == 0
+    assert (await _job(db, job_id)).status == "failed"
+
+
+async def test_complete_only_by_the_current_owner(db):
+    job_id = await _enqueue(db)
+    await jobqueue.claim(db, "w1", [jobqueue.KIND_INGEST])
+    await _age_heartbeat(db, job_id)
+    await jobqueue.requeue_stale(db, stale_seconds=60)
+    await jobqueue.claim(db, "w2", [jobqueue.KIND_INGEST])
+
+    # w1 comes back after losing the job: neither its result nor its failure lands
+    assert not await jobqueue.complete(db, job_id, "w1", {"from": "w1"})
+    await jobqueue.fail(db, job_id, "w1", RuntimeError("late"))
+    job = await _job(db, job_id)
+    assert (job.status, job.worker_id, job.result) == ("running", "w2", None)
+
+    assert await jobqueue.complete(db, job_id, "w2", {"from": "w2"})
+    assert not await jobqueue.complete(db, job_id, "w2", {"again": True})
+    job = await _job(db, job_id)
+    assert (job.status, job.result) == ("done", {"from": "w2"})
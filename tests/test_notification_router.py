@@ -0,0 +1,144 @@
+"""
+Report digests and the changed / unchanged decision of NotificationRouter,
+with file and webhook sinks; no database or network needed.
+"""
+import json
+
+import httpx
+import pytest
+from sqlalchemy.sql.dml import Insert
+
+from src.app.core.config import settings
+from src.app.notification import router as router_module
+from src.app.notification.router import (
+    FileSink, NotificationRouter, TelegramSink, WebhookSink, parse_subscribers, report_digest, report_summary,
+)
+
+
+def _top3(stop: float = 23.41, score: float = 72.5):
+    return [
+        {"symbol": "FPT", "score_total": score, "breakdown": {"trend": 20},
+         "signal": {"entry_zone": {"from": 23.5, "to": 24.1}, "take_profit_1": 25.3,
+                    "take_profit_2": 26.8, "stop_loss": stop}},
+        {"symbol": "MWG", "score_total": 55.0, "signal": {}},
+    ]
+
+
+def test_report_summary():
+    summary = report_summary(_top3())
+    assert summary[0] == {"symbol": "FPT", "action": "BUY", "entry": [23.5, 24.1],
+                          "targets": [25.3, 26.8], "stop": 23.4}
+    assert summary[1] == {"symbol": "MWG", "action": "ACCUMULATE", "entry": [0.0, 0.0],
+                          "targets": [0.0, 0.0], "stop": 0.0}
+
+
+def test_digest_ignores_raw_scores_and_one_tick_wobble():
+    digest = report_digest(report_summary(_top3()))
+    assert report_digest(report_summary(_top3(stop=23.42, score=74.0))) == digest
+    # A different action label or order is a different report
+    assert report_digest(report_summary(_top3(score=81.0))) != digest
+    assert report_digest(report_summary(_top3()[::-1])) != digest
+
+
+def test_parse_subscribers(monkeypatch, tmp_path):
+    sinks = parse_subscribers(f"telegram:42, webhook:https://hooks.invalid/x,file:{tmp_path}/feed.jsonl,")
+    assert [type(s) for s in sinks] == [TelegramSink, WebhookSink, FileSink]
+    assert [s.key for s in sinks] == ["telegram:42", "webhook:https://hooks.invalid/x", f"file:{tmp_path}/feed.jsonl"]
+
+    with pytest.raises(ValueError):
+        parse_subscribers("sms:123")
+
+    monkeypatch.setattr(settings, "TELEGRAM_CHAT_ID", "")
+    assert parse_subscribers("") == []
+    monkeypatch.setattr(settings, "TELEGRAM_CHAT_ID", "7")
+    assert [s.key for s in parse_subscribers("")] == ["telegram:7"]
+
+
+async def test_file_sink(tmp_path):
+    path = tmp_path / "feeds" / "notify.jsonl"
+    sink = FileSink(str(path))
+    await sink.send_report(None, "VN30/1D/s", "run-1", _top3(), report_summary(_top3()))
+    await sink.send_message(None, "hello")
+    lines = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [x["type"] for x in lines] == ["report", "message"]
+    assert lines[0]["topic"] == "VN30/1D/s" and lines[0]["top"][0]["symbol"] == "FPT"
+    assert lines[1]["text"] == "hello"
+
+
+class FakeSession:
+    """
+    Just enough of AsyncSession for publish_report: answers the digest
+    SELECT from `digests` and records the digest upserts.
+    """
+    def __init__(self, digests=None):
+        self.digests = dict(digests or {})
+        self.upserts = 0
+
+    async def execute(self, stmt):
+        if isinstance(stmt, Insert):
+            self.upserts += 1
+            return None
+        return self
+
+    def all(self):
+        return list(self.digests.items())
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+
+class FailingSink:
+    key = "failing:x"
+
+    async def send_report(self, router, topic, run_id, top3, summary):
+        raise RuntimeError("down")
+
+
+RUN_ID = "5b2e8a53-2c1e-4d7e-9d43-6a0a3a1f0b11"
+
+
+async def test_publish_report_only_when_changed(tmp_path):
+    path = tmp_path / "notify.jsonl"
+    sink = FileSink(str(path))
+    router = NotificationRouter(sinks=[sink])
+    digest = report_digest(report_summary(_top3()))
+
+    db = FakeSession()
+    assert await router.publish_report("t", _top3(), RUN_ID, db=db) == 1
+    assert db.upserts == 1
+
+    # Same report (one tick away) already delivered: nothing sent or stored
+    db = FakeSession({sink.key: digest})
+    assert await router.publish_report("t", _top3(stop=23.42), RUN_ID, db=db) == 0
+    assert db.upserts == 0
+    assert await router.publish_report("t", _top3(), RUN_ID, force=True, db=db) == 1
+
+    # A changed report goes out again
+    assert await router.publish_report("t", _top3(score=85.0), RUN_ID, db=db) == 1
+    assert len(path.read_text(encoding="utf-8").splitlines()) == 3
+
+
+async def test_failed_sink_keeps_its_old_digest(tmp_path):
+    router = NotificationRouter(sinks=[FailingSink()])
+    db = FakeSession()
+    assert await router.publish_report("t", _top3(), RUN_ID, db=db) == 0
+    assert db.upserts == 0
+
+
+async def test_webhook_429_is_retried_after_retry_after(monkeypatch):
+    sleeps = []
+
+    async def fake_sleep(delay):
+        sleeps.append(delay)
+
+    monkeypatch.setattr(router_module.asyncio, "sleep", fake_sleep)
+    replies = iter([httpx.Response(429, headers={"Retry-After": "3"}), httpx.Response(204)])
+    router = NotificationRouter(sinks=[])
+    router._client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: next(replies)))
+
+    await WebhookSink("https://hooks.invalid/x").send_message(router, "hi")
+    assert sleeps == [3.0]
+    await router.close()
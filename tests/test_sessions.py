@@ -0,0 +1,64 @@
+"""
+HOSE session calendar: when the scheduler fires and what counts as in session.
+"""
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from src.app.core.sessions import daily_trigger, in_session, parse_hhmm, session_trigger
+
+TZ = ZoneInfo("Asia/Ho_Chi_Minh")
+MONDAY = datetime(2026, 3, 2, tzinfo=TZ)
+
+
+def _fire_times(trigger, start: datetime, end: datetime):
+    times, previous, now = [], None, start
+    while True:
+        fire = trigger.get_next_fire_time(previous, now)
+        if fire is None or fire >= end:
+            return times
+        times.append(fire)
+        previous, now = fire, fire + timedelta(seconds=1)
+
+
+def test_session_trigger_fires_at_session_bounds():
+    fires = _fire_times(session_trigger(15, TZ), MONDAY, MONDAY + timedelta(days=7))
+    monday = {f.time() for f in fires if f.date() == MONDAY.date()}
+    assert {time(9, 0), time(11, 30), time(13, 0), time(14, 45)} <= monday
+    assert len(monday) == 11 + 8  # 09:00-11:30 and 13:00-14:45 every 15 minutes
+
+
+def test_session_trigger_never_at_lunch_or_weekends():
+    fires = _fire_times(session_trigger(15, TZ), MONDAY, MONDAY + timedelta(days=7))
+    assert fires
+    assert all(f.weekday() < 5 for f in fires)
+    assert not any(time(11, 30) < f.time() < time(13, 0) for f in fires)
+    assert not any(f.time() < time(9, 0) or f.time() > time(14, 45) for f in fires)
+    assert {f.date() for f in fires} == {(MONDAY + timedelta(days=d)).date() for d in range(5)}
+
+
+def test_session_trigger_grid_is_aligned_to_session_start():
+    fires = _fire_times(session_trigger(60, TZ), MONDAY, MONDAY + timedelta(days=1))
+    assert [f.time() for f in fires] == [time(9, 0), time(10, 0), time(11, 0), time(13, 0), time(14, 0)]
+
+
+def test_daily_trigger_skips_weekends():
+    fires = _fire_times(daily_trigger(parse_hhmm("14:50"), TZ), MONDAY, MONDAY + timedelta(days=7))
+    assert [f.weekday() for f in fires] == [0, 1, 2, 3, 4]
+    assert {f.time() for f in fires} == {time(14, 50)}
+
+
+@pytest.mark.parametrize("hhmm, expected", [
+    ("08:59", False), ("09:00", True), ("11:30", True), ("12:00", False),
+    ("13:00", True), ("14:45", True), ("14:46", False),
+])
+def test_in_session_weekday(hhmm, expected):
+    t = parse_hhmm(hhmm)
+    assert in_session(MONDAY.replace(hour=t.hour, minute=t.minute)) is expected
+
+
+def test_in_session_weekend():
+    saturday = MONDAY + timedelta(days=5)
+    assert not in_session(saturday.replace(hour=10))
+    assert not in_session((saturday + timedelta(days=1)).replace(hour=10))
@@ -0,0 +1,133 @@
+"""
+Message splitting and the Telegram outbox retry policy, against an
+httpx.MockTransport (nothing leaves the process).
+"""
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from src.app.core.config import settings
+from src.app.notification import telegram
+from src.app.notification.telegram import TELEGRAM_MAX_LENGTH, TelegramDeliveryError, TelegramOutbox, split_message
+
+URL = "https://telegram.invalid/botTEST/sendMessage"
+
+
+def test_short_message_is_one_part():
+    assert split_message("hello\nworld") == ["hello\nworld"]
+
+
+def test_split_on_line_boundaries():
+    lines = [f"line {i:04d} " + "x" * 90 for i in range(200)]
+    text = "\n".join(lines)
+    parts = split_message(text)
+    assert len(parts) > 1
+    assert all(len(p) <= TELEGRAM_MAX_LENGTH for p in parts)
+    # No line is cut: the parts are whole lines, in order
+    assert [line for p in parts for line in p.split("\n")] == lines
+
+
+def test_overlong_line_is_cut_hard():
+    text = "a" * (TELEGRAM_MAX_LENGTH * 2 + 10)
+    parts = split_message(text)
+    assert [len(p) for p in parts] == [TELEGRAM_MAX_LENGTH, TELEGRAM_MAX_LENGTH, 10]
+    assert "".join(parts) == text
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """
+    No rate limiting, and record (instead of wait) retry delays.
+    """
+    monkeypatch.setattr(settings, "TELEGRAM_CHAT_INTERVAL_SECONDS", 0.0)
+    monkeypatch.setattr(settings, "TELEGRAM_GLOBAL_RATE", float("inf"))
+    monkeypatch.setattr(settings, "TELEGRAM_MAX_RETRIES", 2)
+    recorded = []
+    real_sleep = asyncio.sleep
+
+    async def fake_sleep(delay, *args, **kwargs):
+        if delay:
+            recorded.append(delay)
+        await real_sleep(0)
+
+    monkeypatch.setattr(telegram.asyncio, "sleep", fake_sleep)
+    return recorded
+
+
+def _outbox(responses):
+    """
+    Outbox whose client answers with `responses` in turn; returns it and the
+    list of request payloads it received.
+    """
+    requests = []
+    replies = iter(responses)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(json.loads(request.content))
+        status, body = next(replies)
+        return httpx.Response(status, json=body)
+
+    outbox = TelegramOutbox()
+    outbox._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return outbox, requests
+
+
+async def test_delivered(sleeps):
+    outbox, requests = _outbox([(200, {"ok": True})])
+    await outbox.submit(URL, "1", "*hi*")
+    await outbox.close()
+    assert requests == [{"chat_id": "1", "text": "*hi*", "parse_mode": "Markdown"}]
+    assert (outbox.sent, outbox.failed) == (1, 0)
+
+
+async def test_429_waits_retry_after(sleeps):
+    outbox, requests = _outbox([
+        (429, {"ok": False, "description": "Too Many Requests", "parameters": {"retry_after": 7}}),
+        (200, {"ok": True}),
+    ])
+    await outbox.submit(URL, "1", "hi")
+    await outbox.close()
+    assert len(requests) == 2
+    assert sleeps == [7.0]
+    assert outbox.sent == 1
+
+
+async def test_markdown_rejected_is_resent_as_plain_text(sleeps):
+    outbox, requests = _outbox([
+        (400, {"ok": False, "description": "Bad Request: can't parse entities: unclosed bold"}),
+        (200, {"ok": True}),
+    ])
+    await outbox.submit(URL, "1", "*unclosed")
+    await outbox.close()
+    assert requests[0]["parse_mode"] == "Markdown"
+    assert "parse_mode" not in requests[1]
+    assert sleeps == []
+    assert outbox.sent == 1
+
+
+async def test_other_4xx_is_dropped(sleeps):
+    outbox, requests = _outbox([(403, {"ok": False, "description": "Forbidden: bot was blocked by the user"})])
+    with pytest.raises(TelegramDeliveryError):
+        await outbox.submit(URL, "1", "hi")
+    await outbox.close()
+    assert len(requests) == 1
+    assert (outbox.sent, outbox.failed) == (0, 1)
+
+
+async def test_5xx_retried_then_given_up(sleeps):
+    outbox, requests = _outbox([(502, {})] * 3)
+    with pytest.raises(TelegramDeliveryError):
+        await outbox.submit(URL, "1", "hi")
+    await outbox.close()
+    assert len(requests) == settings.TELEGRAM_MAX_RETRIES + 1
+    assert sleeps == [1.0, 2.0]
+
+
+async def test_unconfigured_bot_raises_when_waiting(monkeypatch):
+    monkeypatch.setattr(settings, "TELEGRAM_BOT_TOKEN", "")
+    bot = telegram.TelegramBot(chat_id="1")
+    await bot.send_message("hi")  # fire-and-forget: logged and skipped
+    with pytest.raises(TelegramDeliveryError):
+        await bot.send_message("hi", wait=True)
@@ -6,11 +6,17 @@
 -- How to run:
 --   psql -h <host> -U <user> -d <db> -f trading_app_init.sql
 --
+-- Upgrading a database created before ohlcv_bar was partitioned: run
+-- trading_migrate_ohlcv_partitions.sql first, then this script. Until then
+-- init skips the partition setup (with a NOTICE) and ingest cannot write bars.
+--
 -- Notes:
 -- - Creates schema: trading
 -- - Creates tables: app_user, market_symbol, universe, universe_member, timeframe,
---   ohlcv_bar, data_fetch_log, strategy, analysis_run, run_score, run_signal, run_report
+--   ohlcv_bar, ohlcv_coverage, data_fetch_log, strategy, analysis_run, run_score,
+--   run_signal, run_report, run_metrics, job_queue, notification_digest
 -- - Creates view: v_run_top3
+-- - Creates function: ensure_ohlcv_partitions (ohlcv_bar is partitioned)
 -- - Inserts default timeframes: 1D, 1H, 15m
 
 BEGIN;
@@ -58,9 +64,14 @@ CREATE TABLE IF NOT EXISTS trading.universe_member (
   PRIMARY KEY (universe_id, symbol_id, effective_from)
 );
 
+-- Point-in-time lookups (members_as_of): effective_from <= d AND (effective_to IS NULL OR effective_to > d)
 CREATE INDEX IF NOT EXISTS idx_universe_member_active
 ON trading.universe_member (universe_id, effective_from, effective_to);
 
+-- Current members (pipeline runs, universe sync diff)
+CREATE INDEX IF NOT EXISTS idx_universe_member_current
+ON trading.universe_member (universe_id, symbol_id) WHERE effective_to IS NULL;
+
 -- Timeframe catalog
 CREATE TABLE IF NOT EXISTS trading.timeframe (
   timeframe_id     smallserial PRIMARY KEY,
@@ -74,6 +85,9 @@ VALUES ('1D', 86400), ('1H', 3600), ('15m', 900)
 ON CONFLICT (code) DO NOTHING;
 
 -- OHLCV cache
+-- Partitioned by timeframe, then by bar time (yearly for daily bars, monthly
+-- for intraday). Every query filters timeframe_id and ts, so both levels prune.
+-- Leaf partitions are created on demand by trading.ensure_ohlcv_partitions().
 CREATE TABLE IF NOT EXISTS trading.ohlcv_bar (
   symbol_id        bigint NOT NULL REFERENCES trading.market_symbol(symbol_id) ON DELETE CASCADE,
   timeframe_id     smallint NOT NULL REFERENCES trading.timeframe(timeframe_id) ON DELETE RESTRICT,
@@ -86,13 +100,98 @@ CREATE TABLE IF NOT EXISTS trading.ohlcv_bar (
   source          text NOT NULL DEFAULT 'vnstock',
   ingested_at     timestamptz NOT NULL DEFAULT now(),
   PRIMARY KEY (symbol_id, timeframe_id, ts)
-);
+) PARTITION BY LIST (timeframe_id);
+
+-- Bars arrive roughly in time order, so a BRIN on ts stays tiny and serves
+-- time-range scans across symbols; per-symbol reads use the primary key.
+CREATE INDEX IF NOT EXISTS idx_ohlcv_ts_brin
+ON trading.ohlcv_bar USING brin (ts) WITH (pages_per_range = 32);
+
+-- Create the leaf partitions covering [p_from, p_to] for one timeframe.
+-- Idempotent and safe under concurrent callers. Returns the number created.
+CREATE OR REPLACE FUNCTION trading.ensure_ohlcv_partitions(
+  p_timeframe_id smallint,
+  p_from timestamptz,
+  p_to timestamptz
+) RETURNS integer
+LANGUAGE plpgsql AS $$
+DECLARE
+  v_bar_seconds integer;
+  v_unit        text;
+  v_parent      text := format('ohlcv_bar_tf%s', p_timeframe_id);
+  v_start       timestamp;
+  v_end         timestamp;
+  v_name        text;
+  v_created     integer := 0;
+BEGIN
+  SELECT bar_seconds INTO v_bar_seconds FROM trading.timeframe WHERE timeframe_id = p_timeframe_id;
+  IF v_bar_seconds IS NULL THEN
+    RAISE EXCEPTION 'unknown timeframe_id %', p_timeframe_id;
+  END IF;
+  v_unit := CASE WHEN v_bar_seconds >= 86400 THEN 'year' ELSE 'month' END;
+
+  IF to_regclass(format('trading.%I', v_parent)) IS NULL THEN
+    BEGIN
+      EXECUTE format(
+        'CREATE TABLE trading.%I PARTITION OF trading.ohlcv_bar FOR VALUES IN (%s) PARTITION BY RANGE (ts)',
+        v_parent, p_timeframe_id);
+    EXCEPTION WHEN duplicate_table THEN NULL;
+    END;
+  END IF;
+
+  -- Bounds are computed in UTC so they don't depend on the session TimeZone
+  v_start := date_trunc(v_unit, p_from AT TIME ZONE 'UTC');
+  WHILE v_start <= (p_to AT TIME ZONE 'UTC') LOOP
+    v_end := v_start + ('1 ' || v_unit)::interval;
+    v_name := v_parent || '_' || to_char(v_start, CASE WHEN v_unit = 'year' THEN 'YYYY' ELSE 'YYYY_MM' END);
+    IF to_regclass(format('trading.%I', v_name)) IS NULL THEN
+      BEGIN
+        EXECUTE format(
+          'CREATE TABLE trading.%I PARTITION OF trading.%I FOR VALUES FROM (%L) TO (%L)',
+          v_name, v_parent, v_start::text || '+00', v_end::text || '+00');
+        v_created := v_created + 1;
+      EXCEPTION WHEN duplicate_table THEN NULL;
+      END;
+    END IF;
+    v_start := v_end;
+  END LOOP;
+  RETURN v_created;
+END
+$$;
 
-CREATE INDEX IF NOT EXISTS idx_ohlcv_ts
-ON trading.ohlcv_bar (timeframe_id, ts DESC);
+-- Partitions for the last year of every known timeframe. Skipped while an
+-- older database still has the unpartitioned ohlcv_bar (see the header).
+DO $$
+BEGIN
+  IF (SELECT relkind FROM pg_class WHERE oid = 'trading.ohlcv_bar'::regclass) = 'p' THEN
+    PERFORM trading.ensure_ohlcv_partitions(timeframe_id, now() - interval '1 year', now())
+    FROM trading.timeframe;
+  ELSE
+    RAISE NOTICE 'trading.ohlcv_bar is not partitioned: run trading_migrate_ohlcv_partitions.sql, then this script again';
+  END IF;
+END
+$$;
 
-CREATE INDEX IF NOT EXISTS idx_ohlcv_symbol_ts
-ON trading.ohlcv_bar (symbol_id, timeframe_id, ts DESC);
+-- Per (timeframe, symbol) summary of ohlcv_bar, updated by every upsert in the
+-- same transaction; freshness / gap checks read this instead of the bars
+CREATE TABLE IF NOT EXISTS trading.ohlcv_coverage (
+  timeframe_id     smallint NOT NULL REFERENCES trading.timeframe(timeframe_id) ON DELETE CASCADE,
+  symbol_id        bigint NOT NULL REFERENCES trading.market_symbol(symbol_id) ON DELETE CASCADE,
+  first_ts         timestamptz,
+  last_ts          timestamptz,
+  bar_count        bigint NOT NULL DEFAULT 0,
+  last_ingested_at timestamptz,                  -- last upsert, changed or not
+  last_changed_at  timestamptz,                  -- last upsert that inserted or changed a bar
+  PRIMARY KEY (timeframe_id, symbol_id)
+);
+
+-- Backfill for databases that already hold bars (no-op once populated)
+INSERT INTO trading.ohlcv_coverage
+  (timeframe_id, symbol_id, first_ts, last_ts, bar_count, last_ingested_at, last_changed_at)
+SELECT timeframe_id, symbol_id, min(ts), max(ts), count(*), max(ingested_at), max(ingested_at)
+FROM trading.ohlcv_bar
+GROUP BY timeframe_id, symbol_id
+ON CONFLICT (timeframe_id, symbol_id) DO NOTHING;
 
 -- Fetch logs
 CREATE TABLE IF NOT EXISTS trading.data_fetch_log (
@@ -141,6 +240,10 @@ CREATE TABLE IF NOT EXISTS trading.analysis_run (
 CREATE INDEX IF NOT EXISTS idx_run_asof
 ON trading.analysis_run (as_of DESC);
 
+-- Latest successful run lookup (API response cache revalidation)
+CREATE INDEX IF NOT EXISTS idx_run_latest_success
+ON trading.analysis_run (finished_at DESC) WHERE status = 'success';
+
 -- Scores per run & symbol
 CREATE TABLE IF NOT EXISTS trading.run_score (
   run_id           uuid NOT NULL REFERENCES trading.analysis_run(run_id) ON DELETE CASCADE,
@@ -161,6 +264,10 @@ CREATE TABLE IF NOT EXISTS trading.run_score (
 CREATE INDEX IF NOT EXISTS idx_run_score_rank
 ON trading.run_score (run_id, score_total DESC);
 
+-- Per-symbol score history (keyset pagination on computed_at, run_id)
+CREATE INDEX IF NOT EXISTS idx_run_score_symbol_hist
+ON trading.run_score (symbol_id, computed_at DESC, run_id DESC);
+
 -- Trade signal suggestions
 CREATE TABLE IF NOT EXISTS trading.run_signal (
   run_id           uuid NOT NULL REFERENCES trading.analysis_run(run_id) ON DELETE CASCADE,
@@ -185,6 +292,60 @@ CREATE TABLE IF NOT EXISTS trading.run_report (
   created_at       timestamptz NOT NULL DEFAULT now()
 );
 
+-- Per-stage profiling (run --profile)
+CREATE TABLE IF NOT EXISTS trading.run_metrics (
+  metric_id        bigserial PRIMARY KEY,
+  run_id           uuid NOT NULL REFERENCES trading.analysis_run(run_id) ON DELETE CASCADE,
+  stage            text NOT NULL,                -- 'fetch' | 'db_read' | 'indicators' | ...
+  symbol_id        bigint REFERENCES trading.market_symbol(symbol_id) ON DELETE CASCADE, -- null = run-level stage
+  wall_ms          numeric(12,3) NOT NULL,
+  cpu_ms           numeric(12,3) NOT NULL,
+  peak_mem_kb      bigint,                       -- null when memory tracing is off
+  created_at       timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_run_metrics_run
+ON trading.run_metrics (run_id, stage);
+
+-- Durable work queue for multi-worker sharding (claimed with FOR UPDATE SKIP LOCKED)
+CREATE TABLE IF NOT EXISTS trading.job_queue (
+  job_id           bigserial PRIMARY KEY,
+  batch_id         uuid NOT NULL,                -- run_id for analysis shards
+  kind             text NOT NULL,                -- 'ingest' | 'analyze'
+  payload          jsonb NOT NULL,               -- {"symbols": [...], "timeframe": ...}
+  status           text NOT NULL DEFAULT 'queued', -- queued|running|done|failed
+  attempts         integer NOT NULL DEFAULT 0,
+  max_attempts     integer NOT NULL DEFAULT 3,
+  worker_id        text,
+  result           jsonb,
+  error_message    text,
+  created_at       timestamptz NOT NULL DEFAULT now(),
+  claimed_at       timestamptz,
+  heartbeat_at     timestamptz,
+  finished_at      timestamptz
+);
+
+CREATE INDEX IF NOT EXISTS idx_job_queue_claim
+ON trading.job_queue (kind, job_id) WHERE status = 'queued';
+
+CREATE INDEX IF NOT EXISTS idx_job_queue_batch
+ON trading.job_queue (batch_id, status);
+
+CREATE INDEX IF NOT EXISTS idx_job_queue_running
+ON trading.job_queue (heartbeat_at) WHERE status = 'running';
+
+-- Last report delivered to each notification subscriber per topic; a new
+-- report is only sent when its digest differs (change-based dedup)
+CREATE TABLE IF NOT EXISTS trading.notification_digest (
+  subscriber       text NOT NULL,                 -- e.g. 'telegram:<chat_id>', 'webhook:<url>', 'file:<path>'
+  topic            text NOT NULL,                 -- universe/timeframe/strategy
+  digest           text NOT NULL,                 -- sha256 of the normalized picks + trade plans
+  run_id           uuid,
+  summary          jsonb,
+  delivered_at     timestamptz NOT NULL DEFAULT now(),
+  PRIMARY KEY (subscriber, topic)
+);
+
 -- Convenience view
 CREATE OR REPLACE VIEW trading.v_run_top3 AS
 SELECT
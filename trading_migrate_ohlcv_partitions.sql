@@ -0,0 +1,104 @@
+-- trading_migrate_ohlcv_partitions.sql
+-- One-off migration of an existing (unpartitioned) trading.ohlcv_bar to the
+-- partitioned layout of trading_app_init.sql.
+--
+-- How to run (takes an exclusive lock on ohlcv_bar; stop ingest/scheduler first):
+--   psql -h <host> -U <user> -d <db> -v ON_ERROR_STOP=1 -f trading_migrate_ohlcv_partitions.sql
+--
+-- Rows are copied in (timeframe, ts) order so the BRIN index on ts is well correlated.
+--
+-- Upgrades run this before the new trading_app_init.sql (which only creates
+-- partitions once ohlcv_bar is partitioned), then re-run the init script.
+
+BEGIN;
+
+ALTER TABLE trading.ohlcv_bar RENAME TO ohlcv_bar_unpartitioned;
+ALTER TABLE trading.ohlcv_bar_unpartitioned RENAME CONSTRAINT ohlcv_bar_pkey TO ohlcv_bar_unpartitioned_pkey;
+DROP INDEX IF EXISTS trading.idx_ohlcv_ts;
+DROP INDEX IF EXISTS trading.idx_ohlcv_symbol_ts;
+
+CREATE TABLE trading.ohlcv_bar (
+  symbol_id        bigint NOT NULL REFERENCES trading.market_symbol(symbol_id) ON DELETE CASCADE,
+  timeframe_id     smallint NOT NULL REFERENCES trading.timeframe(timeframe_id) ON DELETE RESTRICT,
+  ts              timestamptz NOT NULL,          -- bar start time
+  open            numeric(18,4),
+  high            numeric(18,4),
+  low             numeric(18,4),
+  close           numeric(18,4),
+  volume          numeric(24,4),
+  source          text NOT NULL DEFAULT 'vnstock',
+  ingested_at     timestamptz NOT NULL DEFAULT now(),
+  PRIMARY KEY (symbol_id, timeframe_id, ts)
+) PARTITION BY LIST (timeframe_id);
+
+CREATE INDEX idx_ohlcv_ts_brin
+ON trading.ohlcv_bar USING brin (ts) WITH (pages_per_range = 32);
+
+-- Create the leaf partitions covering [p_from, p_to] for one timeframe.
+-- Idempotent and safe under concurrent callers. Returns the number created.
+CREATE OR REPLACE FUNCTION trading.ensure_ohlcv_partitions(
+  p_timeframe_id smallint,
+  p_from timestamptz,
+  p_to timestamptz
+) RETURNS integer
+LANGUAGE plpgsql AS $$
+DECLARE
+  v_bar_seconds integer;
+  v_unit        text;
+  v_parent      text := format('ohlcv_bar_tf%s', p_timeframe_id);
+  v_start       timestamp;
+  v_end         timestamp;
+  v_name        text;
+  v_created     integer := 0;
+BEGIN
+  SELECT bar_seconds INTO v_bar_seconds FROM trading.timeframe WHERE timeframe_id = p_timeframe_id;
+  IF v_bar_seconds IS NULL THEN
+    RAISE EXCEPTION 'unknown timeframe_id %', p_timeframe_id;
+  END IF;
+  v_unit := CASE WHEN v_bar_seconds >= 86400 THEN 'year' ELSE 'month' END;
+
+  IF to_regclass(format('trading.%I', v_parent)) IS NULL THEN
+    BEGIN
+      EXECUTE format(
+        'CREATE TABLE trading.%I PARTITION OF trading.ohlcv_bar FOR VALUES IN (%s) PARTITION BY RANGE (ts)',
+        v_parent, p_timeframe_id);
+    EXCEPTION WHEN duplicate_table THEN NULL;
+    END;
+  END IF;
+
+  -- Bounds are computed in UTC so they don't depend on the session TimeZone
+  v_start := date_trunc(v_unit, p_from AT TIME ZONE 'UTC');
+  WHILE v_start <= (p_to AT TIME ZONE 'UTC') LOOP
+    v_end := v_start + ('1 ' || v_unit)::interval;
+    v_name := v_parent || '_' || to_char(v_start, CASE WHEN v_unit = 'year' THEN 'YYYY' ELSE 'YYYY_MM' END);
+    IF to_regclass(format('trading.%I', v_name)) IS NULL THEN
+      BEGIN
+        EXECUTE format(
+          'CREATE TABLE trading.%I PARTITION OF trading.%I FOR VALUES FROM (%L) TO (%L)',
+          v_name, v_parent, v_start::text || '+00', v_end::text || '+00');
+        v_created := v_created + 1;
+      EXCEPTION WHEN duplicate_table THEN NULL;
+      END;
+    END IF;
+    v_start := v_end;
+  END LOOP;
+  RETURN v_created;
+END
+$$;
+
+-- Partitions for every (timeframe, period) present in the old table
+SELECT trading.ensure_ohlcv_partitions(timeframe_id::smallint, min(ts), max(ts))
+FROM trading.ohlcv_bar_unpartitioned
+GROUP BY timeframe_id;
+
+INSERT INTO trading.ohlcv_bar
+  (symbol_id, timeframe_id, ts, open, high, low, close, volume, source, ingested_at)
+SELECT symbol_id, timeframe_id, ts, open, high, low, close, volume, source, ingested_at
+FROM trading.ohlcv_bar_unpartitioned
+ORDER BY timeframe_id, ts, symbol_id;
+
+DROP TABLE trading.ohlcv_bar_unpartitioned;
+
+COMMIT;
+
+ANALYZE trading.ohlcv_bar;
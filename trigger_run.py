@@ -9,8 +9,10 @@ async def trigger():
     print("🚀 Triggering immediate analysis pipeline...")
     try:
         from src.app.core.scheduler import pipeline_job
+        from src.app.notification.router import shutdown_notifications
         await pipeline_job()
         print("✅ Pipeline execution finished.")
+        await shutdown_notifications()
     except Exception as e:
         print(f"❌ Execution failed: {e}")
         import traceback